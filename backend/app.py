@@ -1,8 +1,11 @@
 from flask import Flask, jsonify
 from flask_cors import CORS 
 from config import config
-from extensions import db, jwt, limiter
+from extensions import db, migrate, jwt, limiter
 from middleware.security import init_security
+from utils.encryption import init_cipher_engines
+from utils.storage import init_storage
+from utils.audit_logger import init_audit_writer
 from datetime import timedelta
 import os
 
@@ -23,9 +26,19 @@ def create_app(env=None):
 
     # Initialize extensions
     db.init_app(app)
+    migrate.init_app(app, db)   # schema changes: migrations/ (flask db upgrade)
     jwt.init_app(app)
     limiter.init_app(app)
 
+    # Benchmark cipher engines on this worker and pick the default algorithm
+    init_cipher_engines(app)
+
+    # Blob storage backend (local uploads/ or S3), shared by all requests
+    init_storage(app)
+
+    # Background writer for audit log rows (batched, off the request path)
+    init_audit_writer(app)
+
     # Import models first
     from models.user import User
     from models.file import File, AuditLog
@@ -33,9 +46,13 @@ def create_app(env=None):
     # Register blueprints
     from routes.auth import auth_bp
     from routes.files import files_bp
+    from routes.uploads import uploads_bp
+    from routes.audit import audit_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(files_bp, url_prefix="/api/files")
+    app.register_blueprint(uploads_bp, url_prefix="/api/files/upload/sessions")
+    app.register_blueprint(audit_bp, url_prefix="/api/audit")
 
     # JWT error handlers
     @jwt.expired_token_loader
@@ -85,8 +102,9 @@ def create_app(env=None):
 
 if __name__ == "__main__":
     app = create_app()
-    # Create tables
+    # Bring the schema up to the latest migration (same as `flask db upgrade`)
+    from flask_migrate import upgrade
     with app.app_context():
-        db.create_all()
+        upgrade()
     # Ensure port 5000 is used
     app.run(host="0.0.0.0", port=5000, debug=app.config.get("DEBUG", True))
\ No newline at end of file
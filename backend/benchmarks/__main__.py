@@ -0,0 +1,89 @@
+"""
+Benchmark suite for encryption, key derivation and upload/download paths.
+
+    python -m benchmarks                          # quick run, all suites
+    python -m benchmarks --full                   # sizes up to 2GB
+    python -m benchmarks --suite crypto --algos AES-256-GCM --sizes 1MB,256MB
+    python -m benchmarks --output new.json --compare old.json
+
+Run from backend/. Results are written as JSON (meta, args, results).
+"""
+import os
+import sys
+import json
+import argparse
+
+os.environ.setdefault("MASTER_ENCRYPTION_KEY", "benchmark-master-key")
+
+from benchmarks.common import parse_size, format_size, write_report
+
+QUICK_SIZES = "1KB,64KB,1MB,16MB"
+FULL_SIZES  = "1KB,64KB,1MB,16MB,256MB,2GB"
+SUITES      = ("crypto", "kdf", "roundtrip")
+
+
+def _key(result):
+    return (result["suite"], result["case"], result.get("algo"), result.get("size"))
+
+
+def compare(baseline_path: str, results: list):
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+
+    print(f"\n{'case':<48} {'p50 before':>12} {'p50 after':>12} {'change':>8}")
+    for result in results:
+        old = baseline.get(_key(result))
+        if not old:
+            continue
+        name   = " ".join(str(p) for p in (result["case"], result.get("algo") or "",
+                                            format_size(result["size"]) if result.get("size") else ""))
+        change = (result["p50_s"] - old["p50_s"]) / old["p50_s"] * 100 if old["p50_s"] else 0
+        print(f"{name:<48} {old['p50_s'] * 1000:>10.2f}ms {result['p50_s'] * 1000:>10.2f}ms {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", default=",".join(SUITES), help="comma-separated: crypto,kdf,roundtrip")
+    parser.add_argument("--sizes", default=None, help=f"comma-separated sizes (default {QUICK_SIZES})")
+    parser.add_argument("--full", action="store_true", help=f"use {FULL_SIZES}")
+    parser.add_argument("--algos", default=None, help="comma-separated algorithms (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case for small sizes")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None, help="baseline JSON to diff p50 latencies against")
+    args = parser.parse_args(argv)
+
+    from utils.encryption import CIPHER_ENGINES
+
+    suites = [s.strip() for s in args.suite.split(",") if s.strip()]
+    sizes  = [parse_size(s) for s in (args.sizes or (FULL_SIZES if args.full else QUICK_SIZES)).split(",")]
+    algos  = [a.strip() for a in args.algos.split(",")] if args.algos else list(CIPHER_ENGINES)
+    for name in suites:
+        if name not in SUITES:
+            parser.error(f"unknown suite: {name}")
+    for algo in algos:
+        if algo not in CIPHER_ENGINES:
+            parser.error(f"unknown algorithm: {algo}")
+
+    results = []
+    if "kdf" in suites:
+        from benchmarks import kdf
+        results += kdf.run(args.repeat)
+    if "crypto" in suites:
+        from benchmarks import crypto
+        results += crypto.run(sizes, algos, args.repeat)
+    if "roundtrip" in suites:
+        from benchmarks import roundtrip
+        results += roundtrip.run(sizes, algos, args.repeat)
+
+    write_report(args.output, results, {"suites": suites, "sizes": sizes, "algos": algos,
+                                        "repeat": args.repeat})
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
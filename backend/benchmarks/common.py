@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import subprocess
+from datetime import datetime, timezone
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+
+def parse_size(value: str) -> int:
+    """'1KB' / '64MB' / '2GB' -> bytes."""
+    value = value.strip().upper()
+    for suffix, factor in (("GB", GB), ("MB", MB), ("KB", KB), ("B", 1)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    for suffix, factor in (("GB", GB), ("MB", MB), ("KB", KB)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return f"{size}B"
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (Linux /proc, else peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * KB
+
+
+class RSSSampler:
+    """Samples RSS on a background thread; `peak` is the max seen while active."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak     = 0
+        self._stop    = threading.Event()
+        self._thread  = None
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class PatternReader:
+    """
+    File-like object producing `size` bytes of pseudo-random data without
+    holding them in memory, so streaming paths can be measured at GB sizes.
+    Reads are memoryview slices of `block` repeated, built once per block
+    (and read size), so the reader itself copies nothing while timed.
+    """
+
+    _windows = {}
+
+    def __init__(self, size: int, block: bytes = None):
+        self.size  = size
+        self.pos   = 0
+        self.block = block or os.urandom(MB)
+        self._window(len(self.block))
+
+    def _window(self, n: int) -> memoryview:
+        # Long enough that n bytes from any offset within the block are one slice
+        window = self._windows.get(self.block)
+        if window is None or len(window) < len(self.block) + n:
+            window = memoryview(self.block * (-(-n // len(self.block)) + 1))
+            self._windows[self.block] = window
+        return window
+
+    def read(self, n: int = -1) -> memoryview:
+        remaining = self.size - self.pos
+        if n is None or n < 0 or n > remaining:
+            n = remaining
+        if n <= 0:
+            return b""
+        offset = self.pos % len(self.block)
+        self.pos += n
+        return self._window(n)[offset:offset + n]
+
+    def seek(self, pos: int, whence: int = 0):
+        self.pos = {0: pos, 1: self.pos + pos, 2: self.size + pos}[whence]
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(fn, repeat: int, size: int = 0, warmup: int = 1) -> dict:
+    """Run fn() `repeat` times; report latency percentiles, throughput and peak RSS."""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    with RSSSampler() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+
+    result = {
+        "runs": repeat,
+        "mean_s": sum(samples) / len(samples),
+        "p50_s": percentile(samples, 50),
+        "p90_s": percentile(samples, 90),
+        "p99_s": percentile(samples, 99),
+        "min_s": min(samples),
+        "peak_rss_mb": round(rss.peak / MB, 1),
+        "peak_rss_delta_mb": round((rss.peak - rss.baseline) / MB, 1),
+    }
+    if size:
+        result["throughput_mbps"] = round(size / MB / result["p50_s"], 1)
+    return result
+
+
+def environment_info() -> dict:
+    import cryptography
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "cryptography": cryptography.__version__,
+    }
+
+
+def write_report(path: str, results: list, args: dict):
+    report = {"meta": environment_info(), "args": args, "results": results}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -0,0 +1,117 @@
+import io
+import os
+import tempfile
+
+from utils.encryption import (
+    CIPHER_ENGINES, ContainerHeader, encrypt_stream, decrypt_stream, decrypt_range,
+    encrypt_file, decrypt_file, derive_file_key, instant_chunk_encryptor,
+    map_chunks_ordered, KDF_HKDF
+)
+from benchmarks.common import MB, PatternReader, format_size, measure
+
+ONESHOT_MAX_SIZE  = 256 * MB     # encrypt_file holds the whole file (and AEAD calls cap at 2GB)
+IN_MEMORY_MAX     = 64 * MB      # larger ciphertexts go to a temp file
+INSTANT_CHUNK     = 64 * MB
+
+
+class _Sink:
+    """Write target that only counts bytes."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def _runs(size: int, repeat: int):
+    # Big inputs are measured fewer times so a full run stays tractable
+    return (repeat, 1) if size <= 16 * MB else (max(1, min(repeat, 2)), 0)
+
+
+def run(sizes, algos, repeat: int, user_id: int = 1) -> list:
+    results = []
+    block   = os.urandom(MB)
+
+    for algo in algos:
+        engine = CIPHER_ENGINES[algo]
+        for size in sizes:
+            runs, warmup = _runs(size, repeat)
+            label = f"{algo} {format_size(size)}"
+            file_key, salt = derive_file_key(user_id)
+
+            # Segmented container — the cloud upload / download path
+            def container_encrypt():
+                sink = _Sink()
+                for piece in encrypt_stream(PatternReader(size, block), file_key,
+                                            ContainerHeader(algo, salt)):
+                    sink.write(piece)
+
+            results.append({"suite": "crypto", "case": "container_encrypt", "algo": algo,
+                            "size": size, **measure(container_encrypt, runs, size, warmup)})
+
+            if size <= IN_MEMORY_MAX:
+                enc = io.BytesIO()
+            else:
+                enc = tempfile.TemporaryFile()
+            for piece in encrypt_stream(PatternReader(size, block), file_key, ContainerHeader(algo, salt)):
+                enc.write(piece)
+
+            def container_decrypt():
+                enc.seek(0)
+                sink = _Sink()
+                for piece in decrypt_stream(enc, file_key):
+                    sink.write(piece)
+
+            results.append({"suite": "crypto", "case": "container_decrypt", "algo": algo,
+                            "size": size, **measure(container_decrypt, runs, size, warmup)})
+
+            # 1MB Range slice from the middle of the file
+            if size > MB:
+                start = size // 2
+
+                def container_range():
+                    enc.seek(0)
+                    for _ in decrypt_range(enc, file_key, size, start, start + MB):
+                        pass
+
+                results.append({"suite": "crypto", "case": "container_range_1mb", "algo": algo,
+                                "size": size, **measure(container_range, repeat, MB)})
+            enc.close()
+
+            # Legacy one-shot path (whole buffer in memory)
+            if size <= ONESHOT_MAX_SIZE:
+                data = bytes(PatternReader(size, block).read())
+                state = {}
+
+                def oneshot_encrypt():
+                    state["enc"] = encrypt_file(data, user_id, algo=algo)
+
+                results.append({"suite": "crypto", "case": "oneshot_encrypt", "algo": algo,
+                                "size": size, **measure(oneshot_encrypt, runs, size, warmup)})
+
+                encrypted, nonce, file_salt = state["enc"]
+
+                def oneshot_decrypt():
+                    decrypt_file(encrypted, nonce, file_salt, user_id, algo=algo, kdf=KDF_HKDF)
+
+                results.append({"suite": "crypto", "case": "oneshot_decrypt", "algo": algo,
+                                "size": size, **measure(oneshot_decrypt, runs, size, warmup)})
+                del data, encrypted, state
+
+            # Instant-mode parallel chunk pipeline
+            if size >= MB:
+                iv = os.urandom(12)
+
+                def instant_parallel():
+                    for _ in map_chunks_ordered(PatternReader(size, block),
+                                                instant_chunk_encryptor(algo, file_key, iv),
+                                                INSTANT_CHUNK, workers=os.cpu_count() or 1,
+                                                max_inflight_bytes=1024 * MB):
+                        pass
+
+                results.append({"suite": "crypto", "case": "instant_parallel_encrypt", "algo": algo,
+                                "size": size, **measure(instant_parallel, runs, size, warmup)})
+
+            print(f"  crypto  {label:<24} done")
+    return results
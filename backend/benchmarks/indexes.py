@@ -0,0 +1,281 @@
+"""
+Index benchmark: seed a large files / audit_logs table and record query
+plans and timings for the hot paths before and after migration 0003.
+
+    python -m benchmarks.indexes --database-url postgresql+psycopg2://postgres@localhost/sfl_bench
+    python -m benchmarks.indexes --database-url ... --rows 1000000 --output indexes.json
+    python -m benchmarks.indexes --database-url ... --skip-seed     # reuse the seeded rows
+
+Run from backend/ against a throwaway database: it is migrated down to
+the base schema (dropping every table) and seeded from scratch. Rows are
+generated server-side (generate_series on PostgreSQL, a recursive CTE on
+SQLite), one power user owning 2% of them. Each query runs under EXPLAIN
+ANALYZE (PostgreSQL) or EXPLAIN QUERY PLAN plus wall-clock timing
+(SQLite) at revision 0002, then again at head.
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone, timedelta
+
+os.environ.setdefault("MASTER_ENCRYPTION_KEY", "benchmark-master-key")
+
+from benchmarks.common import percentile, write_report
+
+BASE_REVISION = "0002"
+POWER_USER    = 1
+SCAN_NODE     = re.compile(r"((?:Parallel )?(?:Index Only Scan|Index Scan|Bitmap Index Scan|Seq Scan)"
+                           r"(?: Backward)?(?: using \w+)?(?: on \w+)?)")
+
+SEED_SQL = {
+    "postgresql": {
+        "users": """
+            INSERT INTO users (id, username, email, password_hash, is_active, is_admin, created_at)
+            SELECT g, 'seed_user_' || g, 'seed' || g || '@bench.local', 'x', true, false, now()
+            FROM generate_series(1, :users + 1) AS g""",
+        "files": """
+            INSERT INTO files (id, user_id, original_name, safe_name, file_size, mime_type, extension,
+                               s3_key, is_encrypted, encryption_algo, sha256_hash, encryption_iv,
+                               is_shared, share_token, share_expires, is_deleted, deleted_at,
+                               created_at, updated_at)
+            SELECT g,
+                   CASE WHEN g % 50 = 0 THEN 1 ELSE 2 + g % :users END,
+                   'file_' || g || '.' || (ARRAY['pdf','png','txt','csv'])[1 + g % 4],
+                   'file_' || g,
+                   (g::bigint * 7919) % 100000000,
+                   (ARRAY['application/pdf','image/png','text/plain','text/csv'])[1 + g % 4],
+                   (ARRAY['pdf','png','txt','csv'])[1 + g % 4],
+                   'seed/' || g || '.enc', true,
+                   (ARRAY['AES-256-GCM','ChaCha20','Fernet'])[1 + g % 3],
+                   md5(g::text) || md5((g + 1)::text), 'seed',
+                   g % 100 = 1,
+                   CASE WHEN g % 100 = 1 THEN md5('share' || g) END,
+                   CASE WHEN g % 100 = 1 THEN now() + ((g % 200) - 100) * interval '1 hour' END,
+                   g % 20 = 0,
+                   CASE WHEN g % 20 = 0 THEN now() - (g % 90) * interval '1 day' END,
+                   timestamp '2020-01-01' + g * interval '10 seconds',
+                   timestamp '2020-01-01' + g * interval '10 seconds'
+            FROM generate_series(1, :rows) AS g""",
+        "audit_logs": """
+            INSERT INTO audit_logs (id, user_id, action, resource, status, timestamp)
+            SELECT g, CASE WHEN g % 50 = 0 THEN 1 ELSE 2 + g % :users END,
+                   'FILE_DOWNLOAD', 'file:' || g, 'success',
+                   timestamp '2020-01-01' + g * interval '30 seconds'
+            FROM generate_series(1, :audit_rows) AS g""",
+    },
+    "sqlite": {
+        "users": """
+            WITH RECURSIVE seq(g) AS (SELECT 1 UNION ALL SELECT g + 1 FROM seq WHERE g < :users + 1)
+            INSERT INTO users (id, username, email, password_hash, is_active, is_admin, created_at)
+            SELECT g, 'seed_user_' || g, 'seed' || g || '@bench.local', 'x', 1, 0, datetime('now')
+            FROM seq""",
+        "files": """
+            WITH RECURSIVE seq(g) AS (SELECT 1 UNION ALL SELECT g + 1 FROM seq WHERE g < :rows)
+            INSERT INTO files (id, user_id, original_name, safe_name, file_size, mime_type, extension,
+                               s3_key, is_encrypted, encryption_algo, sha256_hash, encryption_iv,
+                               is_shared, share_token, share_expires, is_deleted, deleted_at,
+                               created_at, updated_at)
+            SELECT g,
+                   CASE WHEN g % 50 = 0 THEN 1 ELSE 2 + g % :users END,
+                   'file_' || g || '.' || (CASE g % 4 WHEN 0 THEN 'pdf' WHEN 1 THEN 'png' WHEN 2 THEN 'txt' ELSE 'csv' END),
+                   'file_' || g,
+                   (g * 7919) % 100000000,
+                   CASE g % 4 WHEN 0 THEN 'application/pdf' WHEN 1 THEN 'image/png'
+                              WHEN 2 THEN 'text/plain' ELSE 'text/csv' END,
+                   CASE g % 4 WHEN 0 THEN 'pdf' WHEN 1 THEN 'png' WHEN 2 THEN 'txt' ELSE 'csv' END,
+                   'seed/' || g || '.enc', 1,
+                   CASE g % 3 WHEN 0 THEN 'AES-256-GCM' WHEN 1 THEN 'ChaCha20' ELSE 'Fernet' END,
+                   printf('%064d', g), 'seed',
+                   g % 100 = 1,
+                   CASE WHEN g % 100 = 1 THEN printf('share%059d', g) END,
+                   CASE WHEN g % 100 = 1 THEN datetime('now', ((g % 200) - 100) || ' hours') END,
+                   g % 20 = 0,
+                   CASE WHEN g % 20 = 0 THEN datetime('now', '-' || (g % 90) || ' days') END,
+                   datetime('2020-01-01', '+' || (g * 10) || ' seconds'),
+                   datetime('2020-01-01', '+' || (g * 10) || ' seconds')
+            FROM seq""",
+        "audit_logs": """
+            WITH RECURSIVE seq(g) AS (SELECT 1 UNION ALL SELECT g + 1 FROM seq WHERE g < :audit_rows)
+            INSERT INTO audit_logs (id, user_id, action, resource, status, timestamp)
+            SELECT g, CASE WHEN g % 50 = 0 THEN 1 ELSE 2 + g % :users END,
+                   'FILE_DOWNLOAD', 'file:' || g, 'success',
+                   datetime('2020-01-01', '+' || (g * 30) || ' seconds')
+            FROM seq""",
+    },
+}
+
+
+def hot_queries(rows: int, dialect: str) -> dict:
+    """The application's hot queries, built the way the routes build them."""
+    from extensions import db
+    from models.file import File, AuditLog
+
+    live     = File.query.filter(File.user_id == POWER_USER, File.is_deleted == db.false())
+    midpoint = datetime(2020, 1, 1) + timedelta(seconds=rows * 5)   # half-way through the power user's files
+    probe    = rows // 2 // 50 * 50 + 50                              # a power-user file id
+    share_id = rows // 2 // 100 * 100 + 1
+    cutoff   = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=30)
+    week     = datetime(2020, 1, 1) + timedelta(seconds=rows // 10 * 30)   # mid audit history (default --audit-rows)
+    audit    = (AuditLog.timestamp.desc(), AuditLog.id.desc())             # the audit API's keyset order
+
+    return {
+        "list_first_page": live.order_by(File.created_at.desc(), File.id.desc()).limit(51),
+        "list_deep_page": live.filter(db.tuple_(File.created_at, File.id) < (midpoint, rows))
+                              .order_by(File.created_at.desc(), File.id.desc()).limit(51),
+        "list_by_name": live.order_by(File.original_name.asc(), File.id.asc()).limit(51),
+        "list_by_size": live.order_by(File.file_size.desc(), File.id.desc()).limit(51),
+        "get_file_or_404": File.query.filter_by(id=probe, user_id=POWER_USER, is_deleted=False),
+        "shared_link": File.query.filter_by(share_token=_share_token(share_id, dialect),
+                                            is_deleted=False),
+        "find_duplicate": File.query.filter(File.user_id == POWER_USER,
+                                            File.sha256_hash == _sha256(probe, dialect),
+                                            File.is_deleted == db.false()).order_by(File.id).limit(1),
+        "gc_purge_batch": File.query.filter(File.is_deleted == db.true(),
+                                            File.deleted_at < cutoff,
+                                            File.id > 0).order_by(File.id).limit(200),
+        "audit_for_user": AuditLog.query.filter_by(user_id=POWER_USER)
+                                  .order_by(*audit).limit(101),
+        "audit_user_week": AuditLog.query.filter(AuditLog.user_id == POWER_USER,
+                                                 AuditLog.timestamp >= week - timedelta(days=7),
+                                                 AuditLog.timestamp < week)
+                                   .order_by(*audit).limit(101),
+        "audit_resource": AuditLog.query.filter(AuditLog.resource == f"file:{probe}")
+                                  .order_by(*audit).limit(101),
+        "audit_all_users": AuditLog.query.filter(AuditLog.timestamp < week)
+                                   .order_by(*audit).limit(101),
+    }
+
+
+# The values SEED_SQL generates for row g
+def _sha256(g: int, dialect: str) -> str:
+    if dialect == "postgresql":
+        return hashlib.md5(str(g).encode()).hexdigest() + hashlib.md5(str(g + 1).encode()).hexdigest()
+    return f"{g:064d}"
+
+
+def _share_token(g: int, dialect: str) -> str:
+    if dialect == "postgresql":
+        return hashlib.md5(f"share{g}".encode()).hexdigest()
+    return f"share{g:059d}"
+
+
+def _sql(query, dialect) -> str:
+    return str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(connection, name: str, sql: str, repeat: int) -> dict:
+    from sqlalchemy import text
+
+    if connection.dialect.name == "postgresql":
+        timings, plan = [], []
+        for _ in range(repeat):
+            plan = [r[0] for r in connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))]
+            timings.append(next(float(line.split(":")[1].split()[0]) for line in plan
+                                if line.startswith("Execution Time")))
+    else:
+        plan = [r[-1] for r in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            connection.execute(text(sql)).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    nodes = sorted({m.group(1) for line in plan for m in SCAN_NODE.finditer(line)}
+                   or {line.strip() for line in plan if "SCAN" in line or "SEARCH" in line})
+    return {"query": name, "p50_ms": round(percentile(timings, 50), 3),
+            "min_ms": round(min(timings), 3), "scans": nodes, "plan": plan}
+
+
+def run_queries(app, rows: int, repeat: int, label: str) -> list:
+    from sqlalchemy import text
+    from extensions import db
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+            connection.commit()
+            results = []
+            for name, query in hot_queries(rows, connection.dialect.name).items():
+                result = explain(connection, name, _sql(query, connection.dialect), repeat)
+                result["revision"] = label
+                results.append(result)
+                sys.stderr.write(f"  {label:<6} {name:<18} {result['p50_ms']:>10.3f}ms  "
+                                 f"{', '.join(result['scans'])}\n")
+    return results
+
+
+def seed(app, rows: int, users: int, audit_rows: int):
+    from sqlalchemy import text
+    from extensions import db
+
+    with app.app_context():
+        statements = SEED_SQL[db.engine.dialect.name]
+        params     = {"rows": rows, "users": users, "audit_rows": audit_rows}
+        with db.engine.begin() as connection:
+            for table in ("users", "files", "audit_logs"):
+                started = time.monotonic()
+                connection.execute(text(statements[table]), params)
+                sys.stderr.write(f"  seeded {table} in {time.monotonic() - started:.1f}s\n")
+            if db.engine.dialect.name == "postgresql":
+                for table in ("users", "files", "audit_logs"):
+                    connection.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT max(id) FROM {table}))"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.indexes", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True,
+                        help="throwaway database; every table in it is dropped")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="files rows (default 10M)")
+    parser.add_argument("--users", type=int, default=1000, help="other users sharing the rest")
+    parser.add_argument("--audit-rows", type=int, default=None, help="audit_logs rows (default rows/5)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse rows seeded by an earlier run")
+    parser.add_argument("--output", default="index-results.json")
+    args = parser.parse_args(argv)
+
+    os.environ["TEST_DATABASE_URL"] = args.database_url
+    import flask_migrate
+    from app import create_app
+    from extensions import db
+
+    app = create_app("testing")
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if dialect not in SEED_SQL:
+            parser.error("only PostgreSQL and SQLite are supported")
+        if args.skip_seed:
+            flask_migrate.downgrade(revision=BASE_REVISION)
+        else:
+            flask_migrate.downgrade(revision="base")
+            flask_migrate.upgrade(revision=BASE_REVISION)
+    if not args.skip_seed:
+        seed(app, args.rows, args.users, args.audit_rows or args.rows // 5)
+
+    results = run_queries(app, args.rows, args.repeat, BASE_REVISION)
+
+    started = time.monotonic()
+    with app.app_context():
+        flask_migrate.upgrade()
+    sys.stderr.write(f"  migrated to head in {time.monotonic() - started:.1f}s\n")
+    results += run_queries(app, args.rows, args.repeat, "head")
+
+    before = {r["query"]: r for r in results if r["revision"] == BASE_REVISION}
+    print(f"\n{'query':<18} {'before':>11} {'after':>11}  plan after")
+    for result in results:
+        if result["revision"] != "head":
+            continue
+        old = before[result["query"]]
+        print(f"{result['query']:<18} {old['p50_ms']:>9.2f}ms {result['p50_ms']:>9.2f}ms  "
+              f"{', '.join(result['scans'])}")
+
+    write_report(args.output, results, {**vars(args), "database_url": dialect})
+
+
+if __name__ == "__main__":
+    main()
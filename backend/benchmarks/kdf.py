@@ -0,0 +1,33 @@
+import os
+
+from utils.encryption import _pbkdf2_user_key, get_user_key, derive_file_key, _key_cache
+from models.user import ph
+from benchmarks.common import measure
+
+
+def run(repeat: int, user_id: int = 1) -> list:
+    results = []
+    salt = os.urandom(16)
+
+    def case(name, fn, runs=repeat):
+        results.append({"suite": "kdf", "case": name, **measure(fn, runs)})
+        print(f"  kdf     {name:<24} done")
+
+    # Legacy per-file PBKDF2 (600k iterations), uncached
+    case("pbkdf2_600k", lambda: _pbkdf2_user_key(user_id, salt), runs=max(1, min(repeat, 5)))
+
+    # HKDF per-user key: cold (cache cleared) vs warm, then per-file key on a warm cache
+    def hkdf_user_cold():
+        _key_cache.clear()
+        get_user_key(user_id)
+
+    case("hkdf_user_key_cold", hkdf_user_cold)
+    case("hkdf_user_key_cached", lambda: get_user_key(user_id))
+    case("hkdf_file_key", lambda: derive_file_key(user_id, salt=salt))
+
+    # Argon2 password hashing settings from models/user.py
+    password = "Benchmark!Passw0rd"
+    hashed   = ph.hash(password)
+    case("argon2_hash", lambda: ph.hash(password))
+    case("argon2_verify", lambda: ph.verify(hashed, password))
+    return results
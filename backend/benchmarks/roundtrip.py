@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import MB, PatternReader, format_size, measure
+
+PASSWORD = "Benchmark!Passw0rd"
+
+
+def _make_app():
+    """
+    App on a local database (TEST_DATABASE_URL, default: a temp SQLite file)
+    that stores blobs in a temp directory, never the real uploads/.
+    """
+    if "TEST_DATABASE_URL" not in os.environ:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="sfl-bench-"), "bench.db")
+        os.environ["TEST_DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from app import create_app
+    from extensions import db
+    from utils.storage import init_storage
+
+    app = create_app("testing")
+    app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp(prefix="sfl-bench-uploads-")
+    init_storage(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _cleanup(app):
+    from extensions import db
+    from models.file import File
+
+    from utils.storage import get_storage
+
+    with app.app_context():
+        storage = get_storage()
+        for file in File.query.all():
+            storage.delete(file.storage_key)
+        db.drop_all()
+    shutil.rmtree(app.config["UPLOAD_FOLDER"], ignore_errors=True)
+
+
+def run(sizes, algos, repeat: int) -> list:
+    app     = _make_app()
+    client  = app.test_client()
+    results = []
+
+    try:
+        email = f"bench-{os.getpid()}@example.com"
+        client.post("/api/auth/register", json={
+            "username": f"bench_{os.getpid()}", "email": email, "password": PASSWORD})
+
+        def login():
+            resp = client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+            return resp.get_json()["data"]["access_token"]
+
+        results.append({"suite": "roundtrip", "case": "login", **measure(login, repeat)})
+        headers = {"Authorization": f"Bearer {login()}"}
+
+        for algo in algos:
+            for size in sizes:
+                runs = repeat if size <= 16 * MB else 1
+                state = {}
+                # A fresh payload per run (built before timing), so no upload is
+                # deduplicated onto an earlier one; "%PDF" passes the magic-byte check
+                readers = iter([PatternReader(size, b"%PDF" + os.urandom(MB - 4))
+                                for _ in range(runs)])
+
+                def upload():
+                    resp = client.post("/api/files/upload", headers=headers,
+                                       content_type="multipart/form-data",
+                                       data={"algo": algo, "file": (next(readers), "bench.pdf")})
+                    assert resp.status_code == 201, resp.get_json()
+                    state["id"] = resp.get_json()["data"]["id"]
+
+                def download():
+                    resp = client.get(f"/api/files/download/{state['id']}", headers=headers,
+                                      buffered=False)
+                    received = sum(len(chunk) for chunk in resp.response)
+                    resp.close()
+                    assert received == size, (received, size)
+
+                def download_first_byte():
+                    resp = client.get(f"/api/files/download/{state['id']}", headers=headers,
+                                      buffered=False)
+                    next(iter(resp.response))
+                    resp.close()
+
+                results.append({"suite": "roundtrip", "case": "upload", "algo": algo, "size": size,
+                                **measure(upload, runs, size, warmup=0)})
+                results.append({"suite": "roundtrip", "case": "download", "algo": algo, "size": size,
+                                **measure(download, runs, size, warmup=0)})
+                results.append({"suite": "roundtrip", "case": "download_ttfb", "algo": algo,
+                                "size": size, **measure(download_first_byte, runs, warmup=0)})
+                print(f"  http    {algo} {format_size(size):<14} done")
+    finally:
+        _cleanup(app)
+    return results
@@ -44,15 +44,55 @@ class Config:
     AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
+    # ── Blob Storage ──────────────────────────────────
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")   # local (UPLOAD_FOLDER) or s3 (AWS_BUCKET_NAME)
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")   # S3-compatible endpoint (MinIO, moto_server)
+    S3_KEY_PREFIX = os.getenv("S3_KEY_PREFIX", "")
+    S3_MULTIPART_PART_SIZE = int(os.getenv("S3_MULTIPART_PART_SIZE_MB", 16)) * 1024 * 1024
+    S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", 8))
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+
     # ── Encryption ────────────────────────────────────
     MASTER_ENCRYPTION_KEY = os.getenv("MASTER_ENCRYPTION_KEY")
+    # MASTER_KEY_VERSION and retired MASTER_ENCRYPTION_KEY_V<n> are read from the
+    # environment by utils.encryption (also outside an app context, e.g. worker threads)
+    DEFAULT_ENCRYPTION_ALGO = os.getenv("DEFAULT_ENCRYPTION_ALGO")   # unset = fastest AEAD measured at startup
+    CIPHER_BENCHMARK_ON_STARTUP = os.getenv("CIPHER_BENCHMARK_ON_STARTUP", "True") == "True"
+    CIPHER_BENCHMARK_BYTES = int(os.getenv("CIPHER_BENCHMARK_MB", 4)) * 1024 * 1024
 
     # ── File Upload ───────────────────────────────────
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024 * 1024   # 100MB max file size
+    CLOUD_MAX_FILE_SIZE = int(os.getenv("CLOUD_MAX_FILE_SIZE", 50 * 1024 * 1024 * 1024))  # 50GB, streamed to disk
     ALLOWED_EXTENSIONS = {
         "pdf", "txt", "png", "jpg", "jpeg",
         "docx", "xlsx", "zip", "csv"
     }
+    UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "auto")   # auto (zstd if installed, else zlib), zlib, zstd, none
+    SHARED_CACHE_MAX_AGE = int(os.getenv("SHARED_CACHE_MAX_AGE", 0))   # seconds proxies may keep share links; 0 = never
+
+    # ── Instant Encrypt ───────────────────────────────
+    INSTANT_CHUNK_SIZE = 64 * 1024 * 1024   # per-chunk AEAD call, below the 2GB limit
+    INSTANT_ENCRYPT_WORKERS = int(os.getenv("INSTANT_ENCRYPT_WORKERS", os.cpu_count() or 1))
+    INSTANT_ENCRYPT_MAX_INFLIGHT = int(os.getenv("INSTANT_ENCRYPT_MAX_INFLIGHT_MB", 1024)) * 1024 * 1024
+
+    # ── Resumable Uploads (instant encrypt) ───────────
+    UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_MB", 8)) * 1024 * 1024
+    UPLOAD_SESSION_TTL = timedelta(hours=int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24)))   # since the last chunk
+    UPLOAD_SESSION_MAX_OPEN = int(os.getenv("UPLOAD_SESSION_MAX_OPEN", 5))   # unfinished sessions per user
+    UPLOAD_SESSION_MAX_SIZE = int(os.getenv("UPLOAD_SESSION_MAX_SIZE", 1024 ** 4))   # 1TB per resumable upload
+
+    # ── Audit Log Writer ──────────────────────────────
+    AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "True") == "True"   # False = write each event inline
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))   # rows per multi-row INSERT
+    AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 1000))
+    AUDIT_OVERFLOW = os.getenv("AUDIT_OVERFLOW", "drop_newest")   # drop_newest, drop_oldest, block, sync
+    AUDIT_BLOCK_TIMEOUT_MS = int(os.getenv("AUDIT_BLOCK_TIMEOUT_MS", 50))   # AUDIT_OVERFLOW=block
+
+    # ── Audit Log Retention (tools.audit_logs) ────────
+    AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", 12))   # raw rows; rollups are kept
+    AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "audit-archive"))
 
     # ── Rate Limiting ─────────────────────────────────
     RATELIMIT_DEFAULT = "200 per day;50 per hour"
@@ -75,8 +115,20 @@ class ProductionConfig(Config):
     }
 
 
+class TestingConfig(Config):
+    """Local, disposable setup for benchmarks and tests."""
+    TESTING = True
+    ENV = "testing"
+    SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URL", "sqlite:///:memory:")
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    RATELIMIT_ENABLED = False
+    CIPHER_BENCHMARK_ON_STARTUP = False
+    AUDIT_ASYNC = False   # rows visible as soon as log_action returns (and :memory: shares one connection)
+
+
 config = {
     "development": DevelopmentConfig,
     "production": ProductionConfig,
+    "testing": TestingConfig,
     "default": DevelopmentConfig
 }
\ No newline at end of file
@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 db = SQLAlchemy()
+migrate = Migrate()
 jwt = JWTManager()
 limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
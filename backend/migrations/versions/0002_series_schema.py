@@ -0,0 +1,120 @@
+"""blobs, key wrapping, containers, upload sessions, re-encryption jobs
+
+The tables and files columns added since the original schema:
+wrapped_key / kek_version (envelope encryption), container_version /
+compression (segmented containers), blob_id (deduplicated blobs), and
+the blobs, upload_sessions, upload_chunks and reencryption_jobs tables.
+The new files columns are nullable; existing rows keep NULL and are read
+as legacy files.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:12:47.530215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('storage_key', sa.String(length=500), nullable=False),
+    sa.Column('sha256_hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('storage_key')
+    )
+    op.create_table('reencryption_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('target_algo', sa.String(length=50), nullable=False),
+    sa.Column('source_algo', sa.String(length=50), nullable=True),
+    sa.Column('filter_user_id', sa.Integer(), nullable=True),
+    sa.Column('min_size', sa.BigInteger(), nullable=True),
+    sa.Column('max_size', sa.BigInteger(), nullable=True),
+    sa.Column('total_files', sa.Integer(), nullable=False),
+    sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('done_files', sa.Integer(), nullable=False),
+    sa.Column('done_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('failed_files', sa.Integer(), nullable=False),
+    sa.Column('failed_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('cursor', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['filter_user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('original_name', sa.String(length=255), nullable=False),
+    sa.Column('file_size', sa.BigInteger(), nullable=False),
+    sa.Column('chunk_size', sa.Integer(), nullable=False),
+    sa.Column('num_chunks', sa.Integer(), nullable=False),
+    sa.Column('encryption_algo', sa.String(length=50), nullable=False),
+    sa.Column('salt', sa.String(length=64), nullable=False),
+    sa.Column('iv', sa.String(length=64), nullable=False),
+    sa.Column('wrapped_key', sa.String(length=128), nullable=False),
+    sa.Column('kek_version', sa.Integer(), nullable=False),
+    sa.Column('download_token', sa.String(length=64), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_sessions_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_upload_sessions_user_id'), ['user_id'], unique=False)
+
+    op.create_table('upload_chunks',
+    sa.Column('session_id', sa.String(length=64), nullable=False),
+    sa.Column('index', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('sealed_size', sa.Integer(), nullable=False),
+    sa.Column('sha256_hash', sa.String(length=64), nullable=False),
+    sa.Column('storage_key', sa.String(length=500), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['upload_sessions.id'], ),
+    sa.PrimaryKeyConstraint('session_id', 'index')
+    )
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('wrapped_key', sa.String(length=128), nullable=True))
+        batch_op.add_column(sa.Column('kek_version', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('container_version', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('compression', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('files_blob_id_fkey', 'blobs', ['blob_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_constraint('files_blob_id_fkey', type_='foreignkey')
+        batch_op.drop_column('blob_id')
+        batch_op.drop_column('compression')
+        batch_op.drop_column('container_version')
+        batch_op.drop_column('kek_version')
+        batch_op.drop_column('wrapped_key')
+
+    op.drop_table('upload_chunks')
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_sessions_user_id'))
+        batch_op.drop_index(batch_op.f('ix_upload_sessions_expires_at'))
+
+    op.drop_table('upload_sessions')
+    op.drop_table('reencryption_jobs')
+    op.drop_table('blobs')
@@ -0,0 +1,65 @@
+"""hot path indexes
+
+Composite indexes for the file listing (one per sort column), dedup
+lookups, gc sweeps and per-user audit queries. The files indexes are
+partial: live rows only (or deleted / shared rows for the gc ones).
+On PostgreSQL they are built CONCURRENTLY so uploads and deletes keep
+running while a large table is indexed.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:02:15.518585
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+LIVE    = {"postgresql_where": sa.text("is_deleted = false"), "sqlite_where": sa.text("is_deleted = 0")}
+DELETED = {"postgresql_where": sa.text("is_deleted = true"), "sqlite_where": sa.text("is_deleted = 1")}
+SHARED  = {"postgresql_where": sa.text("share_token IS NOT NULL"),
+           "sqlite_where": sa.text("share_token IS NOT NULL")}
+
+INDEXES = [
+    ("ix_files_live_user_created", "files", ["user_id", "created_at", "id"], LIVE),
+    ("ix_files_live_user_name", "files", ["user_id", "original_name", "id"], LIVE),
+    ("ix_files_live_user_size", "files", ["user_id", "file_size", "id"], LIVE),
+    ("ix_files_live_user_hash", "files", ["user_id", "sha256_hash"], LIVE),
+    ("ix_files_deleted_id", "files", ["id", "deleted_at"], DELETED),
+    ("ix_files_share_expires", "files", ["share_expires"], SHARED),
+    ("ix_files_blob_id", "files", ["blob_id"], {}),
+    ("ix_audit_logs_user_timestamp", "audit_logs", ["user_id", "timestamp"], {}),
+]
+
+
+def _concurrently() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade():
+    if _concurrently():
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns, where in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True,
+                                if_not_exists=True, **where)
+    else:
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, **where)
+
+
+def downgrade():
+    if _concurrently():
+        with op.get_context().autocommit_block():
+            for name, table, _, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,174 @@
+"""partition audit_logs by month, daily rollups
+
+PostgreSQL: audit_logs becomes a table range-partitioned on timestamp.
+The existing table is kept as-is and attached as the partition
+audit_logs_legacy (everything before next month), so no rows are copied.
+Everything that scans the old table runs first, while it stays writable:
+a CHECK matching the partition bound is added NOT VALID and validated,
+and the (id, timestamp) unique index a partitioned primary key needs is
+built CONCURRENTLY, as is the timestamp BRIN index. The swap itself then
+only takes brief locks: SET NOT NULL and ATTACH PARTITION trust the
+validated CHECK instead of scanning, and the primary key is switched to
+the prebuilt index. Monthly partitions for the next few months and a
+DEFAULT partition are created here; tools.audit_logs creates later ones
+and archives + drops old ones.
+
+SQLite (development) has no partitioning: tools.audit_logs archives and
+deletes old months with plain DELETEs instead.
+
+Both: audit_daily_rollups, a timestamp index (BRIN on PostgreSQL) and
+audit_logs.timestamp NOT NULL.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 15:40:02.114377
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+MONTHS_AHEAD = 3
+
+
+def _month_start(year: int, month: int) -> datetime:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+def _partition_sql(start: datetime) -> str:
+    end = _month_start(start.year, start.month + 1)
+    return (f'CREATE TABLE IF NOT EXISTS audit_logs_y{start:%Y}m{start:%m} PARTITION OF audit_logs '
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')")
+
+
+def _prepare_postgresql(bound: datetime):
+    """The scans, each committed on its own and none blocking writes for long."""
+    with op.get_context().autocommit_block():
+        for statement in (
+            # The partition key must be NOT NULL; this takes row locks only
+            "UPDATE audit_logs SET \"timestamp\" = now() AT TIME ZONE 'utc' WHERE \"timestamp\" IS NULL",
+
+            # Exactly the legacy partition's bound. NOT VALID takes a brief lock and no scan;
+            # VALIDATE scans under a lock that lets inserts continue
+            "ALTER TABLE audit_logs DROP CONSTRAINT IF EXISTS audit_logs_legacy_bound",
+            "ALTER TABLE audit_logs ADD CONSTRAINT audit_logs_legacy_bound "
+            f"CHECK (\"timestamp\" IS NOT NULL AND \"timestamp\" < '{bound:%Y-%m-%d}') NOT VALID",
+            "ALTER TABLE audit_logs VALIDATE CONSTRAINT audit_logs_legacy_bound",
+
+            # Indexes the partition needs to match the new parent's; an interrupted
+            # earlier run can leave one INVALID, so rebuild rather than skip
+            "DROP INDEX CONCURRENTLY IF EXISTS audit_logs_legacy_pkey",
+            'CREATE UNIQUE INDEX CONCURRENTLY audit_logs_legacy_pkey ON audit_logs (id, "timestamp")',
+            "DROP INDEX CONCURRENTLY IF EXISTS audit_logs_legacy_timestamp_idx",
+            'CREATE INDEX CONCURRENTLY audit_logs_legacy_timestamp_idx ON audit_logs USING brin ("timestamp")',
+        ):
+            op.execute(statement)
+
+
+def _partition_postgresql():
+    now   = datetime.now(timezone.utc)
+    bound = _month_start(now.year, now.month + 1)   # legacy keeps the current month
+    _prepare_postgresql(bound)
+
+    for statement in (
+        # Keep the old table (and its sequence) under a new name
+        "ALTER TABLE audit_logs RENAME TO audit_logs_legacy",
+        "ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_user_id_fkey TO audit_logs_legacy_user_id_fkey",
+        "ALTER INDEX ix_audit_logs_user_timestamp RENAME TO audit_logs_legacy_user_timestamp_idx",
+        "ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE",
+
+        # No scans: the validated CHECK proves NOT NULL, the index is already built
+        'ALTER TABLE audit_logs_legacy ALTER COLUMN "timestamp" SET NOT NULL',
+        "ALTER TABLE audit_logs_legacy DROP CONSTRAINT audit_logs_pkey",
+        "ALTER TABLE audit_logs_legacy ADD CONSTRAINT audit_logs_legacy_pkey "
+        "PRIMARY KEY USING INDEX audit_logs_legacy_pkey",
+
+        """CREATE TABLE audit_logs (
+            id          integer NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+            user_id     integer REFERENCES users (id),
+            action      varchar(100) NOT NULL,
+            resource    varchar(200),
+            ip_address  varchar(45),
+            user_agent  text,
+            status      varchar(20) NOT NULL,
+            details     text,
+            "timestamp" timestamp without time zone NOT NULL,
+            CONSTRAINT audit_logs_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")""",
+        "ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id",
+        'CREATE INDEX ix_audit_logs_user_timestamp ON audit_logs (user_id, "timestamp")',
+        'CREATE INDEX ix_audit_logs_timestamp ON audit_logs USING brin ("timestamp")',
+
+        # Matching indexes and the foreign key on the old table are reused, not rebuilt,
+        # and the CHECK implies the partition bound, so there is no validation scan
+        "ALTER TABLE audit_logs ATTACH PARTITION audit_logs_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{bound:%Y-%m-%d}')",
+        "ALTER TABLE audit_logs_legacy DROP CONSTRAINT audit_logs_legacy_bound",
+        *(_partition_sql(_month_start(bound.year, bound.month + i)) for i in range(MONTHS_AHEAD)),
+        "CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT",
+    ):
+        op.execute(statement)
+
+
+def _unpartition_postgresql():
+    # Rows in partitions already archived and dropped by tools.audit_logs are not restored
+    for statement in (
+        "CREATE TABLE audit_logs_flat (LIKE audit_logs INCLUDING DEFAULTS)",
+        "INSERT INTO audit_logs_flat SELECT * FROM audit_logs",
+        "ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE",
+        "DROP TABLE audit_logs",
+        "ALTER TABLE audit_logs_flat RENAME TO audit_logs",
+        "ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id",
+        "ALTER TABLE audit_logs ADD CONSTRAINT audit_logs_pkey PRIMARY KEY (id)",
+        "ALTER TABLE audit_logs ADD CONSTRAINT audit_logs_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id)",
+        'ALTER TABLE audit_logs ALTER COLUMN "timestamp" DROP NOT NULL',
+        'CREATE INDEX ix_audit_logs_user_timestamp ON audit_logs (user_id, "timestamp")',
+    ):
+        op.execute(statement)
+
+
+def upgrade():
+    op.create_table('audit_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_daily_rollups_user_day', 'audit_daily_rollups', ['user_id', 'day'])
+    op.create_index('ix_audit_daily_rollups_day', 'audit_daily_rollups', ['day'])
+
+    if op.get_bind().dialect.name == "postgresql":
+        _partition_postgresql()
+    else:
+        op.execute(sa.text("UPDATE audit_logs SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL"))
+        with op.batch_alter_table('audit_logs') as batch_op:
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=False)
+        op.create_index('ix_audit_logs_timestamp', 'audit_logs', ['timestamp'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _unpartition_postgresql()
+    else:
+        op.drop_index('ix_audit_logs_timestamp', table_name='audit_logs')
+        with op.batch_alter_table('audit_logs') as batch_op:
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=True)
+
+    op.drop_index('ix_audit_daily_rollups_day', table_name='audit_daily_rollups')
+    op.drop_index('ix_audit_daily_rollups_user_day', table_name='audit_daily_rollups')
+    op.drop_table('audit_daily_rollups')
@@ -0,0 +1,83 @@
+"""audit query indexes
+
+Indexes for the audit query API, each ending in its keyset order
+(timestamp, id): per user, per IP, per resource, and all users (admin
+scope=all; also serves the daily rollups). They replace (user_id,
+timestamp) and the timestamp BRIN index from 0004.
+
+On a partitioned audit_logs, CREATE INDEX CONCURRENTLY isn't available
+for the parent, so each index is created ON ONLY the parent, built
+CONCURRENTLY on every partition and attached; inserts keep running
+throughout. Partitions created later inherit the indexes.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 18:05:41.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_audit_logs_user_timestamp_id", ["user_id", "timestamp", "id"]),
+    ("ix_audit_logs_ip_timestamp_id", ["ip_address", "timestamp", "id"]),
+    ("ix_audit_logs_resource_timestamp_id", ["resource", "timestamp", "id"]),
+    ("ix_audit_logs_timestamp_id", ["timestamp", "id"]),
+]
+REPLACED = [
+    ("ix_audit_logs_user_timestamp", ["user_id", "timestamp"], {}),
+    ("ix_audit_logs_timestamp", ["timestamp"], {"postgresql_using": "brin"}),
+]
+
+
+def _partitions() -> list:
+    return list(op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('audit_logs')"
+    )).scalars())
+
+
+def _create_postgresql():
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            if not partitions:
+                op.create_index(name, 'audit_logs', columns, postgresql_concurrently=True,
+                                if_not_exists=True)
+                continue
+            column_list = ", ".join(f'"{c}"' for c in columns)
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY audit_logs ({column_list})")
+            for partition in partitions:
+                child = f"{partition}_{name[len('ix_audit_logs_'):]}"
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} "
+                           f"ON {partition} ({column_list})")
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+        # Dropping an index on a partitioned table can't be CONCURRENT; it only takes a brief lock
+        for name, _, _ in REPLACED:
+            op.drop_index(name, table_name='audit_logs', if_exists=True)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _create_postgresql()
+        return
+    for name, columns in INDEXES:
+        op.create_index(name, 'audit_logs', columns, if_not_exists=True)
+    for name, _, _ in REPLACED:
+        op.drop_index(name, table_name='audit_logs', if_exists=True)
+
+
+def downgrade():
+    for name, columns, kwargs in REPLACED:
+        op.create_index(name, 'audit_logs', columns, if_not_exists=True, **kwargs)
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='audit_logs', if_exists=True)
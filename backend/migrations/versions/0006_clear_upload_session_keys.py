@@ -0,0 +1,33 @@
+"""clear upload session keys
+
+upload_sessions.wrapped_key becomes nullable: the key is only needed
+while chunks arrive and is cleared when the session completes. Sessions
+already completed have theirs cleared here.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 21:12:07.318840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.alter_column('wrapped_key', existing_type=sa.String(length=128), nullable=True)
+    op.execute("UPDATE upload_sessions SET wrapped_key = NULL WHERE status = 'completed'")
+
+
+def downgrade():
+    # Completed sessions have no key to restore; they can't take chunks anyway
+    op.execute("UPDATE upload_sessions SET wrapped_key = '' WHERE wrapped_key IS NULL")
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.alter_column('wrapped_key', existing_type=sa.String(length=128), nullable=False)
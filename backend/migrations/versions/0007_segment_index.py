@@ -0,0 +1,31 @@
+"""segment index
+
+files.segment_index holds the sealed segment lengths of a compressed
+container, so Range reads seek straight to the covering segments instead
+of reading every earlier length prefix. Rows uploaded before this keep
+NULL and fall back to walking the prefixes.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 21:48:53.604217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('segment_index', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('segment_index')
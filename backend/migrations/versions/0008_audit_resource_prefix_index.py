@@ -0,0 +1,58 @@
+"""audit resource prefix index
+
+resource=file:* on /api/audit/logs filters with LIKE 'file:%'. A plain
+btree can only serve that under the C collation, so on PostgreSQL the
+resource column also gets a text_pattern_ops index, which matches LIKE
+prefixes under any collation. Built like the indexes in 0005: ON ONLY
+the partitioned parent, CONCURRENTLY on each partition, then attached.
+
+SQLite: LIKE is case-insensitive there and can't use an index on
+resource either way; prefix filters scan (fine for development).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 22:31:16.480925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+NAME = "ix_audit_logs_resource_pattern"
+
+
+def _partitions() -> list:
+    return list(op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('audit_logs')"
+    )).scalars())
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        if not partitions:
+            op.create_index(NAME, 'audit_logs', ['resource'], postgresql_concurrently=True,
+                            postgresql_ops={'resource': 'text_pattern_ops'}, if_not_exists=True)
+            return
+        op.execute(f"CREATE INDEX IF NOT EXISTS {NAME} ON ONLY audit_logs (resource text_pattern_ops)")
+        for partition in partitions:
+            child = f"{partition}_resource_pattern"
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} "
+                       f"ON {partition} (resource text_pattern_ops)")
+            op.execute(f"ALTER INDEX {NAME} ATTACH PARTITION {child}")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index(NAME, table_name='audit_logs', if_exists=True)
@@ -3,6 +3,28 @@ from extensions import db
 import secrets
 
 
+def _as_utc(value: datetime) -> datetime:
+    # DateTime columns come back naive (sqlite, timestamp without time zone)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class Blob(db.Model):
+    """
+    A stored ciphertext object in uploads/. Files of the same user with
+    identical content share one blob; ref_count tracks how many File rows
+    (live or soft-deleted) still point at it.
+    """
+    __tablename__ = "blobs"
+
+    id          = db.Column(db.Integer, primary_key=True)
+    user_id     = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    storage_key = db.Column(db.String(500), nullable=False, unique=True)
+    sha256_hash = db.Column(db.String(64), nullable=False)
+    size        = db.Column(db.BigInteger, nullable=True)   # ciphertext bytes on disk
+    ref_count   = db.Column(db.Integer, default=1, nullable=False)
+    created_at  = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 class File(db.Model):
     __tablename__ = "files"
 
@@ -21,6 +43,26 @@ class File(db.Model):
     
     sha256_hash     = db.Column(db.String(64), nullable=False)
     encryption_iv   = db.Column(db.String(500), nullable=False)
+
+    # Data key wrapped under master key version kek_version (envelope encryption);
+    # NULL = key derived from the master key (see utils.encryption.resolve_data_key)
+    wrapped_key     = db.Column(db.String(128), nullable=True)
+    kek_version     = db.Column(db.Integer, nullable=True)
+
+    # Segmented container version of the blob; NULL = legacy single-blob ciphertext
+    container_version = db.Column(db.Integer, nullable=True)
+
+    # Codec applied before encryption ('zlib' / 'zstd'); NULL = stored uncompressed
+    compression     = db.Column(db.String(20), nullable=True)
+
+    # Compressed containers: sealed segment lengths (utils.encryption.pack_segment_index),
+    # so Range reads seek straight to a segment. Only loaded when a range is read
+    segment_index   = db.deferred(db.Column(db.LargeBinary, nullable=True))
+
+    # Shared ciphertext blob; NULL = legacy row whose blob lives at s3_key
+    blob_id         = db.Column(db.Integer, db.ForeignKey("blobs.id"), nullable=True)
+    blob            = db.relationship("Blob")
+
     is_shared       = db.Column(db.Boolean, default=False)
     share_token     = db.Column(db.String(64), unique=True, nullable=True)
     share_expires   = db.Column(db.DateTime, nullable=True)
@@ -30,11 +72,89 @@ class File(db.Model):
     updated_at      = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
                                 onupdate=lambda: datetime.now(timezone.utc))
 
+    # Partial indexes cover live rows only; queries that should use them compare
+    # is_deleted against a literal (db.false()) — SQLite can't match a bound parameter
+    # against an index predicate (PostgreSQL sees literals either way via psycopg2).
+    # get_file_or_404 is a primary-key lookup and share links use share_token's unique index.
+    __table_args__ = (
+        # list_files keyset pages, one index per sort column
+        db.Index("ix_files_live_user_created", user_id, created_at, id,
+                 postgresql_where=is_deleted == db.false(), sqlite_where=is_deleted == db.false()),
+        db.Index("ix_files_live_user_name", user_id, original_name, id,
+                 postgresql_where=is_deleted == db.false(), sqlite_where=is_deleted == db.false()),
+        db.Index("ix_files_live_user_size", user_id, file_size, id,
+                 postgresql_where=is_deleted == db.false(), sqlite_where=is_deleted == db.false()),
+        # find_duplicate (upload dedup)
+        db.Index("ix_files_live_user_hash", user_id, sha256_hash,
+                 postgresql_where=is_deleted == db.false(), sqlite_where=is_deleted == db.false()),
+        # tools/gc.py: purge past retention, expired shares
+        db.Index("ix_files_deleted_id", id, deleted_at,
+                 postgresql_where=is_deleted == db.true(), sqlite_where=is_deleted == db.true()),
+        db.Index("ix_files_share_expires", share_expires,
+                 postgresql_where=share_token.isnot(None), sqlite_where=share_token.isnot(None)),
+        # rows sharing a blob (purge, re-encryption swap, gc)
+        db.Index("ix_files_blob_id", blob_id),
+    )
+
+    @property
+    def storage_key(self) -> str:
+        """Key of the ciphertext object this row reads from."""
+        return self.blob.storage_key if self.blob_id else self.s3_key
+
     def soft_delete(self):
+        # The blob stays referenced until the row is purged
         self.is_deleted = True
         self.deleted_at = datetime.now(timezone.utc)
         db.session.commit()
 
+    def purge(self):
+        """
+        Permanently delete this row and release its blob reference.
+        Returns the storage key to delete if this was the last reference,
+        else None. Does not commit — the caller batches purges.
+        """
+        orphaned_key = self.s3_key
+        blob = self.blob
+        if blob is not None:
+            # Decrement in SQL so concurrent purges of the same blob don't race
+            db.session.query(Blob).filter_by(id=blob.id).update(
+                {Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False)
+            db.session.refresh(blob)
+            orphaned_key = None
+            if blob.ref_count <= 0:
+                orphaned_key = blob.storage_key
+                db.session.delete(blob)
+
+        db.session.delete(self)
+        return orphaned_key
+
+    def share_blob_with(self, other: "File"):
+        """Point `other` at this row's ciphertext, copying the metadata needed to decrypt it."""
+        if not self.blob_id:
+            # Legacy row: adopt its existing object as a blob with one reference
+            blob = Blob(user_id=self.user_id, storage_key=self.s3_key,
+                        sha256_hash=self.sha256_hash, ref_count=1)
+            db.session.add(blob)
+            db.session.flush()
+            self.blob_id = blob.id
+            db.session.flush()
+
+        db.session.query(Blob).filter_by(id=self.blob_id).update(
+            {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False)
+        # The increment holds the blob row lock; re-read our metadata under it in
+        # case a re-encryption job swapped the blob since this row was loaded
+        db.session.refresh(self)
+        other.blob_id           = self.blob_id
+        other.encryption_algo   = self.encryption_algo
+        other.encryption_iv     = self.encryption_iv
+        other.wrapped_key       = self.wrapped_key
+        other.kek_version       = self.kek_version
+        other.container_version = self.container_version
+        other.compression       = self.compression
+        other.segment_index     = self.segment_index
+        other.sha256_hash       = self.sha256_hash
+        other.file_size         = self.file_size
+
     def generate_share_token(self, expires_in_hours: int = 24) -> str:
         from datetime import timedelta
         self.share_token = secrets.token_urlsafe(48)
@@ -46,7 +166,7 @@ class File(db.Model):
     def is_share_valid(self) -> bool:
         if not self.is_shared or not self.share_token:
             return False
-        if self.share_expires and datetime.now(timezone.utc) > self.share_expires:
+        if self.share_expires and datetime.now(timezone.utc) > _as_utc(self.share_expires):
             return False
         return True
 
@@ -59,6 +179,7 @@ class File(db.Model):
             "extension": self.extension,
             "is_encrypted": self.is_encrypted,
             "encryption_algo": self.encryption_algo or "AES-256-GCM", # Updated to include algo
+            "compression": self.compression,
             "is_shared": self.is_shared,
             "sha256_hash": self.sha256_hash,
             "created_at": self.created_at.isoformat(),
@@ -66,7 +187,167 @@ class File(db.Model):
         }
 
 
+class UploadSession(db.Model):
+    """
+    Resumable instant-encrypt upload. Chunks are encrypted as they arrive
+    (instant-mode .enc chunk format) and only the ciphertext is kept; the
+    password-derived key is stored wrapped under the master key while chunks
+    can still arrive, and cleared when the session completes.
+    """
+    __tablename__ = "upload_sessions"
+
+    id             = db.Column(db.String(64), primary_key=True)
+    user_id        = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    original_name  = db.Column(db.String(255), nullable=False)
+    file_size      = db.Column(db.BigInteger, nullable=False)
+    chunk_size     = db.Column(db.Integer, nullable=False)
+    num_chunks     = db.Column(db.Integer, nullable=False)
+    encryption_algo = db.Column(db.String(50), nullable=False)
+    salt           = db.Column(db.String(64), nullable=False)    # base64, PBKDF2 salt in the .enc header
+    iv             = db.Column(db.String(64), nullable=False)    # base64, chunk nonce base
+    wrapped_key    = db.Column(db.String(128), nullable=True)     # None once completed
+    kek_version    = db.Column(db.Integer, nullable=False)
+    download_token = db.Column(db.String(64), nullable=True)     # set on complete
+    status         = db.Column(db.String(20), default="open", nullable=False)   # open / completed
+    created_at     = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at     = db.Column(db.DateTime, nullable=False, index=True)
+
+    chunks = db.relationship("UploadChunk", lazy="dynamic", cascade="all, delete-orphan",
+                             order_by="UploadChunk.index")
+
+    def is_expired(self) -> bool:
+        return datetime.now(timezone.utc) >= _as_utc(self.expires_at)
+
+    def chunk_length(self, index: int) -> int:
+        """Plaintext bytes expected for chunk `index` (the last one may be short)."""
+        return min(self.chunk_size, self.file_size - index * self.chunk_size)
+
+    def missing_ranges(self, limit: int = 100) -> list:
+        """
+        The first `limit` runs of chunk indexes not received yet, as
+        [start, stop) pairs. Read from the gaps between stored chunks in
+        index order, so received indexes are never loaded one by one.
+        """
+        first = (db.session.query(db.func.min(UploadChunk.index))
+                 .filter(UploadChunk.session_id == self.id).scalar())
+        if first is None:
+            return [[0, self.num_chunks]]
+        missing = [[0, first]] if first else []
+
+        following = db.func.lead(UploadChunk.index).over(order_by=UploadChunk.index)
+        runs = (db.session.query(UploadChunk.index.label("index"), following.label("next"))
+                .filter(UploadChunk.session_id == self.id).subquery())
+        run_ends = (db.session.query(runs.c.index, runs.c.next)
+                    .filter(db.or_(runs.c.next.is_(None), runs.c.next > runs.c.index + 1))
+                    .order_by(runs.c.index).limit(limit))
+        for index, next_index in run_ends:
+            stop = self.num_chunks if next_index is None else next_index
+            if index + 1 < stop:
+                missing.append([index + 1, stop])
+        return missing[:limit]
+
+    def to_dict(self) -> dict:
+        received = self.chunks.count()
+        missing  = self.missing_ranges() if received < self.num_chunks else []
+        # Committed offset: end of the contiguous run of chunks from the start
+        contiguous = missing[0][0] if missing else self.num_chunks
+        return {
+            "session_id": self.id,
+            "status": self.status,
+            "original_name": self.original_name,
+            "file_size": self.file_size,
+            "chunk_size": self.chunk_size,
+            "num_chunks": self.num_chunks,
+            "encryption_algo": self.encryption_algo,
+            "received_chunks": received,
+            "committed_offset": min(contiguous * self.chunk_size, self.file_size),
+            "missing_ranges": missing,
+            "expires_at": _as_utc(self.expires_at).isoformat(),
+        }
+
+
+class UploadChunk(db.Model):
+    __tablename__ = "upload_chunks"
+
+    session_id  = db.Column(db.String(64), db.ForeignKey("upload_sessions.id"), primary_key=True)
+    index       = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    size        = db.Column(db.Integer, nullable=False)          # plaintext bytes
+    sealed_size = db.Column(db.Integer, nullable=False)
+    sha256_hash = db.Column(db.String(64), nullable=False)       # plaintext, to recognise resends
+    storage_key = db.Column(db.String(500), nullable=False)
+
+
+class ReencryptionJob(db.Model):
+    """
+    Background migration of stored files to another algorithm
+    (tools/reencrypt.py). Totals are fixed when the job is created;
+    progress counters and the id cursor are updated as objects finish,
+    so remaining work is read from here without scanning files.
+    """
+    __tablename__ = "reencryption_jobs"
+
+    id             = db.Column(db.Integer, primary_key=True)
+    status         = db.Column(db.String(20), default="pending", nullable=False)   # pending/running/paused/completed
+    target_algo    = db.Column(db.String(50), nullable=False)
+
+    # Filter; NULL = any
+    source_algo    = db.Column(db.String(50), nullable=True)
+    filter_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    min_size       = db.Column(db.BigInteger, nullable=True)
+    max_size       = db.Column(db.BigInteger, nullable=True)
+
+    total_files    = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes    = db.Column(db.BigInteger, default=0, nullable=False)
+    done_files     = db.Column(db.Integer, default=0, nullable=False)
+    done_bytes     = db.Column(db.BigInteger, default=0, nullable=False)
+    failed_files   = db.Column(db.Integer, default=0, nullable=False)
+    failed_bytes   = db.Column(db.BigInteger, default=0, nullable=False)
+    cursor         = db.Column(db.Integer, default=0, nullable=False)   # files with id <= cursor were visited
+    last_error     = db.Column(db.Text, nullable=True)
+
+    created_at     = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at     = db.Column(db.DateTime, nullable=True)
+    finished_at    = db.Column(db.DateTime, nullable=True)
+    updated_at     = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                               onupdate=lambda: datetime.now(timezone.utc))
+
+    @property
+    def remaining_files(self) -> int:
+        return max(self.total_files - self.done_files - self.failed_files, 0)
+
+    @property
+    def remaining_bytes(self) -> int:
+        return max(self.total_bytes - self.done_bytes - self.failed_bytes, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "target_algo": self.target_algo,
+            "filter": {"source_algo": self.source_algo, "user_id": self.filter_user_id,
+                       "min_size": self.min_size, "max_size": self.max_size},
+            "total_files": self.total_files,
+            "total_bytes": self.total_bytes,
+            "done_files": self.done_files,
+            "done_bytes": self.done_bytes,
+            "failed_files": self.failed_files,
+            "failed_bytes": self.failed_bytes,
+            "remaining_files": self.remaining_files,
+            "remaining_bytes": self.remaining_bytes,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
 class AuditLog(db.Model):
+    """
+    On PostgreSQL the table is range-partitioned by month on `timestamp`
+    (migration 0004; primary key (id, timestamp)). tools.audit_logs keeps
+    partitions ahead of time, rolls rows up into AuditDailyRollup and
+    archives + drops partitions past retention.
+    """
     __tablename__ = "audit_logs"
 
     id          = db.Column(db.Integer, primary_key=True)
@@ -77,7 +358,16 @@ class AuditLog(db.Model):
     user_agent  = db.Column(db.Text, nullable=True)
     status      = db.Column(db.String(20), nullable=False)
     details     = db.Column(db.Text, nullable=True)
-    timestamp   = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp   = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    # Each index ends in (timestamp, id): the audit query API's keyset order.
+    # On PostgreSQL they are partitioned indexes (one per monthly partition).
+    __table_args__ = (
+        db.Index("ix_audit_logs_user_timestamp_id", user_id, timestamp, id),
+        db.Index("ix_audit_logs_ip_timestamp_id", ip_address, timestamp, id),
+        db.Index("ix_audit_logs_resource_timestamp_id", resource, timestamp, id),
+        db.Index("ix_audit_logs_timestamp_id", timestamp, id),   # admin scope=all, rollups
+    )
 
     def to_dict(self) -> dict:
         return {
@@ -86,7 +376,38 @@ class AuditLog(db.Model):
             "action": self.action,
             "resource": self.resource,
             "ip_address": self.ip_address,
+            "user_agent": self.user_agent,
             "status": self.status,
             "details": self.details,
-            "timestamp": self.timestamp.isoformat() 
-        }
\ No newline at end of file
+            "timestamp": self.timestamp.isoformat()
+        }
+
+
+class AuditDailyRollup(db.Model):
+    """
+    Audit events per UTC day, user, action and status. Rebuilt a day at a
+    time by tools.audit_logs, and kept after the raw rows are archived, so
+    summaries never scan audit_logs.
+    """
+    __tablename__ = "audit_daily_rollups"
+
+    id          = db.Column(db.Integer, primary_key=True)
+    day         = db.Column(db.Date, nullable=False)
+    user_id     = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    action      = db.Column(db.String(100), nullable=False)
+    status      = db.Column(db.String(20), nullable=False)
+    count       = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index("ix_audit_daily_rollups_user_day", user_id, day),
+        db.Index("ix_audit_daily_rollups_day", day),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "day": self.day.isoformat(),
+            "user_id": self.user_id,
+            "action": self.action,
+            "status": self.status,
+            "count": self.count,
+        }
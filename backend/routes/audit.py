@@ -0,0 +1,235 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from extensions import db, limiter
+from models.user import User
+from models.file import AuditLog, AuditDailyRollup
+from routes.files import ListingError, parse_timestamp
+from utils.audit_logger import log_action, get_audit_writer
+from datetime import datetime, timezone, timedelta
+import json
+import base64
+
+# Audit views. Summaries read audit_daily_rollups (rebuilt by
+# tools.audit_logs), never the raw audit_logs partitions. /logs reads raw
+# rows, always newest first along one of the (…, timestamp, id) indexes.
+
+audit_bp = Blueprint("audit", __name__)
+
+SUMMARY_DEFAULT_DAYS = 30
+SUMMARY_MAX_DAYS     = 366
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE     = 500
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_cursor(order: str, log: AuditLog) -> str:
+    payload = json.dumps({"o": order, "t": log.timestamp.replace(tzinfo=None).isoformat(),
+                          "id": log.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str):
+    """(timestamp, id) of the last row on the previous page."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["o"] != order:
+            raise ListingError("cursor was issued for a different order", "INVALID_CURSOR")
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except ListingError:
+        raise
+    except (ValueError, TypeError, KeyError):
+        raise ListingError("Malformed cursor", "INVALID_CURSOR")
+
+
+def scoped_logs(user_id: int, args):
+    """
+    Audit rows the caller may see, narrowed by the query-string filters.
+    Everyone sees their own rows; admins may pass user_id=N, or scope=all
+    for every user (including events with no user, e.g. failed logins).
+    """
+    query = AuditLog.query
+    if args.get("scope") == "all" or args.get("user_id"):
+        caller = db.session.get(User, user_id)
+        if not caller or not caller.is_admin:
+            raise PermissionError("Admin access required")
+    if args.get("user_id"):
+        if not args["user_id"].isdigit():
+            raise ListingError("user_id must be an integer")
+        query = query.filter(AuditLog.user_id == int(args["user_id"]))
+    elif args.get("scope") != "all":
+        query = query.filter(AuditLog.user_id == user_id)
+
+    if args.get("action"):
+        actions = [a.strip().upper() for a in args["action"].split(",") if a.strip()]
+        query = query.filter(AuditLog.action.in_(actions))
+    if args.get("status"):
+        query = query.filter(AuditLog.status == args["status"])
+    if args.get("resource"):
+        resource = args["resource"]
+        # "file:*" selects every resource with that prefix (LIKE 'file:%'; on PostgreSQL
+        # served by the text_pattern_ops index from migration 0008, SQLite scans)
+        if resource.endswith("*"):
+            query = query.filter(AuditLog.resource.startswith(resource[:-1], autoescape=True))
+        else:
+            query = query.filter(AuditLog.resource == resource)
+    if args.get("ip"):
+        query = query.filter(AuditLog.ip_address == args["ip"].strip())
+    if args.get("after"):
+        query = query.filter(AuditLog.timestamp >= parse_timestamp(args["after"], "after"))
+    if args.get("before"):
+        query = query.filter(AuditLog.timestamp < parse_timestamp(args["before"], "before"))
+    return query
+
+
+def seek(query, order: str, cursor):
+    """Rows after `cursor` (timestamp, id), in index order."""
+    if cursor:
+        after = db.tuple_(AuditLog.timestamp, AuditLog.id)
+        query = query.filter(after < cursor if order == "desc" else after > cursor)
+    if order == "desc":
+        return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+    return query.order_by(AuditLog.timestamp.asc(), AuditLog.id.asc())
+
+
+def export_ndjson(query, order: str, cursor):
+    """Every matching row, one JSON object per line, fetched a keyset batch at a time."""
+    def generate():
+        # The request's session is closed once the view returns; stream on the current one
+        rows     = query.with_session(db.session())
+        position = cursor
+        while True:
+            batch = seek(rows, order, position).limit(EXPORT_BATCH_SIZE).all()
+            if not batch:
+                return
+            yield "".join(json.dumps(log.to_dict(), separators=(",", ":")) + "\n" for log in batch)
+            position = (batch[-1].timestamp, batch[-1].id)
+            for log in batch:   # keep the session's identity map from growing with the export
+                db.session.expunge(log)
+            if len(batch) < EXPORT_BATCH_SIZE:
+                return
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = 'attachment; filename="audit-logs.ndjson"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@audit_bp.route("/logs", methods=["GET"])
+@jwt_required()
+@limiter.limit("120 per minute")
+def list_logs():
+    """
+    One page of audit events, newest first by default.
+
+    Query: action (comma list), status, resource ("file:*" for a prefix),
+    ip, after / before (ISO 8601), order=desc|asc, limit (max 500), cursor
+    (next_cursor of the previous page). Admins only: user_id=N or
+    scope=all. format=ndjson streams every matching row instead of a page.
+    Pages are keyset-seeked on (timestamp, id), which the audit_logs
+    indexes lead with after user_id, ip_address or resource.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        args    = request.args
+
+        order = args.get("order", "desc")
+        if order not in ("asc", "desc"):
+            raise ListingError("order must be asc or desc")
+        try:
+            limit = min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ListingError("limit must be an integer")
+
+        query  = scoped_logs(user_id, args)
+        cursor = decode_cursor(args["cursor"], order) if args.get("cursor") else None
+
+        if args.get("format") == "ndjson":
+            filters = {k: v for k, v in args.items() if k not in ("format", "cursor", "limit")}
+            log_action(user_id=user_id, action="AUDIT_EXPORT", status="success",
+                       details=json.dumps(filters, sort_keys=True)[:1000])
+            return export_ndjson(query, order, cursor)
+
+        # One extra row tells us whether another page exists
+        logs     = seek(query, order, cursor).limit(limit + 1).all()
+        has_more = len(logs) > limit
+        logs     = logs[:limit]
+
+        return jsonify({
+            "message": "Audit logs retrieved successfully",
+            "data": [log.to_dict() for log in logs],
+            "pagination": {
+                "order": order, "limit": limit, "has_more": has_more,
+                "next_cursor": encode_cursor(order, logs[-1]) if has_more else None,
+            },
+        }), 200
+
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except ListingError as e:
+        return jsonify({"error": str(e), "code": e.code}), 400
+    except Exception as e:
+        print(f"Error in list_logs: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@audit_bp.route("/summary", methods=["GET"])
+@jwt_required()
+def summary():
+    """
+    The caller's activity for the dashboard: events per day and per action
+    over the last `days` (default 30, max 366) UTC days, with failures
+    counted separately. rolled_up_through is the newest day in the rollups;
+    today's numbers are as fresh as the last tools.audit_logs run.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        try:
+            days = min(max(int(request.args.get("days", SUMMARY_DEFAULT_DAYS)), 1), SUMMARY_MAX_DAYS)
+        except ValueError:
+            return jsonify({"error": "days must be an integer", "code": "INVALID_FILTER"}), 400
+
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        rows  = (db.session.query(AuditDailyRollup.day, AuditDailyRollup.action,
+                                  AuditDailyRollup.status, db.func.sum(AuditDailyRollup.count))
+                 .filter(AuditDailyRollup.user_id == user_id, AuditDailyRollup.day >= since)
+                 .group_by(AuditDailyRollup.day, AuditDailyRollup.action, AuditDailyRollup.status)
+                 .all())
+
+        by_day, by_action = {}, {}
+        totals = {"events": 0, "failures": 0}
+        for day, action, status, count in rows:
+            count  = int(count)
+            failed = count if status != "success" else 0
+            for bucket in (by_day.setdefault(day.isoformat(), {"events": 0, "failures": 0}),
+                           by_action.setdefault(action, {"events": 0, "failures": 0}),
+                           totals):
+                bucket["events"]   += count
+                bucket["failures"] += failed
+
+        rolled_up_through = db.session.query(db.func.max(AuditDailyRollup.day)).scalar()
+        return jsonify({
+            "since": since.isoformat(),
+            "days": [{"day": day, **counts} for day, counts in sorted(by_day.items())],
+            "actions": [{"action": action, **counts} for action, counts
+                        in sorted(by_action.items(), key=lambda item: -item[1]["events"])],
+            "totals": totals,
+            "rolled_up_through": rolled_up_through.isoformat() if rolled_up_through else None,
+        }), 200
+
+    except Exception as e:
+        print(f"Error in audit summary: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@audit_bp.route("/writer", methods=["GET"])
+@jwt_required()
+def writer_stats():
+    """This worker's audit writer counters (queued / written / dropped / failed / pending); admins only."""
+    caller = db.session.get(User, int(get_jwt_identity()))
+    if not caller or not caller.is_admin:
+        return jsonify({"error": "Admin access required", "code": "FORBIDDEN"}), 403
+    writer = get_audit_writer()
+    if writer is None:
+        return jsonify({"data": {"async": False}}), 200   # AUDIT_ASYNC=False: written inline
+    return jsonify({"data": {"async": True, **writer.stats()}}), 200
@@ -1,20 +1,38 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db, limiter
 from models.user import User
-from models.file import File, AuditLog
+from models.file import File, Blob, AuditLog
 from utils.encryption import (
-    encrypt_file, decrypt_file,
-    compute_sha256, verify_file_integrity,
-    encode_bytes, decode_bytes
+    get_engine, generate_data_key, wrap_data_key, resolve_data_key, KDF_ENVELOPE, SALT_SIZE,
+    ContainerHeader, CONTAINER_HEADER, CONTAINER_VERSION, encrypt_stream, decrypt_stream,
+    decrypt_range, container_span,
+    pack_segment_index, CIPHER_ENGINES, INSTANT_HEADER, INSTANT_CHUNK_LEN, derive_password_key,
+    instant_chunk_encryptor, instant_container_size, map_chunks_ordered,
+    BackgroundHasher, verify_file_integrity,
+    pack_encryption_iv, unpack_encryption_iv
 )
+from utils.compression import (
+    CODEC_NONE, CODEC_NAMES, COMPRESSED_EXTENSIONS, SAMPLE_SIZE,
+    resolve_codec, compresses_well
+)
+from utils.instant_html import stream_instant_html, instant_html_size
+from utils.zipstream import ZipStreamWriter, ZIP64_LIMIT
+from utils.instant_bundle import render_decryptor, render_readme
+from utils.storage import StorageBackend, get_storage
 from utils.audit_logger import log_action
-import os
 import io
+import os
+import json
+import base64
 import secrets
+import hashlib
 import mimetypes
+import unicodedata
+from urllib.parse import quote
 from flask import Response, stream_with_context
 from werkzeug.utils import secure_filename
+from datetime import datetime, timezone, timedelta
 
 files_bp = Blueprint("files", __name__)
 
@@ -41,11 +59,37 @@ MAGIC_BYTES = {
     b"\x50\x4b\x03\x04": "zip",
 }
 
-def validate_magic_bytes(file_bytes: bytes) -> bool:
-    for magic, _ in MAGIC_BYTES.items():
+# Extensions whose content must start with the matching signature above
+SIGNED_EXTENSIONS = {
+    "pdf": "pdf", "png": "png", "jpg": "jpg", "jpeg": "jpg",
+    "zip": "zip", "docx": "zip", "xlsx": "zip", "pptx": "zip",
+}
+
+def detect_magic(file_bytes: bytes):
+    for magic, kind in MAGIC_BYTES.items():
         if file_bytes.startswith(magic):
-            return True
-    return False
+            return kind
+    return None
+
+def validate_magic_bytes(file_bytes: bytes, extension: str = None) -> bool:
+    if extension is None:
+        return detect_magic(file_bytes) is not None
+    # Signed types must carry their signature; anything else (txt, csv, logs)
+    # must not carry one it doesn't claim
+    return detect_magic(file_bytes) == SIGNED_EXTENSIONS.get(extension)
+
+def choose_compression(extension: str, head: bytes) -> int:
+    """
+    Codec for a cloud upload: skipped for formats that are already
+    compressed (by extension or signature) and when the first block of
+    the file doesn't shrink enough to be worth it.
+    """
+    codec = resolve_codec(current_app.config["UPLOAD_COMPRESSION"])
+    if codec == CODEC_NONE:
+        return CODEC_NONE
+    if extension in COMPRESSED_EXTENSIONS or detect_magic(head) is not None:
+        return CODEC_NONE
+    return codec if compresses_well(codec, head) else CODEC_NONE
 
 
 def sanitize_filename(filename: str) -> str:
@@ -55,6 +99,17 @@ def sanitize_filename(filename: str) -> str:
     return f"{name}{ext}"
 
 
+def detach_upload_stream(uploaded_file):
+    """
+    Take over an uploaded file's spooled stream so a streamed response can
+    keep reading it after the request is torn down (which closes request
+    files). The caller closes it.
+    """
+    stream = uploaded_file.stream
+    uploaded_file.stream = io.BytesIO()
+    return stream
+
+
 def get_file_or_404(file_id: int, user_id: int):
     return File.query.filter_by(
         id=file_id,
@@ -62,8 +117,252 @@ def get_file_or_404(file_id: int, user_id: int):
         is_deleted=False
     ).first()
 
+
+def find_duplicate(user_id: int, sha256_hash: str):
+    """A live file of this user with the same plaintext hash, if any."""
+    return File.query.filter(
+        File.user_id == user_id,
+        File.sha256_hash == sha256_hash,
+        File.is_deleted == db.false()
+    ).order_by(File.id).first()
+
+
+def stream_stored_file(file: File, storage: StorageBackend, start: int = 0, stop: int = None):
+    """
+    Return a generator of plaintext chunks for a stored blob, optionally
+    limited to bytes [start, stop). Container rows are decrypted one segment
+    at a time (only the segments covering the range are read); legacy
+    single-blob rows (written before the container format) are decrypted whole.
+
+    Everything needed from the row is read here, so the generator only holds
+    plain values and can run after the request's session has been removed.
+    """
+    nonce, salt, kdf = unpack_encryption_iv(file.encryption_iv)
+    # Resolve up front so key errors surface before the response starts
+    file_key = resolve_data_key(file.user_id, salt, kdf, file.wrapped_key, file.kek_version)
+    storage_key, file_size = file.storage_key, file.file_size
+    # Deferred column: load it now, not from inside the generator
+    segment_index = file.segment_index if stop is not None and file.compression else None
+
+    if file.container_version and stop is None:
+        def generate():
+            with storage.open(storage_key) as f:
+                yield from decrypt_stream(f, file_key)
+        return generate()
+
+    if file.container_version:
+        def generate_range():
+            # The header first, then exactly the covering segments (no read-ahead past them)
+            header_bytes = storage.get_range(storage_key, 0, CONTAINER_HEADER.size)
+            span = container_span(ContainerHeader.unpack(header_bytes), start, stop, segment_index)
+            with (storage.open_range(storage_key, *span) if span else storage.open(storage_key)) as f:
+                yield from decrypt_range(f, file_key, file_size, start, stop,
+                                         segment_index, header_bytes)
+        return generate_range()
+
+    engine = get_engine(file.encryption_algo)
+
+    def generate_legacy():
+        with storage.open(storage_key) as f:
+            encrypted_data = f.read()
+        # USE THE ALGO STORED IN THE DATABASE FOR DECRYPTION
+        decrypted_data = engine.decrypt(file_key, nonce, encrypted_data)
+        yield decrypted_data if stop is None else decrypted_data[start:stop]
+    return generate_legacy()
+
+
+def verify_while_streaming(chunks, file: File, user_id):
+    """Pass chunks through while hashing them; log if the final hash doesn't match."""
+    digest = hashlib.sha256()
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+    except Exception as e:
+        log_action(user_id=user_id, action="FILE_INTEGRITY_FAILED",
+                   resource=f"file:{file.id}", status="failure",
+                   details=f"Decryption failed mid-stream: {e}")
+        raise
+
+    if not secrets.compare_digest(digest.hexdigest(), file.sha256_hash):
+        log_action(user_id=user_id, action="FILE_INTEGRITY_FAILED",
+                   resource=f"file:{file.id}", status="failure",
+                   details="SHA-256 hash mismatch — file may be tampered")
+
+
+def file_last_modified(file: File) -> datetime:
+    modified = file.updated_at or file.created_at
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=timezone.utc)
+    return modified.replace(microsecond=0)
+
+
+# Owners' copies: a browser may keep them but revalidates every time (a 304
+# costs one row lookup), and shared caches never store them
+PRIVATE_CACHE = "private, no-cache"
+
+
+def shared_cache_policy(file: File) -> str:
+    """
+    Share links revalidate on every use like owners' copies, so a revoked or
+    re-shared link stops working at once. SHARED_CACHE_MAX_AGE > 0 opts in
+    to letting proxies keep them that long, never past the link's expiry.
+    """
+    max_age = current_app.config["SHARED_CACHE_MAX_AGE"]
+    if max_age <= 0:
+        return PRIVATE_CACHE
+    if file.share_expires:
+        expires = file.share_expires
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        remaining = int((expires - datetime.now(timezone.utc)).total_seconds())
+        max_age   = max(0, min(max_age, remaining))
+    return f"public, max-age={max_age}, must-revalidate"
+
+
+def metadata_etag(data: dict) -> str:
+    # to_dict covers fields (algo, share state) that change without bumping updated_at
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def set_validators(response: Response, file: File, etag: str, cache_control: str) -> Response:
+    response.set_etag(etag)
+    response.last_modified = file_last_modified(file)
+    response.headers["Cache-Control"] = cache_control
+    if cache_control.startswith("private"):
+        response.vary.add("Authorization")
+    return response
+
+
+def not_modified(file: File, etag: str, cache_control: str):
+    """
+    304 if the client's copy (If-None-Match, else If-Modified-Since) is
+    current — decided from the row alone, before any storage read or
+    decryption. None when the full response is needed.
+    """
+    if request.if_none_match:
+        current = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        current = file_last_modified(file) <= request.if_modified_since
+    else:
+        return None
+    if not current:
+        return None
+    return set_validators(Response(status=304), file, etag, cache_control)
+
+
+def attachment_response(file: File, chunks, status: int = 200, content_length: int = None,
+                        mimetype: str = None, cache_control: str = PRIVATE_CACHE) -> Response:
+    """Streamed attachment response — only one segment is held in memory at a time."""
+    response = Response(stream_with_context(chunks), status=status,
+                        mimetype=mimetype or file.mime_type, direct_passthrough=True)
+    response.headers["Content-Length"] = str(
+        file.file_size if content_length is None else content_length)
+    response.headers["Accept-Ranges"] = "bytes"
+    # The plaintext hash is a strong validator: same hash, same bytes
+    set_validators(response, file, file.sha256_hash, cache_control)
+
+    # Same filename handling as send_file(download_name=...)
+    try:
+        file.original_name.encode("ascii")
+        names = {"filename": file.original_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", file.original_name)
+        simple = simple.encode("ascii", "ignore").decode("ascii")
+        quoted = quote(file.original_name, safe="!#$&+-.^_`|~")
+        names  = {"filename": simple, "filename*": f"UTF-8''{quoted}"}
+    response.headers.set("Content-Disposition", "attachment", **names)
+    return response
+
+
+MAX_RANGES = 16
+
+def requested_ranges(file: File):
+    """
+    Resolve the Range header against the file size.
+    Returns None to serve the whole file, [] if no range is satisfiable,
+    or a sorted list of non-overlapping (start, stop) byte ranges.
+    """
+    rng = request.range
+    if rng is None or rng.units != "bytes":
+        return None
+
+    # If-Range: only honour the Range if the client's copy is still current
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != file.sha256_hash:
+        return None
+    if if_range.date is not None and if_range.date != file_last_modified(file):
+        return None
+
+    size   = file.file_size
+    ranges = []
+    for begin, end in rng.ranges:
+        if begin < 0:
+            start, stop = max(size + begin, 0), size
+        else:
+            start, stop = begin, min(end if end is not None else size, size)
+        if start < stop:
+            ranges.append((start, stop))
+
+    # Coalesce overlapping/adjacent ranges so a client can't multiply our work
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def format_ranges(ranges) -> str:
+    return ", ".join(f"{start}-{stop - 1}" for start, stop in ranges)
+
+
+def range_not_satisfiable(file: File) -> Response:
+    response = jsonify({"error": "Requested range not satisfiable", "code": "INVALID_RANGE"})
+    response.status_code = 416
+    response.headers["Content-Range"] = f"bytes */{file.file_size}"
+    return response
+
+
+def partial_response(file: File, storage: StorageBackend, ranges,
+                     cache_control: str = PRIVATE_CACHE) -> Response:
+    """206 response decrypting only the segments that cover the requested ranges."""
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        response = attachment_response(file, stream_stored_file(file, storage, start, stop),
+                                       status=206, content_length=stop - start,
+                                       cache_control=cache_control)
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{file.file_size}"
+        return response
+
+    boundary = secrets.token_hex(16)
+    # Each part's generator is built now, while the row is still attached to
+    # the session; the body itself runs after the view has returned
+    parts = [
+        ((f"\r\n--{boundary}\r\n"
+          f"Content-Type: {file.mime_type}\r\n"
+          f"Content-Range: bytes {start}-{stop - 1}/{file.file_size}\r\n\r\n").encode(),
+         stop - start, stream_stored_file(file, storage, start, stop))
+        for start, stop in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+
+    def generate():
+        for part_header, _, chunks in parts:
+            yield part_header
+            yield from chunks
+        yield closing
+
+    length = sum(len(h) + size for h, size, _ in parts) + len(closing)
+    return attachment_response(file, generate(), status=206, content_length=length,
+                               mimetype=f"multipart/byteranges; boundary={boundary}",
+                               cache_control=cache_control)
+
 from flask_jwt_extended import create_access_token
-from datetime import timedelta
 
 @files_bp.route("/upload/extend-session", methods=["POST"])
 @jwt_required()
@@ -75,6 +374,21 @@ def extend_session():
     )
     return jsonify({"access_token": new_token}), 200
 
+@files_bp.route("/algorithms", methods=["GET"])
+@jwt_required()
+def list_algorithms():
+    """Supported algorithms with the throughput measured on this worker at startup."""
+    benchmark = current_app.extensions.get("cipher_benchmark", {})
+    return jsonify({
+        "data": {
+            "default": current_app.config["DEFAULT_ENCRYPTION_ALGO"],
+            "algorithms": [
+                {"name": name, "aead": engine.aead, **benchmark.get(name, {})}
+                for name, engine in CIPHER_ENGINES.items()
+            ]
+        }
+    }), 200
+
 @files_bp.route("/upload", methods=["POST"])
 @jwt_required()
 @limiter.limit("20 per hour",exempt_when=lambda: request.form.get("instant_encrypt") == "true")
@@ -95,11 +409,15 @@ def upload_file():
 
         uploaded_file = request.files["file"]
         is_instant = request.form.get("instant_encrypt") == "true"
-        selected_algo = request.form.get("algo", "AES-256-GCM")
+        selected_algo = request.form.get("algo") or current_app.config["DEFAULT_ENCRYPTION_ALGO"]
 
         if not uploaded_file.filename or not allowed_file(uploaded_file.filename):
             return jsonify({"error": "Invalid file type"}), 400
 
+        if selected_algo not in CIPHER_ENGINES:
+            return jsonify({"error": f"Unsupported algorithm: {selected_algo}",
+                            "code": "INVALID_ALGO"}), 400
+
         # --- BRANCH 1: INSTANT ENCRYPT (Direct Streaming) ---
         if is_instant:
             log_action(user_id, "INSTANT_ENCRYPT_START", resource=uploaded_file.filename, status="success")
@@ -110,191 +428,54 @@ def upload_file():
             if not password:
                 return jsonify({"error": "Password required for self-decrypting file"}), 400
 
-            salt = os.urandom(16)
+            salt = os.urandom(SALT_SIZE)
             iv   = os.urandom(12)
-            
-            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-            from cryptography.hazmat.primitives import hashes
-            from cryptography.hazmat.backends import default_backend
-            from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
-            from cryptography.fernet import Fernet
-            import base64, struct, zipfile, io as _io
-
-            kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=600000, backend=default_backend())
-            key = kdf.derive(password.encode())
-
-            # Check file size without loading into RAM
-            # ADD these lines:
+            key  = derive_password_key(password, salt)
+
+            # Exact size without loading into RAM (the upload is spooled to disk)
             file_stream = uploaded_file.stream
-            file_size = request.content_length
-            if not file_size:
-                file_stream.seek(0, 2)
-                file_size = file_stream.tell()
-                file_stream.seek(0)
-            else:
-                file_stream.seek(0)
+            file_stream.seek(0, 2)
+            file_size = file_stream.tell()
+            file_stream.seek(0)
 
             print(f"File size: {file_size / 1024 / 1024:.1f} MB")
             print(f"Is large file: {file_size > 200 * 1024 * 1024}")
 
             if file_size > 200 * 1024 * 1024:
-                CHUNK = 64 * 1024 * 1024
-
-                if selected_algo == "AES-256-GCM":
-                    cipher = AESGCM(key)
-                elif selected_algo == "ChaCha20":
-                    cipher = ChaCha20Poly1305(key)
-
-                # Write directly to temp file — never build in memory
-                import tempfile
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".enc")
-
-                tmp.write(salt)
-                tmp.write(iv)
-                chunk_count_pos = tmp.tell()
-                tmp.write(struct.pack(">I", 0))  # placeholder
-
-                counter    = 1
-                num_chunks = 0
-                while True:
-                    chunk = file_stream.read(CHUNK)
-                    if not chunk:
-                        break
-                    if selected_algo == "Fernet":
-                        f = Fernet(base64.urlsafe_b64encode(key))
-                        enc_chunk = f.encrypt(chunk)
-                    else:
-                        chunk_nonce = (int.from_bytes(iv, 'big') + counter).to_bytes(12, 'big')
-                        enc_chunk   = cipher.encrypt(chunk_nonce, chunk, None)
-                    tmp.write(struct.pack(">I", len(enc_chunk)))
-                    tmp.write(enc_chunk)
-                    counter    += 1
-                    num_chunks += 1
-
-                # Write real chunk count
-                tmp.seek(chunk_count_pos)
-                tmp.write(struct.pack(">I", num_chunks))
-                tmp.close()
-
-                decryptor_script = f'''#!/usr/bin/env python3
-                """
-                Self-contained decryptor — run with: python decrypt.py
-                Algorithm: {selected_algo}
-                """
-                import sys, os, struct, subprocess, getpass
-
-                try:
-                    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
-                    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-                    from cryptography.hazmat.primitives import hashes
-                    from cryptography.hazmat.backends import default_backend
-                    from cryptography.fernet import Fernet
-                except ImportError:
-                    print("Installing required library...")
-                    subprocess.check_call([sys.executable, "-m", "pip", "install", "cryptography"])
-                    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
-                    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-                    from cryptography.hazmat.primitives import hashes
-                    from cryptography.hazmat.backends import default_backend
-                    from cryptography.fernet import Fernet
-
-                ALGO = "{selected_algo}"
-
-                def derive_key(password, salt):
-                    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=600000, backend=default_backend())
-                    return kdf.derive(password.encode())
-
-                def decrypt_file(enc_path, password, output_path):
-                    with open(enc_path, "rb") as f:
-                        data = f.read()
-
-                    salt       = data[:16]
-                    iv         = data[16:28]
-                    num_chunks = struct.unpack(">I", data[28:32])[0]
-                    key        = derive_key(password, salt)
-
-                    if ALGO == "AES-256-GCM":
-                        cipher = AESGCM(key)
-                    elif ALGO == "ChaCha20":
-                        cipher = ChaCha20Poly1305(key)
-
-                    pos = 32
-                    with open(output_path, "wb") as out:
-                        for i in range(num_chunks):
-                            chunk_len  = struct.unpack(">I", data[pos:pos+4])[0]
-                            pos       += 4
-                            chunk_data = data[pos:pos+chunk_len]
-                            pos       += chunk_len
-                            chunk_nonce = (int.from_bytes(iv, "big") + i + 1).to_bytes(12, "big")
-                            if ALGO == "Fernet":
-                                import base64
-                                f = Fernet(base64.urlsafe_b64encode(key))
-                                decrypted_chunk = f.decrypt(chunk_data)
-                            else:
-                                decrypted_chunk = cipher.decrypt(chunk_nonce, chunk_data, None)
-                            out.write(decrypted_chunk)
-
-                    print(f"Decrypted successfully -> {{output_path}}")
-
-                if __name__ == "__main__":
-                    script_dir = os.path.dirname(os.path.abspath(__file__))
-                    enc_files  = [f for f in os.listdir(script_dir) if f.endswith(".enc")]
-
-                    if not enc_files:
-                        enc_path = input("Enter path to .enc file: ").strip()
-                    else:
-                        enc_path = os.path.join(script_dir, enc_files[0])
-                        print(f"Found: {{enc_path}}")
-
-                    if not os.path.exists(enc_path):
-                        print(f"File not found: {{enc_path}}")
-                        sys.exit(1)
-
-                    password    = getpass.getpass("Enter decryption password: ")
-                    output_name = os.path.basename(enc_path).replace(".enc", "")
-                    output_path = os.path.join(script_dir, output_name)
-
-                    print("Decrypting...")
-                    decrypt_file(enc_path, password, output_path)
-                '''
-                readme = f"""# Encrypted File: {original_name}
-
-                    ## How to Decrypt
-
-                    1. Extract this zip file
-                    2. Make sure Python 3.6+ is installed (https://python.org)
-                    3. Place the .enc file and decrypt.py in the same folder
-                    4. Run: python decrypt.py
-                    5. Enter your decryption password when prompted
-                    6. The decrypted file will appear in the same folder
-
-                    ## Algorithm
-                    {selected_algo}
-
-                    ## Notes
-                    - The decrypt.py script will auto-install the required 'cryptography' library if not present
-                    - Keep your password safe — there is no way to recover the file without it
-                    - This file was encrypted with zero-knowledge encryption — the server never stored your file
-                """
-                # Stream zip without loading into RAM
-                tmp_name = tmp.name
+                CHUNK      = current_app.config["INSTANT_CHUNK_SIZE"]
+                workers    = current_app.config["INSTANT_ENCRYPT_WORKERS"]
+                inflight   = current_app.config["INSTANT_ENCRYPT_MAX_INFLIGHT"]
+                num_chunks = -(-file_size // CHUNK)
+                enc_size   = instant_container_size(selected_algo, file_size, CHUNK)
+
+                decryptor_script = render_decryptor(selected_algo)
+                readme           = render_readme(original_name, selected_algo)
+
+                # Encrypt straight into the zip response — no temp files, first bytes immediately
+                file_stream = detach_upload_stream(uploaded_file)
+
+                def enc_chunks():
+                    yield INSTANT_HEADER.pack(salt, iv, num_chunks)
+                    # Read → encrypt N chunks in parallel → emit in order
+                    for enc_chunk in map_chunks_ordered(
+                            file_stream,
+                            instant_chunk_encryptor(selected_algo, key, iv),
+                            CHUNK,
+                            workers=workers,
+                            max_inflight_bytes=inflight):
+                        yield INSTANT_CHUNK_LEN.pack(len(enc_chunk))
+                        yield enc_chunk
+
                 def generate_zip():
                     try:
-                        zip_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-                        zip_tmp.close()
-                        with zipfile.ZipFile(zip_tmp.name, "w", zipfile.ZIP_STORED) as zf:
-                            zf.writestr("README.md", readme)
-                            zf.writestr("decrypt.py", decryptor_script)
-                            zf.write(tmp_name, f"{original_name}.enc")
-                        with open(zip_tmp.name, "rb") as f:
-                            while True:
-                                chunk = f.read(1024 * 1024)
-                                if not chunk:
-                                    break
-                                yield chunk
+                        zs = ZipStreamWriter()
+                        yield from zs.write_bytes("README.md", readme)
+                        yield from zs.write_bytes("decrypt.py", decryptor_script)
+                        yield from zs.write_stream(f"{original_name}.enc", enc_chunks(),
+                                                   zip64=enc_size >= ZIP64_LIMIT)
+                        yield zs.close()
                     finally:
-                        os.unlink(tmp_name)
-                        os.unlink(zip_tmp.name)
+                        file_stream.close()
 
                 response = Response(
                     stream_with_context(generate_zip()),
@@ -304,339 +485,96 @@ def upload_file():
                 print("RETURNING ZIP")
                 return response
             else:
-                # ── SMALL FILE (<=200MB): self-decrypting HTML ───────────────
-                file_bytes = file_stream.read()
-                print("RETURNING HTML")
-
-                if selected_algo == "AES-256-GCM":
-                    encrypted = AESGCM(key).encrypt(iv, file_bytes, None)
-                elif selected_algo == "ChaCha20":
-                    encrypted = ChaCha20Poly1305(key).encrypt(iv, file_bytes, None)
-                elif selected_algo == "Fernet":
-                    f         = Fernet(base64.urlsafe_b64encode(key))
-                    encrypted = f.encrypt(file_bytes)
-                    iv        = b"fernet_internal"
-
-                enc_b64  = base64.b64encode(encrypted).decode()
-                salt_b64 = base64.b64encode(salt).decode()
-                iv_b64   = base64.b64encode(iv).decode()
-
-                html = f"""<!DOCTYPE html>
-                    <html lang="en">
-                    <head>
-                    <meta charset="UTF-8">
-                    <title>Decrypt: {original_name}</title>
-                    <style>
-                    * {{ box-sizing: border-box; margin: 0; padding: 0; }}
-                    body {{
-                        font-family: system-ui, sans-serif;
-                        background: #0f0f0f;
-                        color: #e0e0e0;
-                        display: flex;
-                        align-items: center;
-                        justify-content: center;
-                        min-height: 100vh;
-                    }}
-                    .card {{
-                        background: #1a1a1a;
-                        border: 1px solid #2a2a2a;
-                        border-radius: 12px;
-                        padding: 2rem;
-                        width: 100%;
-                        max-width: 420px;
-                        box-shadow: 0 8px 32px rgba(0,0,0,0.4);
-                    }}
-                    h2 {{ font-size: 1.2rem; margin-bottom: 0.4rem; color: #fff; }}
-                    p.sub {{ font-size: 0.85rem; color: #888; margin-bottom: 1.5rem; }}
-                    input {{
-                        width: 100%;
-                        padding: 0.75rem 1rem;
-                        border-radius: 8px;
-                        border: 1px solid #333;
-                        background: #111;
-                        color: #fff;
-                        font-size: 1rem;
-                        margin-bottom: 1rem;
-                        outline: none;
-                    }}
-                    input:focus {{ border-color: #555; }}
-                    .algo-badge {{
-                        display: inline-block;
-                        padding: 0.25rem 0.75rem;
-                        border-radius: 999px;
-                        font-size: 0.75rem;
-                        font-weight: 600;
-                        margin-bottom: 1.5rem;
-                        background: #2a2a2a;
-                        color: #aaa;
-                        border: 1px solid #333;
-                    }}
-                    button {{
-                        width: 100%;
-                        padding: 0.75rem;
-                        border-radius: 8px;
-                        border: none;
-                        background: #fff;
-                        color: #000;
-                        font-size: 1rem;
-                        font-weight: 600;
-                        cursor: pointer;
-                        transition: opacity 0.2s;
-                    }}
-                    button:hover {{ opacity: 0.85; }}
-                    button:disabled {{ opacity: 0.4; cursor: not-allowed; }}
-                    .status {{
-                        margin-top: 1rem;
-                        font-size: 0.85rem;
-                        text-align: center;
-                        min-height: 1.2rem;
-                        color: #888;
-                    }}
-                    .error {{ color: #ff6b6b; }}
-                    .success {{ color: #6bffb8; }}
-                    .filename {{
-                        font-size: 0.8rem;
-                        color: #555;
-                        margin-bottom: 1rem;
-                        word-break: break-all;
-                    }}
-                    </style>
-                    </head>
-                    <body>
-                    <div class="card">
-                    <h2>🔐 Encrypted File</h2>
-                    <p class="sub">Self-decrypting. No internet required.</p>
-                    <div class="filename">📄 {original_name}</div>
-                    <div class="algo-badge">🔒 {selected_algo}</div>
-                    <input type="password" id="pwd" placeholder="Enter decryption password" />
-                    <button id="btn" onclick="decrypt()">Decrypt & Download</button>
-                    <div class="status" id="status"></div>
-                    </div>
-
-                    <script>
-                    const ALGO      = "{selected_algo}";
-                    const ENC_B64   = "{enc_b64}";
-                    const SALT_B64  = "{salt_b64}";
-                    const IV_B64    = "{iv_b64}";
-                    const FILENAME  = "{original_name}";
-                    const ITERS     = 600000;
-
-                    function b64ToBytes(b64) {{
-                    const bin = atob(b64);
-                    const arr = new Uint8Array(bin.length);
-                    for (let i = 0; i < bin.length; i++) arr[i] = bin.charCodeAt(i);
-                    return arr;
-                    }}
-
-                    function bytesToB64url(bytes) {{
-                    let bin = "";
-                    for (const b of bytes) bin += String.fromCharCode(b);
-                    return btoa(bin).replace(/\\+/g, "-").replace(/\\//g, "_").replace(/=/g, "");
-                    }}
-
-                    async function deriveKey(password, salt) {{
-                    const pwdKey = await crypto.subtle.importKey(
-                        "raw", new TextEncoder().encode(password), "PBKDF2", false, ["deriveBits"]
-                    );
-                    const bits = await crypto.subtle.deriveBits(
-                        {{ name: "PBKDF2", salt, iterations: ITERS, hash: "SHA-256" }},
-                        pwdKey, 256
-                    );
-                    return new Uint8Array(bits);
-                    }}
-
-                    async function decryptAES(keyBytes, iv, enc) {{
-                    const key = await crypto.subtle.importKey("raw", keyBytes, {{ name: "AES-GCM" }}, false, ["decrypt"]);
-                    const dec = await crypto.subtle.decrypt({{ name: "AES-GCM", iv }}, key, enc);
-                    return new Uint8Array(dec);
-                    }}
-
-                    function rotl(a, b) {{ return (a << b) | (a >>> (32 - b)); }}
-                    function quarterRound(x, a, b, c, d) {{
-                    x[a] ^= rotl(x[b] + x[d] | 0, 7);  x[c] ^= rotl(x[d] + x[a] | 0, 9);
-                    x[b] ^= rotl(x[a] + x[c] | 0, 13); x[d] ^= rotl(x[c] + x[b] | 0, 18);
-                    }}
-                    function chacha20Block(key, counter, nonce) {{
-                    const c = new Uint32Array([
-                        0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
-                        ...Array.from({{length:8}}, (_,i) => (key[i*4]|(key[i*4+1]<<8)|(key[i*4+2]<<16)|(key[i*4+3]<<24))>>>0),
-                        counter >>> 0,
-                        ...[0,4,8].map(i => (nonce[i]|(nonce[i+1]<<8)|(nonce[i+2]<<16)|(nonce[i+3]<<24))>>>0)
-                    ]);
-                    const x = new Uint32Array(c);
-                    for (let i = 0; i < 10; i++) {{
-                        quarterRound(x,0,4,8,12);  quarterRound(x,1,5,9,13);
-                        quarterRound(x,2,6,10,14); quarterRound(x,3,7,11,15);
-                        quarterRound(x,0,5,10,15); quarterRound(x,1,6,11,12);
-                        quarterRound(x,2,7,8,13);  quarterRound(x,3,4,9,14);
-                    }}
-                    const out = new Uint8Array(64);
-                    for (let i = 0; i < 16; i++) {{
-                        const v = (x[i] + c[i]) >>> 0;
-                        out[i*4]   =  v        & 0xff;
-                        out[i*4+1] = (v >>  8) & 0xff;
-                        out[i*4+2] = (v >> 16) & 0xff;
-                        out[i*4+3] = (v >> 24) & 0xff;
-                    }}
-                    return out;
-                    }}
-
-                    function poly1305(key, msg) {{
-                    const r = new Uint8Array(key.slice(0,16));
-                    const s = new Uint8Array(key.slice(16,32));
-                    r[3]&=15;r[7]&=15;r[11]&=15;r[15]&=15;
-                    r[4]&=252;r[8]&=252;r[12]&=252;
-                    let h0=0,h1=0,h2=0,h3=0,h4=0;
-                    const rr0=(r[0]|(r[1]<<8)|(r[2]<<16)|(r[3]<<24))>>>0;
-                    const rr1=(r[4]|(r[5]<<8)|(r[6]<<16)|(r[7]<<24))>>>0;
-                    const rr2=(r[8]|(r[9]<<8)|(r[10]<<16)|(r[11]<<24))>>>0;
-                    const rr3=(r[12]|(r[13]<<8)|(r[14]<<16)|(r[15]<<24))>>>0;
-                    for(let i=0;i<msg.length;i+=16){{
-                        const chunk=msg.slice(i,i+16);
-                        const n=new Uint8Array(17);n.set(chunk);n[chunk.length]=1;
-                        h0+=( n[0]|(n[1]<<8)|(n[2]<<16)|(n[3]<<24))>>>0;
-                        h1+=((n[4]|(n[5]<<8)|(n[6]<<16)|(n[7]<<24))>>>0);
-                        h2+=((n[8]|(n[9]<<8)|(n[10]<<16)|(n[11]<<24))>>>0);
-                        h3+=((n[12]|(n[13]<<8)|(n[14]<<16)|(n[15]<<24))>>>0);
-                        h4+=n[16];
-                        const d0=Math.imul(h0,rr0)+Math.imul(h1*5,rr3)+Math.imul(h2*5,rr2)+Math.imul(h3*5,rr1)+Math.imul(h4*5,rr0);
-                        h0=d0>>>0; h4+=(d0/0x100000000)|0;
-                    }}
-                    let f=(h4>>>2)*5; h4&=3; h0=(h0+f)>>>0;
-                    const ss0=(s[0]|(s[1]<<8)|(s[2]<<16)|(s[3]<<24))>>>0;
-                    const ss1=(s[4]|(s[5]<<8)|(s[6]<<16)|(s[7]<<24))>>>0;
-                    const ss2=(s[8]|(s[9]<<8)|(s[10]<<16)|(s[11]<<24))>>>0;
-                    const ss3=(s[12]|(s[13]<<8)|(s[14]<<16)|(s[15]<<24))>>>0;
-                    h0=(h0+ss0)>>>0; h1=(h1+ss1)>>>0; h2=(h2+ss2)>>>0; h3=(h3+ss3)>>>0;
-                    const tag=new Uint8Array(16);
-                    tag[0]=h0;tag[1]=h0>>8;tag[2]=h0>>16;tag[3]=h0>>24;
-                    tag[4]=h1;tag[5]=h1>>8;tag[6]=h1>>16;tag[7]=h1>>24;
-                    tag[8]=h2;tag[9]=h2>>8;tag[10]=h2>>16;tag[11]=h2>>24;
-                    tag[12]=h3;tag[13]=h3>>8;tag[14]=h3>>16;tag[15]=h3>>24;
-                    return tag;
-                    }}
-
-                    async function decryptChaCha(keyBytes, iv, enc) {{
-                    const ciphertext = enc.slice(0, enc.length - 16);
-                    const tag        = enc.slice(enc.length - 16);
-                    const polyBlock  = chacha20Block(keyBytes, 0, iv);
-                    const polyKey    = polyBlock.slice(0, 32);
-                    const expectedTag = poly1305(polyKey, ciphertext);
-                    let tagOk = true;
-                    for (let i = 0; i < 16; i++) if (tag[i] !== expectedTag[i]) {{ tagOk = false; break; }}
-                    if (!tagOk) throw new Error("Tag mismatch — wrong password or corrupted.");
-                    const out = new Uint8Array(ciphertext.length);
-                    for (let i = 0; i < ciphertext.length; i += 64) {{
-                        const block = chacha20Block(keyBytes, 1 + (i / 64 | 0), iv);
-                        const chunk = ciphertext.slice(i, i + 64);
-                        for (let j = 0; j < chunk.length; j++) out[i + j] = chunk[j] ^ block[j];
-                    }}
-                    return out;
-                    }}
-
-                    async function decryptFernet(keyBytes, encB64url) {{
-                    function b64urlToBytes(s) {{
-                        s = s.replace(/-/g,"+").replace(/_/g,"/");
-                        while(s.length%4) s+="=";
-                        return b64ToBytes(s);
-                    }}
-                    const signingKey = keyBytes.slice(0, 16);
-                    const encKey     = keyBytes.slice(16, 32);
-                    const token      = b64urlToBytes(encB64url);
-                    const iv         = token.slice(9, 25);
-                    const cipher     = token.slice(25, token.length - 32);
-                    const hmac       = token.slice(token.length - 32);
-                    const msgToSign  = token.slice(0, token.length - 32);
-                    const hmacKey    = await crypto.subtle.importKey("raw", signingKey, {{name:"HMAC",hash:"SHA-256"}}, false, ["verify"]);
-                    const valid      = await crypto.subtle.verify("HMAC", hmacKey, hmac, msgToSign);
-                    if (!valid) throw new Error("HMAC mismatch — wrong password or corrupted.");
-                    const aesKey     = await crypto.subtle.importKey("raw", encKey, {{name:"AES-CBC"}}, false, ["decrypt"]);
-                    const dec        = await crypto.subtle.decrypt({{name:"AES-CBC", iv}}, aesKey, cipher);
-                    return new Uint8Array(dec);
-                    }}
-
-                    async function decrypt() {{
-                    const btn    = document.getElementById("btn");
-                    const status = document.getElementById("status");
-                    const pwd    = document.getElementById("pwd").value;
-                    if (!pwd) {{ status.innerHTML = '<span class="error">Enter a password.</span>'; return; }}
-                    btn.disabled = true;
-                    status.textContent = "Deriving key...";
-                    try {{
-                        const enc      = b64ToBytes(ENC_B64);
-                        const salt     = b64ToBytes(SALT_B64);
-                        const iv       = b64ToBytes(IV_B64);
-                        status.textContent = "Decrypting...";
-                        const keyBytes = await deriveKey(pwd, salt);
-                        let decrypted;
-                        if (ALGO === "AES-256-GCM") {{
-                        decrypted = await decryptAES(keyBytes, iv, enc);
-                        }} else if (ALGO === "ChaCha20") {{
-                        decrypted = await decryptChaCha(keyBytes, iv, enc);
-                        }} else if (ALGO === "Fernet") {{
-                        decrypted = await decryptFernet(keyBytes, ENC_B64);
-                        }}
-                        const blob = new Blob([decrypted]);
-                        const a    = document.createElement("a");
-                        a.href     = URL.createObjectURL(blob);
-                        a.download = FILENAME;
-                        a.click();
-                        URL.revokeObjectURL(a.href);
-                        status.innerHTML = '<span class="success">✓ Decrypted & downloaded!</span>';
-                    }} catch(e) {{
-                        console.error(e);
-                        status.innerHTML = '<span class="error">✗ Wrong password or corrupted file.</span>';
-                    }} finally {{
-                        btn.disabled = false;
-                    }}
-                    }}
-
-                    document.getElementById("pwd").addEventListener("keydown", e => {{
-                    if (e.key === "Enter") decrypt();
-                    }});
-                    </script>
-                    </body>
-                    </html>"""
-
-                response = Response(html, mimetype="text/html")
+                # ── SMALL FILE (<=200MB): self-decrypting HTML, streamed ─────
+                if selected_algo == "Fernet":
+                    iv = b"fernet_internal"
+
+                # The page is encrypted while it streams, after the view has returned
+                file_stream = detach_upload_stream(uploaded_file)
+
+                def generate_html():
+                    try:
+                        yield from stream_instant_html(
+                            file_stream, original_name, selected_algo, key, salt, iv)
+                    finally:
+                        file_stream.close()
+
+                response = Response(
+                    stream_with_context(generate_html()),
+                    mimetype="text/html"
+                )
+                response.headers["Content-Length"] = instant_html_size(
+                    original_name, selected_algo, salt, iv, file_size)
                 response.headers["Content-Disposition"] = f"attachment; filename=\"{original_name}.html\""
                 return response
     
-        # --- BRANCH 2: CLOUD STORAGE ---
-        file_bytes = uploaded_file.read()
-        if len(file_bytes) > 100 * 1024 * 1024:
-            return jsonify({"error": "Cloud storage limit 100MB"}), 413
-
-        if not validate_magic_bytes(file_bytes):
+        # --- BRANCH 2: CLOUD STORAGE (streamed into a segmented container) ---
+        file_stream = uploaded_file.stream
+        file_stream.seek(0, 2)
+        file_size = file_stream.tell()
+        file_stream.seek(0)
+
+        max_size = current_app.config["CLOUD_MAX_FILE_SIZE"]
+        if file_size > max_size:
+            return jsonify({"error": f"Cloud storage limit {max_size // (1024 * 1024)}MB"}), 413
+
+        extension = uploaded_file.filename.rsplit(".", 1)[1].lower()
+        head      = file_stream.read(SAMPLE_SIZE)
+        file_stream.seek(0)
+        if not validate_magic_bytes(head[:8], extension):
             return jsonify({"error": "File content does not match its extension"}), 400
-        
-        encrypted_data, nonce, salt = encrypt_file(file_bytes, user_id, algo=selected_algo)
-        sha256_hash = compute_sha256(file_bytes)
-        
-        unique_key = secrets.token_urlsafe(32)
-        upload_dir = os.path.join(os.path.dirname(__file__), "..", "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, f"{unique_key}.enc")
-
-        with open(file_path, "wb") as f:
-            f.write(encrypted_data)
+
+        codec = choose_compression(extension, head)
+        # Envelope encryption: a random data key, stored wrapped under the active master key
+        file_key = generate_data_key()
+        wrapped_key, kek_version = wrap_data_key(file_key, user_id)
+        salt   = secrets.token_bytes(SALT_SIZE)   # header field; unused by the envelope scheme
+        header = ContainerHeader(selected_algo, salt, codec=codec)
+
+        unique_key  = secrets.token_urlsafe(32)
+        storage_key = f"users/{user_id}/files/{unique_key}.enc"
+        storage     = get_storage()
+
+        # Single pass: each chunk goes to the cipher and to SHA-256 (on its own thread),
+        # and on to storage (S3: parts uploaded in parallel as they fill)
+        segment_lengths = []
+        with BackgroundHasher() as hasher:
+            stored_size = storage.put_stream(
+                storage_key, encrypt_stream(file_stream, file_key, header, hasher=hasher,
+                                            segment_lengths=segment_lengths))
+            sha256_hash = hasher.hexdigest()
 
         new_file = File(
             user_id=user_id,
             original_name=uploaded_file.filename,
             safe_name=sanitize_filename(uploaded_file.filename),
-            file_size=len(file_bytes),
+            file_size=file_size,
             mime_type=mimetypes.guess_type(uploaded_file.filename)[0] or "application/octet-stream",
-            extension=uploaded_file.filename.rsplit(".", 1)[1].lower(),
-            s3_key=f"users/{user_id}/files/{unique_key}.enc",
+            extension=extension,
+            s3_key=storage_key,
             encryption_algo=selected_algo,
             sha256_hash=sha256_hash,
-            encryption_iv=encode_bytes(nonce) + ":" + encode_bytes(salt)
+            encryption_iv=pack_encryption_iv(header.nonce, salt, KDF_ENVELOPE),
+            wrapped_key=wrapped_key,
+            kek_version=kek_version,
+            container_version=CONTAINER_VERSION,
+            compression=CODEC_NAMES.get(codec),
+            segment_index=pack_segment_index(segment_lengths) if codec else None
         )
 
+        # Same content already stored for this user: keep the existing blob, drop ours
+        existing = find_duplicate(user_id, sha256_hash)
+        if existing:
+            existing.share_blob_with(new_file)
+            storage.delete(storage_key)
+        else:
+            new_file.blob = Blob(user_id=user_id, storage_key=storage_key,
+                                 sha256_hash=sha256_hash, size=stored_size)
+
         db.session.add(new_file)
         db.session.commit()
-        return jsonify({"message": "Success", "data": new_file.to_dict()}), 201
+        return jsonify({"message": "Success", "data": new_file.to_dict(),
+                        "deduplicated": existing is not None}), 201
 
     except Exception as e:
         db.session.rollback()
@@ -645,18 +583,210 @@ def upload_file():
         return jsonify({"error": str(e)}), 500
     
     
+@files_bp.route("/upload/check", methods=["POST"])
+@jwt_required()
+@limiter.limit("120 per hour")
+def check_upload():
+    """
+    Ask whether the caller already stores content with this SHA-256.
+    With a `filename`, a match is stored as a new file referencing the
+    existing blob, so the client can skip sending the bytes.
+    """
+    try:
+        user_id     = int(get_jwt_identity())
+        data        = request.get_json(silent=True) or {}
+        sha256_hash = str(data.get("sha256_hash", "")).lower()
+        filename    = data.get("filename")
+
+        if len(sha256_hash) != 64 or any(c not in "0123456789abcdef" for c in sha256_hash):
+            return jsonify({"error": "sha256_hash must be 64 hex characters",
+                            "code": "INVALID_HASH"}), 400
+
+        if filename is not None and (not isinstance(filename, str) or not allowed_file(filename)):
+            return jsonify({"error": "Invalid file type"}), 400
+
+        existing = find_duplicate(user_id, sha256_hash)
+        if not existing or filename is None:
+            return jsonify({"data": {"exists": existing is not None}}), 200
+
+        new_file = File(
+            user_id=user_id,
+            original_name=filename,
+            safe_name=sanitize_filename(filename),
+            mime_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            extension=filename.rsplit(".", 1)[1].lower(),
+            # Row keys stay unique; the bytes are read through the shared blob
+            s3_key=f"users/{user_id}/files/{secrets.token_urlsafe(32)}.enc"
+        )
+        existing.share_blob_with(new_file)
+        db.session.add(new_file)
+        db.session.commit()
+
+        log_action(user_id=user_id, action="FILE_UPLOAD",
+                   resource=f"file:{new_file.id}", status="success",
+                   details=f"Deduplicated: {filename} (file:{existing.id})")
+
+        return jsonify({"message": "Success",
+                        "data": {"exists": True, "file": new_file.to_dict()}}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "Upload check failed", "code": "SERVER_ERROR"}), 500
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 200
+SORT_COLUMNS = {"date": File.created_at, "name": File.original_name, "size": File.file_size}
+
+
+class ListingError(ValueError):
+    """Bad query parameter on the file listing (400 with `code`)."""
+
+    def __init__(self, message: str, code: str = "INVALID_FILTER"):
+        super().__init__(message)
+        self.code = code
+
+
+def parse_timestamp(value: str, name: str) -> datetime:
+    """ISO 8601 date or datetime → naive UTC, the way DateTime columns are stored."""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ListingError(f"{name} must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_size(value: str, name: str) -> int:
+    if not value.isdigit():
+        raise ListingError(f"{name} must be a non-negative integer (bytes)")
+    return int(value)
+
+
+def encode_cursor(sort: str, order: str, file: File) -> str:
+    value = getattr(file, SORT_COLUMNS[sort].key)
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None).isoformat()
+    payload = json.dumps({"s": sort, "o": order, "v": value, "id": file.id},
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str):
+    """(sort value, id) of the last row on the previous page."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value, last_id = payload["v"], int(payload["id"])
+        if payload["s"] != sort or payload["o"] != order:
+            raise ListingError("cursor was issued for a different sort order", "INVALID_CURSOR")
+        if sort == "date":
+            value = datetime.fromisoformat(value)
+        elif sort == "size":
+            value = int(value)
+        elif not isinstance(value, str):
+            raise TypeError
+    except ListingError:
+        raise
+    except (ValueError, TypeError, KeyError):
+        raise ListingError("Malformed cursor", "INVALID_CURSOR")
+    return value, last_id
+
+
+def filtered_files(user_id: int, args):
+    """The caller's live files narrowed by the listing's query-string filters."""
+    query = File.query.filter(File.user_id == user_id, File.is_deleted == db.false())
+
+    if args.get("extension"):
+        extensions = [e.strip().lstrip(".").lower() for e in args["extension"].split(",") if e.strip()]
+        query = query.filter(File.extension.in_(extensions))
+    if args.get("mime_type"):
+        mime_type = args["mime_type"].lower()
+        # "image/" or "image/*" selects the whole type
+        if mime_type.endswith("/") or mime_type.endswith("/*"):
+            query = query.filter(File.mime_type.startswith(mime_type.rstrip("*"), autoescape=True))
+        else:
+            query = query.filter(File.mime_type == mime_type)
+    if args.get("algo"):
+        algo = args["algo"]
+        if algo not in CIPHER_ENGINES:
+            raise ListingError(f"algo must be one of: {', '.join(CIPHER_ENGINES)}")
+        query = query.filter(File.encryption_algo == algo)
+    if args.get("min_size"):
+        query = query.filter(File.file_size >= parse_size(args["min_size"], "min_size"))
+    if args.get("max_size"):
+        query = query.filter(File.file_size <= parse_size(args["max_size"], "max_size"))
+    if args.get("created_after"):
+        query = query.filter(File.created_at >= parse_timestamp(args["created_after"], "created_after"))
+    if args.get("created_before"):
+        query = query.filter(File.created_at < parse_timestamp(args["created_before"], "created_before"))
+    return query
+
+
 @files_bp.route("/", methods=["GET"])
 @jwt_required()
 def list_files():
+    """
+    One page of the caller's files, newest first by default.
+
+    Query: sort=date|name|size, order=desc|asc, limit (max 200), cursor
+    (next_cursor of the previous page), extension (comma list), mime_type
+    ("image/" for a whole type), algo, min_size / max_size (bytes),
+    created_after / created_before (ISO 8601), totals=1 for vault-wide
+    file count and bytes. Pages are keyset-seeked on (sort column, id),
+    so every page costs the same whatever the vault size or page depth.
+    """
     try:
         user_id = int(get_jwt_identity())
-        # Make sure this query matches your model
-        files = File.query.filter_by(user_id=user_id, is_deleted=False).order_by(File.created_at.desc()).all()
-        
-        return jsonify({
+        args    = request.args
+
+        sort  = args.get("sort", "date")
+        order = args.get("order", "desc")
+        if sort not in SORT_COLUMNS:
+            raise ListingError("sort must be one of: date, name, size")
+        if order not in ("asc", "desc"):
+            raise ListingError("order must be asc or desc")
+        try:
+            limit = min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ListingError("limit must be an integer")
+
+        column = SORT_COLUMNS[sort]
+        query  = filtered_files(user_id, args)
+        if args.get("cursor"):
+            value, last_id = decode_cursor(args["cursor"], sort, order)
+            after = db.tuple_(column, File.id)
+            query = query.filter(after < (value, last_id) if order == "desc"
+                                 else after > (value, last_id))
+        if order == "desc":
+            query = query.order_by(column.desc(), File.id.desc())
+        else:
+            query = query.order_by(column.asc(), File.id.asc())
+
+        # One extra row tells us whether another page exists
+        files    = query.limit(limit + 1).all()
+        has_more = len(files) > limit
+        files    = files[:limit]
+
+        body = {
             "message": "Files retrieved successfully",
-            "data": [f.to_dict() for f in files]
-        }), 200
+            "data": [f.to_dict() for f in files],
+            "pagination": {
+                "sort": sort, "order": order, "limit": limit, "has_more": has_more,
+                "next_cursor": encode_cursor(sort, order, files[-1]) if has_more else None,
+            },
+        }
+        if args.get("totals") in ("1", "true"):
+            count, size = (db.session.query(db.func.count(File.id),
+                                            db.func.coalesce(db.func.sum(File.file_size), 0))
+                           .filter(File.user_id == user_id, File.is_deleted == db.false()).one())
+            body["totals"] = {"files": count, "bytes": int(size)}
+        return jsonify(body), 200
+
+    except ListingError as e:
+        return jsonify({"error": str(e), "code": e.code}), 400
     except Exception as e:
         print(f"Error in list_files: {str(e)}") # This will show in your terminal
         return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
@@ -675,40 +805,46 @@ def download_file(file_id):
                        details="File not found or access denied")
             return jsonify({"error": "File not found", "code": "FILE_NOT_FOUND"}), 404
 
-        unique_key = file.s3_key.split("/")[-1].replace(".enc", "")
-        upload_dir = os.path.join(os.path.dirname(__file__), "..", "uploads")
-        file_path  = os.path.join(upload_dir, f"{unique_key}.enc")
-
-        if not os.path.exists(file_path):
-            return jsonify({"error": "File not found on disk", "code": "FILE_MISSING"}), 404
+        cached = not_modified(file, file.sha256_hash, PRIVATE_CACHE)
+        if cached:
+            return cached
 
-        with open(file_path, "rb") as f:
-            encrypted_data = f.read()
+        storage = get_storage()
 
-        iv_parts       = file.encryption_iv.split(":")
-        nonce          = decode_bytes(iv_parts[0])
-        salt           = decode_bytes(iv_parts[1])
-        
-        # USE THE ALGO STORED IN THE DATABASE FOR DECRYPTION
-        decrypted_data = decrypt_file(encrypted_data, nonce, salt, user_id, algo=file.encryption_algo)
+        if not storage.exists(file.storage_key):
+            return jsonify({"error": "File not found on disk", "code": "FILE_MISSING"}), 404
 
-        if not verify_file_integrity(decrypted_data, file.sha256_hash):
-            log_action(user_id=user_id, action="FILE_INTEGRITY_FAILED",
-                       resource=f"file:{file_id}", status="failure",
-                       details="SHA-256 hash mismatch — file may be tampered")
-            return jsonify({"error": "File integrity check failed",
-                            "code": "INTEGRITY_ERROR"}), 500
+        ranges = requested_ranges(file)
+        if ranges == []:
+            return range_not_satisfiable(file)
+        if ranges:
+            log_action(user_id=user_id, action="FILE_DOWNLOAD",
+                       resource=f"file:{file_id}", status="success",
+                       details=f"Downloaded: {file.original_name} "
+                               f"(bytes {format_ranges(ranges)})")
+            return partial_response(file, storage, ranges)
+
+        chunks = stream_stored_file(file, storage)
+
+        if not file.container_version:
+            # Legacy blobs are decrypted whole anyway, so verify before sending
+            decrypted_data = next(chunks)
+            if not verify_file_integrity(decrypted_data, file.sha256_hash):
+                log_action(user_id=user_id, action="FILE_INTEGRITY_FAILED",
+                           resource=f"file:{file_id}", status="failure",
+                           details="SHA-256 hash mismatch — file may be tampered")
+                return jsonify({"error": "File integrity check failed",
+                                "code": "INTEGRITY_ERROR"}), 500
+            chunks = iter([decrypted_data])
+        else:
+            # Segments are authenticated as they stream; the whole-file hash is checked at the end
+            chunks = verify_while_streaming(chunks, file, user_id)
 
         log_action(user_id=user_id, action="FILE_DOWNLOAD",
                    resource=f"file:{file_id}", status="success",
                    details=f"Downloaded: {file.original_name}")
 
-        return send_file(
-            io.BytesIO(decrypted_data),
-            mimetype      = file.mime_type,
-            as_attachment = True,
-            download_name = file.original_name
-        )
+        return attachment_response(file, chunks)
 
     except Exception as e:
         import traceback
@@ -785,30 +921,31 @@ def access_shared_file(token):
             return jsonify({"error": "Share link invalid or expired",
                             "code": "INVALID_SHARE"}), 404
 
-        unique_key = file.s3_key.split("/")[-1].replace(".enc", "")
-        upload_dir = os.path.join(os.path.dirname(__file__), "..", "uploads")
-        file_path  = os.path.join(upload_dir, f"{unique_key}.enc")
+        cache_control = shared_cache_policy(file)
+        cached = not_modified(file, file.sha256_hash, cache_control)
+        if cached:
+            return cached
 
-        with open(file_path, "rb") as f:
-            encrypted_data = f.read()
+        storage = get_storage()
+
+        ranges = requested_ranges(file)
+        if ranges == []:
+            return range_not_satisfiable(file)
+        if ranges:
+            log_action(user_id=None, action="FILE_SHARED_ACCESS",
+                       resource=f"file:{file.id}", status="success",
+                       details=f"Shared file accessed: {file.original_name} "
+                               f"(bytes {format_ranges(ranges)})")
+            return partial_response(file, storage, ranges, cache_control)
 
-        iv_parts       = file.encryption_iv.split(":")
-        nonce          = decode_bytes(iv_parts[0])
-        salt           = decode_bytes(iv_parts[1])
-        
         # USE STORED ALGO FOR SHARED ACCESS AS WELL
-        decrypted_data = decrypt_file(encrypted_data, nonce, salt, file.user_id, algo=file.encryption_algo)
+        chunks = verify_while_streaming(stream_stored_file(file, storage), file, None)
 
         log_action(user_id=None, action="FILE_SHARED_ACCESS",
                    resource=f"file:{file.id}", status="success",
                    details=f"Shared file accessed: {file.original_name}")
 
-        return send_file(
-            io.BytesIO(decrypted_data),
-            mimetype      = file.mime_type,
-            as_attachment = True,
-            download_name = file.original_name
-        )
+        return attachment_response(file, chunks, cache_control=cache_control)
 
     except Exception as e:
         import traceback
@@ -826,7 +963,13 @@ def file_info(file_id):
         if not file:
             return jsonify({"error": "File not found", "code": "FILE_NOT_FOUND"}), 404
 
-        return jsonify({"data": file.to_dict()}), 200
+        data   = file.to_dict()
+        etag   = metadata_etag(data)
+        cached = not_modified(file, etag, PRIVATE_CACHE)
+        if cached:
+            return cached
+
+        return set_validators(jsonify({"data": data}), file, etag, PRIVATE_CACHE), 200
 
     except Exception as e:
         return jsonify({"error": "Failed to get file info", "code": "SERVER_ERROR"}), 500
\ No newline at end of file
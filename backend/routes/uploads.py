@@ -0,0 +1,318 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from extensions import db, limiter
+from models.user import User
+from models.file import UploadSession, UploadChunk
+from routes.files import allowed_file
+from utils.encryption import (
+    CIPHER_ENGINES, SALT_SIZE, INSTANT_HEADER, INSTANT_CHUNK_LEN,
+    derive_password_key, instant_chunk_encryptor, wrap_data_key, unwrap_data_key,
+    encode_bytes, decode_bytes
+)
+from utils.zipstream import ZipStreamWriter, ZIP64_LIMIT
+from utils.instant_bundle import render_decryptor, render_readme
+from utils.storage import StorageBackend, get_storage
+from utils.audit_logger import log_action
+import os
+import secrets
+import hashlib
+from datetime import datetime, timezone
+
+# Resumable instant-encrypt uploads:
+#   POST   /sessions                      {filename, file_size, password, algo?, chunk_size?}
+#   PUT    /sessions/<id>/chunks?offset=N raw chunk bytes (any order, in parallel)
+#   GET    /sessions/<id>                 committed offset + missing chunk ranges, to resume
+#   POST   /sessions/<id>/complete        → download_url of the zip bundle
+#   GET    /sessions/<id>/bundle?token=   streamed zip (README.md, decrypt.py, .enc)
+#   DELETE /sessions/<id>
+# Each chunk is encrypted on arrival (nonce = iv + index + 1, the instant .enc
+# format) and only the ciphertext is stored; the bundle is assembled from the
+# stored chunks when downloaded.
+
+uploads_bp = Blueprint("uploads", __name__)
+
+MIN_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNKS     = 2**31 - 1    # u32 in the .enc header, but upload_sessions.num_chunks is a signed INTEGER
+
+
+def chunk_storage_key(session: UploadSession, index: int, sha256_hash: str) -> str:
+    # Content-addressed per index, so a racing resend with other bytes can't overwrite a stored chunk
+    return f"upload-sessions/{session.id}-{index:08d}-{sha256_hash[:16]}.chunk"
+
+
+def read_up_to(stream, size: int) -> bytes:
+    """Read until `size` bytes or EOF; one read() may return less on a real server."""
+    data = stream.read(size)
+    while data and len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def get_session_or_404(session_id: str, user_id: int):
+    session = db.session.get(UploadSession, session_id)
+    if not session or session.user_id != user_id or session.is_expired():
+        return None
+    return session
+
+
+def delete_session(session: UploadSession, storage: StorageBackend):
+    """Remove a session, its chunk rows and stored chunks. Does not commit."""
+    for chunk in session.chunks:
+        storage.delete(chunk.storage_key)
+    db.session.delete(session)
+
+
+def purge_expired_upload_sessions(storage: StorageBackend, limit: int = None) -> int:
+    """Delete expired sessions (abandoned or already downloaded); returns how many."""
+    query = UploadSession.query.filter(UploadSession.expires_at <= datetime.now(timezone.utc))
+    if limit:
+        query = query.limit(limit)
+    expired = query.all()
+    for session in expired:
+        delete_session(session, storage)
+    db.session.commit()
+    return len(expired)
+
+
+@uploads_bp.route("", methods=["POST"])
+@jwt_required()
+@limiter.limit("20 per hour")
+def create_session():
+    try:
+        user_id = int(get_jwt_identity())
+        user    = db.session.get(User, user_id)
+        if not user or not getattr(user, "is_active", True):
+            return jsonify({"error": "User not found or inactive"}), 404
+
+        data      = request.get_json(silent=True) or {}
+        filename  = data.get("filename")
+        password  = data.get("password") or ""
+        algo      = data.get("algo") or current_app.config["DEFAULT_ENCRYPTION_ALGO"]
+        file_size = data.get("file_size")
+        chunk_size = data.get("chunk_size") or current_app.config["UPLOAD_SESSION_CHUNK_SIZE"]
+
+        if not isinstance(filename, str) or not allowed_file(filename):
+            return jsonify({"error": "Invalid file type"}), 400
+        if not password:
+            return jsonify({"error": "Password required for self-decrypting file"}), 400
+        if algo not in CIPHER_ENGINES:
+            return jsonify({"error": f"Unsupported algorithm: {algo}", "code": "INVALID_ALGO"}), 400
+        if not isinstance(file_size, int) or file_size <= 0:
+            return jsonify({"error": "file_size must be a positive integer"}), 400
+        if file_size > current_app.config["UPLOAD_SESSION_MAX_SIZE"]:
+            return jsonify({"error": "File too large for a resumable upload",
+                            "code": "FILE_TOO_LARGE"}), 413
+        if (not isinstance(chunk_size, int)
+                or not MIN_CHUNK_SIZE <= chunk_size <= current_app.config["INSTANT_CHUNK_SIZE"]):
+            return jsonify({"error": "chunk_size out of range"}), 400
+
+        num_chunks = -(-file_size // chunk_size)
+        if num_chunks > MAX_CHUNKS:
+            return jsonify({"error": "File too large for this chunk size"}), 400
+
+        storage = get_storage()
+        purge_expired_upload_sessions(storage, limit=20)
+
+        open_sessions = UploadSession.query.filter_by(user_id=user_id, status="open").count()
+        if open_sessions >= current_app.config["UPLOAD_SESSION_MAX_OPEN"]:
+            return jsonify({"error": "Too many unfinished uploads — complete or cancel one first",
+                            "code": "TOO_MANY_SESSIONS"}), 429
+
+        # One PBKDF2 derivation per upload; the key waits wrapped under the master key
+        salt = os.urandom(SALT_SIZE)
+        iv   = os.urandom(12)
+        key  = derive_password_key(password, salt)
+        wrapped_key, kek_version = wrap_data_key(key, user_id)
+
+        session = UploadSession(
+            id=secrets.token_urlsafe(32),
+            user_id=user_id,
+            original_name=filename,
+            file_size=file_size,
+            chunk_size=chunk_size,
+            num_chunks=num_chunks,
+            encryption_algo=algo,
+            salt=encode_bytes(salt),
+            iv=encode_bytes(iv),
+            wrapped_key=wrapped_key,
+            kek_version=kek_version,
+            expires_at=datetime.now(timezone.utc) + current_app.config["UPLOAD_SESSION_TTL"]
+        )
+        db.session.add(session)
+        db.session.commit()
+
+        log_action(user_id, "INSTANT_ENCRYPT_START", resource=filename, status="success",
+                   details=f"Resumable upload: {file_size} bytes in {num_chunks} chunks")
+        return jsonify({"data": session.to_dict()}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@uploads_bp.route("/<string:session_id>", methods=["GET"])
+@jwt_required()
+@limiter.exempt
+def session_status(session_id):
+    session = get_session_or_404(session_id, int(get_jwt_identity()))
+    if not session:
+        return jsonify({"error": "Upload session not found or expired",
+                        "code": "SESSION_NOT_FOUND"}), 404
+    return jsonify({"data": session.to_dict()}), 200
+
+
+@uploads_bp.route("/<string:session_id>/chunks", methods=["PUT"])
+@jwt_required()
+@limiter.exempt   # one request per chunk; bounded by the session
+def put_chunk(session_id):
+    try:
+        session = get_session_or_404(session_id, int(get_jwt_identity()))
+        if not session:
+            return jsonify({"error": "Upload session not found or expired",
+                            "code": "SESSION_NOT_FOUND"}), 404
+        if session.status != "open":
+            return jsonify({"error": "Upload already completed", "code": "SESSION_CLOSED"}), 409
+
+        offset = request.args.get("offset", type=int)
+        if offset is None or offset < 0 or offset % session.chunk_size or offset >= session.file_size:
+            return jsonify({"error": "offset must be a multiple of chunk_size within the file",
+                            "code": "INVALID_OFFSET"}), 400
+
+        index    = offset // session.chunk_size
+        expected = session.chunk_length(index)
+        if request.content_length is not None and request.content_length != expected:
+            return jsonify({"error": f"Chunk at offset {offset} must be {expected} bytes",
+                            "code": "INVALID_CHUNK_SIZE"}), 400
+        data = read_up_to(request.stream, expected + 1)   # one byte over = too long
+        if len(data) != expected:
+            return jsonify({"error": f"Chunk at offset {offset} must be {expected} bytes",
+                            "code": "INVALID_CHUNK_SIZE"}), 400
+
+        sha256_hash = hashlib.sha256(data).hexdigest()
+        existing    = db.session.get(UploadChunk, (session.id, index))
+        if existing:
+            # A resend after a lost response is fine; different bytes would reuse the nonce
+            if existing.sha256_hash != sha256_hash:
+                return jsonify({"error": "A different chunk was already stored at this offset",
+                                "code": "CHUNK_CONFLICT"}), 409
+            return jsonify({"data": {"offset": offset, "size": expected, "stored": False}}), 200
+
+        key    = unwrap_data_key(session.wrapped_key, session.kek_version, session.user_id)
+        sealed = instant_chunk_encryptor(session.encryption_algo, key,
+                                         decode_bytes(session.iv))(index + 1, data)
+
+        storage     = get_storage()
+        storage_key = chunk_storage_key(session, index, sha256_hash)
+        storage.put_stream(storage_key, [sealed])
+
+        db.session.add(UploadChunk(session_id=session.id, index=index, size=expected,
+                                   sealed_size=len(sealed), sha256_hash=sha256_hash,
+                                   storage_key=storage_key))
+        # Activity keeps the session alive; abandoned ones expire TTL after their last chunk
+        session.expires_at = datetime.now(timezone.utc) + current_app.config["UPLOAD_SESSION_TTL"]
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same chunk raced in on another connection
+            db.session.rollback()
+            winner = db.session.get(UploadChunk, (session_id, index))
+            if winner is None or winner.sha256_hash != sha256_hash:
+                storage.delete(storage_key)
+                return jsonify({"error": "A different chunk was already stored at this offset",
+                                "code": "CHUNK_CONFLICT"}), 409
+
+        return jsonify({"data": {"offset": offset, "size": expected, "stored": True}}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@uploads_bp.route("/<string:session_id>/complete", methods=["POST"])
+@jwt_required()
+def complete_session(session_id):
+    try:
+        user_id = int(get_jwt_identity())
+        session = get_session_or_404(session_id, user_id)
+        if not session:
+            return jsonify({"error": "Upload session not found or expired",
+                            "code": "SESSION_NOT_FOUND"}), 404
+
+        received = session.chunks.count()
+        if received != session.num_chunks:
+            return jsonify({"error": f"Upload incomplete: {received}/{session.num_chunks} chunks",
+                            "code": "UPLOAD_INCOMPLETE", "data": session.to_dict()}), 409
+
+        if session.status != "completed":
+            session.status         = "completed"
+            session.download_token = secrets.token_urlsafe(32)
+            session.wrapped_key    = None   # no more chunks to encrypt; don't keep the key
+            db.session.commit()
+            log_action(user_id, "INSTANT_ENCRYPT_COMPLETE", resource=session.original_name,
+                       status="success", details=f"Resumable upload: {session.file_size} bytes")
+
+        # Repeatable until the session expires, so a failed download can be retried
+        return jsonify({"data": {
+            **session.to_dict(),
+            "download_url": f"/api/files/upload/sessions/{session.id}/bundle"
+                            f"?token={session.download_token}",
+        }}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@uploads_bp.route("/<string:session_id>/bundle", methods=["GET"])
+def download_bundle(session_id):
+    """Token-authenticated (plain browser navigation), so large bundles stream straight to disk."""
+    session = db.session.get(UploadSession, session_id)
+    token   = request.args.get("token", "")
+    if (not session or session.status != "completed" or session.is_expired()
+            or not secrets.compare_digest(token, session.download_token or "")):
+        return jsonify({"error": "Download link invalid or expired", "code": "INVALID_LINK"}), 404
+
+    storage = get_storage()
+    name    = session.original_name
+    algo    = session.encryption_algo
+    chunks  = [(c.storage_key, c.sealed_size) for c in session.chunks]
+    header  = INSTANT_HEADER.pack(decode_bytes(session.salt), decode_bytes(session.iv),
+                                  session.num_chunks)
+    enc_size = len(header) + sum(INSTANT_CHUNK_LEN.size + size for _, size in chunks)
+
+    def enc_chunks():
+        yield header
+        for storage_key, sealed_size in chunks:
+            yield INSTANT_CHUNK_LEN.pack(sealed_size)
+            yield storage.get_range(storage_key, 0, sealed_size)
+
+    def generate_zip():
+        zs = ZipStreamWriter()
+        yield from zs.write_bytes("README.md", render_readme(name, algo))
+        yield from zs.write_bytes("decrypt.py", render_decryptor(algo))
+        yield from zs.write_stream(f"{name}.enc", enc_chunks(), zip64=enc_size >= ZIP64_LIMIT)
+        yield zs.close()
+
+    response = Response(stream_with_context(generate_zip()), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f"attachment; filename=\"{name}_encrypted.zip\""
+    return response
+
+
+@uploads_bp.route("/<string:session_id>", methods=["DELETE"])
+@jwt_required()
+def cancel_session(session_id):
+    try:
+        session = db.session.get(UploadSession, session_id)
+        if not session or session.user_id != int(get_jwt_identity()):
+            return jsonify({"error": "Upload session not found", "code": "SESSION_NOT_FOUND"}), 404
+        delete_session(session, get_storage())
+        db.session.commit()
+        return jsonify({"message": "Upload session deleted"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
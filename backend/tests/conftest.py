@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Read by config at import time
+os.environ.setdefault("MASTER_ENCRYPTION_KEY", "test-master-key")
+
+PASSWORD = "Test!Passw0rd123"
+
+
+@pytest.fixture
+def app():
+    """App on an in-memory database, with blobs in a scratch directory."""
+    from app import create_app
+    from extensions import db
+    from utils.storage import init_storage
+
+    app = create_app("testing")
+    app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp(prefix="sfl-test-uploads-")
+    init_storage(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+    shutil.rmtree(app.config["UPLOAD_FOLDER"], ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    client.post("/api/auth/register", json={
+        "username": "tester", "email": "tester@example.com", "password": PASSWORD})
+    resp = client.post("/api/auth/login", json={"email": "tester@example.com", "password": PASSWORD})
+    return {"Authorization": f"Bearer {resp.get_json()['data']['access_token']}"}
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+from extensions import db
+from models.file import File
+
+# Compressible, several container segments long
+CSV = b"".join(b"%d,alpha,beta,%d\n" % (i, i * i) for i in range(200000))
+
+
+def upload(client, headers, data: bytes, algo: str) -> int:
+    resp = client.post("/api/files/upload", headers=headers, content_type="multipart/form-data",
+                       data={"algo": algo, "file": (io.BytesIO(data), "data.csv")})
+    assert resp.status_code == 201, resp.get_json()
+    return resp.get_json()["data"]["id"]
+
+
+def multipart_parts(resp) -> list:
+    """Bodies of a multipart/byteranges response, in order."""
+    boundary = resp.mimetype_params["boundary"].encode()
+    parts = []
+    for chunk in resp.data.split(b"--" + boundary)[1:-1]:
+        _, body = chunk.split(b"\r\n\r\n", 1)
+        parts.append(body[:-2])   # the CRLF before the next delimiter
+    return parts
+
+
+@pytest.mark.parametrize("algo", ["AES-256-GCM", "ChaCha20", "Fernet"])
+def test_multi_range_download_of_compressed_file(app, client, auth_headers, algo):
+    data    = CSV + algo.encode()
+    file_id = upload(client, auth_headers, data, algo)
+    with app.app_context():
+        assert db.session.get(File, file_id).compression
+
+    resp = client.get(f"/api/files/download/{file_id}",
+                      headers={**auth_headers, "Range": "bytes=0-0,5-6,2000000-2000010"})
+
+    assert resp.status_code == 206
+    assert int(resp.headers["Content-Length"]) == len(resp.data)
+    assert multipart_parts(resp) == [data[0:1], data[5:7], data[2000000:2000011]]
+
+
+def test_single_range_download_of_compressed_file(client, auth_headers):
+    file_id = upload(client, auth_headers, CSV, "AES-256-GCM")
+
+    resp = client.get(f"/api/files/download/{file_id}",
+                      headers={**auth_headers, "Range": "bytes=2000000-2000010"})
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 2000000-2000010/{len(CSV)}"
+    assert resp.data == CSV[2000000:2000011]
@@ -0,0 +1,294 @@
+"""
+Audit log maintenance: monthly partitions, daily rollups, archive and retention.
+
+    python -m tools.audit_logs                          # one run, default settings
+    python -m tools.audit_logs --dry-run                # report only, change nothing
+    python -m tools.audit_logs --retention-months 6 --archive-dir /srv/sfl/audit-archive
+    python -m tools.audit_logs --detach                 # keep old partitions as plain tables
+    python -m tools.audit_logs --interval 900           # keep today's rollups fresh
+
+Run from backend/. One run:
+  1. PostgreSQL: creates the audit_logs partitions for the next --months-ahead
+     months (anything beyond lands in audit_logs_default)
+  2. rebuilds audit_daily_rollups (events per UTC day, user, action and
+     status) from the newest rolled-up day through today
+  3. for every month older than --retention-months (AUDIT_RETENTION_MONTHS):
+     exports its rows to <archive-dir>/<partition>.jsonl.gz, checks the row
+     count, then drops the partition (or detaches it with --detach). The
+     legacy partition (rows from before migration 0004) goes as one archive
+     once its newest month expires. Without partitioning (SQLite) the
+     month's rows are deleted in batches instead.
+Rollups are never deleted, so summaries outlive the raw rows.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+from sqlalchemy import select, delete, insert, literal
+
+from extensions import db
+from models.file import AuditLog, AuditDailyRollup
+from tools.common import MaintenanceRun, add_run_arguments, run_tool
+
+MB = 1024 * 1024
+
+PARTITION_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+ROLLUP_LOCK     = 0x5F1A0D17   # pg_advisory_xact_lock key: one rollup writer at a time
+
+
+def month_start(year: int, month: int) -> datetime:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"audit_logs_y{start:%Y}m{start:%m}"
+
+
+def _bound(value: str):
+    # '2026-11-01 00:00:00' → datetime; MINVALUE / MAXVALUE → None
+    value = value.strip("'")
+    return None if value in ("MINVALUE", "MAXVALUE") else datetime.fromisoformat(value)
+
+
+class AuditMaintenance(MaintenanceRun):
+    def __init__(self, archive_dir: str, retention_months: int, months_ahead: int,
+                 batch_size: int, detach: bool = False, dry_run: bool = False):
+        self.archive_dir      = archive_dir
+        self.retention_months = retention_months
+        self.months_ahead     = months_ahead
+        self.batch_size       = batch_size
+        self.detach           = detach
+        self.dry_run          = dry_run
+        self.timestamp        = AuditLog.__table__.c.timestamp
+        self.stats = {
+            "partitions_created": [], "days_rolled_up": 0, "rollup_rows": 0,
+            "archives": [], "archived_rows": 0, "archived_bytes": 0,
+            "partitions_removed": [], "rows_deleted": 0, "errors": 0,
+        }
+
+    @property
+    def partitioned(self) -> bool:
+        if db.engine.dialect.name != "postgresql":
+            return False
+        return db.session.execute(db.text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('audit_logs')"
+        )).first() is not None
+
+    def _partitions(self) -> list:
+        """(name, lower, upper) of each range partition; None = unbounded."""
+        rows = db.session.execute(db.text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('audit_logs')"
+        )).all()
+        partitions = []
+        for name, bound in rows:
+            match = PARTITION_BOUND.search(bound or "")
+            if match:   # the DEFAULT partition has no range
+                partitions.append((name, _bound(match.group(1)), _bound(match.group(2))))
+        return sorted(partitions, key=lambda p: p[2] or datetime.max)
+
+    # 1. Partitions ahead of time
+    def create_partitions(self):
+        if not self.partitioned:
+            return
+        now     = datetime.now(timezone.utc)
+        covered = max((upper for _, _, upper in self._partitions() if upper), default=None)
+        for i in range(self.months_ahead + 1):
+            start = month_start(now.year, now.month + i)
+            if covered and start < covered:
+                continue
+            end  = month_start(start.year, start.month + 1)
+            name = partition_name(start)
+            self.stats["partitions_created"].append(name)
+            if self.dry_run:
+                continue
+            try:
+                db.session.execute(db.text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_logs "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"))
+                db.session.commit()
+            except Exception as e:
+                # e.g. audit_logs_default already holds rows for that month
+                db.session.rollback()
+                self._error(f"create {name}: {e}")
+        db.session.rollback()
+
+    # 2. Daily rollups
+    def rollup(self):
+        today = datetime.now(timezone.utc).date()
+        last  = db.session.query(db.func.max(AuditDailyRollup.day)).scalar()
+        if last is None:
+            oldest = db.session.query(db.func.min(AuditLog.timestamp)).scalar()
+            if oldest is None:
+                db.session.rollback()
+                return
+            last = oldest.date()
+        db.session.rollback()
+
+        # The newest rolled-up day may have been partial: rebuild it too
+        day = last
+        while day <= today:
+            self.stats["days_rolled_up"] += 1
+            if not self.dry_run:
+                self.stats["rollup_rows"] += self._rollup_day(day)
+            day += timedelta(days=1)
+
+    def _rollup_day(self, day) -> int:
+        start = datetime(day.year, day.month, day.day)
+        log   = AuditLog.__table__.c
+        if db.engine.dialect.name == "postgresql":
+            db.session.execute(db.text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK})
+        db.session.execute(delete(AuditDailyRollup.__table__).where(AuditDailyRollup.day == day))
+        counts = (select(literal(day, AuditDailyRollup.day.type), log.user_id, log.action, log.status,
+                         db.func.count())
+                  .where(log.timestamp >= start, log.timestamp < start + timedelta(days=1))
+                  .group_by(log.user_id, log.action, log.status))
+        result = db.session.execute(insert(AuditDailyRollup.__table__).from_select(
+            ["day", "user_id", "action", "status", "count"], counts))
+        db.session.commit()
+        return max(result.rowcount or 0, 0)
+
+    # 3. Archive and retention
+    def expired(self) -> list:
+        """(name, lower, upper) of the months past retention, oldest first."""
+        now    = datetime.now(timezone.utc)
+        cutoff = month_start(now.year, now.month - self.retention_months)
+        if self.partitioned:
+            expired = [p for p in self._partitions() if p[2] and p[2] <= cutoff]
+            db.session.rollback()
+            return expired
+
+        oldest = db.session.query(db.func.min(AuditLog.timestamp)).scalar()
+        db.session.rollback()
+        months = []
+        start  = month_start(oldest.year, oldest.month) if oldest else cutoff
+        while start < cutoff:
+            end = month_start(start.year, start.month + 1)
+            months.append((partition_name(start), start, end))
+            start = end
+        return months
+
+    def _in_range(self, lower, upper):
+        clauses = [self.timestamp < upper]
+        if lower is not None:
+            clauses.append(self.timestamp >= lower)
+        return clauses
+
+    def archive(self, name: str, lower, upper) -> tuple:
+        """Stream the range to <name>.jsonl.gz; returns (rows, bytes, sha256)."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path    = os.path.join(self.archive_dir, f"{name}.jsonl.gz")
+        partial = path + ".part"
+        rows    = 0
+        query   = (select(AuditLog.__table__).where(*self._in_range(lower, upper))
+                   .execution_options(yield_per=self.batch_size))
+        with open(partial, "wb") as raw:
+            with gzip.open(raw, "wt", encoding="utf-8") as out:
+                for row in db.session.execute(query).mappings():
+                    record = dict(row)
+                    record["timestamp"] = record["timestamp"].isoformat()
+                    out.write(json.dumps(record, separators=(",", ":")) + "\n")
+                    rows += 1
+            raw.flush()
+            os.fsync(raw.fileno())   # on disk before the rows are dropped
+        db.session.rollback()
+
+        digest = hashlib.sha256()
+        with open(partial, "rb") as f:
+            for block in iter(lambda: f.read(MB), b""):
+                digest.update(block)
+        os.replace(partial, path)
+        return rows, os.path.getsize(path), digest.hexdigest()
+
+    def remove(self, name: str, lower, upper):
+        if self.partitioned:
+            table = db.engine.dialect.identifier_preparer.quote(name)
+            db.session.execute(db.text(f"ALTER TABLE audit_logs DETACH PARTITION {table}"))
+            if not self.detach:
+                db.session.execute(db.text(f"DROP TABLE {table}"))
+            db.session.commit()
+            return
+
+        # No partitions to drop: delete the month in batches
+        log = AuditLog.__table__.c
+        while True:
+            ids = [i for (i,) in db.session.execute(
+                select(log.id).where(*self._in_range(lower, upper)).limit(self.batch_size))]
+            if not ids:
+                break
+            db.session.execute(delete(AuditLog.__table__).where(log.id.in_(ids)))
+            db.session.commit()
+            self.stats["rows_deleted"] += len(ids)
+
+    def retain(self):
+        for name, lower, upper in self.expired():
+            if self.dry_run:
+                self.stats["partitions_removed"].append(name)
+                continue
+            try:
+                rows, size, sha256 = self.archive(name, lower, upper)
+                count = (db.session.query(db.func.count())
+                         .select_from(AuditLog.__table__).filter(*self._in_range(lower, upper)).scalar())
+                db.session.rollback()
+                if count != rows:
+                    self._error(f"{name}: archived {rows} rows but {count} are in the table, kept")
+                    continue
+                self.stats["archives"].append({"partition": name, "rows": rows,
+                                               "bytes": size, "sha256": sha256})
+                self.stats["archived_rows"]  += rows
+                self.stats["archived_bytes"] += size
+                self.remove(name, lower, upper)
+                self.stats["partitions_removed"].append(name)
+            except Exception as e:
+                db.session.rollback()
+                self._error(f"{name}: {e}")
+
+    def steps(self):
+        # Rollups first, so a month is always summarised before its rows are removed
+        return (self.create_partitions, self.rollup, self.retain)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.audit_logs", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-months", type=int,
+                        help="archive and remove raw rows older than this (default AUDIT_RETENTION_MONTHS)")
+    parser.add_argument("--archive-dir", help="where .jsonl.gz archives go (default AUDIT_ARCHIVE_DIR)")
+    parser.add_argument("--months-ahead", type=int, default=3,
+                        help="PostgreSQL: partitions to keep ready beyond this month (default 3)")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="rows per fetch while archiving and per DELETE without partitions")
+    parser.add_argument("--detach", action="store_true",
+                        help="detach archived partitions instead of dropping them")
+    add_run_arguments(parser, "run")
+    args = parser.parse_args(argv)
+
+    def build():
+        retention = args.retention_months
+        if retention is None:
+            retention = current_app.config["AUDIT_RETENTION_MONTHS"]
+        return AuditMaintenance(args.archive_dir or current_app.config["AUDIT_ARCHIVE_DIR"],
+                                max(1, retention), max(0, args.months_ahead),
+                                max(1, args.batch_size), detach=args.detach, dry_run=args.dry_run)
+
+    def summarize(stats):
+        removed = "would be removed" if args.dry_run else ("detached" if args.detach else "removed")
+        return (f"audit logs{' (dry run)' if args.dry_run else ''}: "
+                f"{len(stats['partitions_created'])} partitions created, "
+                f"{stats['days_rolled_up']} days rolled up, "
+                f"{len(stats['partitions_removed'])} months {removed} "
+                f"({stats['archived_rows']} rows, {stats['archived_bytes'] / MB:.1f} MB archived) "
+                f"({stats['elapsed_s']:.1f}s)")
+
+    run_tool(args, build, summarize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Bulk encrypt / decrypt of directory trees in the instant-mode .enc format
+(the file inside instant-encrypt zip bundles, readable by their decrypt.py).
+
+    python -m tools.bulk_crypt encrypt SRC DST [--algo AES-256-GCM] [--workers 8]
+    python -m tools.bulk_crypt decrypt SRC DST [--algo auto]
+    python -m tools.bulk_crypt encrypt SRC DST --password-env BULK_PASSWORD --executor thread
+
+Run from backend/. Files are processed in parallel (a process pool by
+default). Every finished file is appended to DST/.bulk_crypt_manifest.jsonl;
+rerunning the same command skips files already done whose source size and
+mtime are unchanged, so an interrupted run resumes where it stopped.
+Outputs are written to a .part file and renamed, never left half-written.
+
+One encrypt run derives a single PBKDF2 key (one salt for the run) and
+gives every file its own random IV, so small-file trees are not dominated
+by key derivation. Decryption derives once per distinct salt per worker.
+"""
+import os
+import sys
+import json
+import time
+import getpass
+import argparse
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait, FIRST_COMPLETED)
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
+
+from utils.encryption import (
+    CIPHER_ENGINES, INSTANT_HEADER, INSTANT_CHUNK_LEN, SALT_SIZE,
+    derive_password_key, instant_chunk_encryptor, instant_chunk_decryptor
+)
+
+MANIFEST_NAME = ".bulk_crypt_manifest.jsonl"
+DEFAULT_CHUNK = 64 * 1024 * 1024   # same as INSTANT_CHUNK_SIZE
+MB            = 1024 * 1024
+
+# Per-worker state, set by _init_worker (processes) or shared (threads)
+_password = None
+_run_salt = None
+_run_key  = None
+_keys     = {}
+
+
+def _init_worker(password: str, run_salt: bytes, run_key: bytes):
+    global _password, _run_salt, _run_key
+    _password, _run_salt, _run_key = password, run_salt, run_key
+    _keys.clear()
+    if run_salt:
+        _keys[run_salt] = run_key
+
+def _key_for(salt: bytes) -> bytes:
+    key = _keys.get(salt)
+    if key is None:
+        key = _keys[salt] = derive_password_key(_password, salt)
+    return key
+
+
+def _finish(part_path: str, dst_path: str, src_stat):
+    os.replace(part_path, dst_path)
+    os.utime(dst_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+def encrypt_one(src_path: str, dst_path: str, algo: str, chunk_size: int):
+    """Encrypt one file into the instant-mode format. Returns (bytes_in, bytes_out)."""
+    st         = os.stat(src_path)
+    iv         = os.urandom(12)
+    num_chunks = -(-st.st_size // chunk_size)
+    seal       = instant_chunk_encryptor(algo, _run_key, iv)
+    part_path  = dst_path + ".part"
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    try:
+        with open(src_path, "rb") as fin, open(part_path, "wb") as fout:
+            fout.write(INSTANT_HEADER.pack(_run_salt, iv, num_chunks))
+            for counter in range(1, num_chunks + 1):
+                chunk = fin.read(chunk_size)
+                if not chunk:
+                    raise ValueError("file shrank while being read")
+                sealed = seal(counter, chunk)
+                fout.write(INSTANT_CHUNK_LEN.pack(len(sealed)))
+                fout.write(sealed)
+            if fin.read(1):
+                raise ValueError("file grew while being read")
+            bytes_out = fout.tell()
+        _finish(part_path, dst_path, st)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return st.st_size, bytes_out
+
+def _detect_algo(key: bytes, iv: bytes, sealed: bytes) -> str:
+    """Work out the algorithm from the first chunk (the format doesn't record it)."""
+    if sealed.startswith(b"gAAAAA"):
+        return "Fernet"   # Fernet tokens are base64url text starting with version 0x80
+    for algo in ("AES-256-GCM", "ChaCha20"):
+        try:
+            instant_chunk_decryptor(algo, key, iv)(1, sealed)
+            return algo
+        except InvalidTag:
+            continue
+    raise InvalidTag()
+
+def decrypt_one(src_path: str, dst_path: str, algo: str, chunk_size: int = None):
+    """Decrypt one instant-mode file. Returns (bytes_in, bytes_out)."""
+    st        = os.stat(src_path)
+    part_path = dst_path + ".part"
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    try:
+        with open(src_path, "rb") as fin, open(part_path, "wb") as fout:
+            header = fin.read(INSTANT_HEADER.size)
+            if len(header) != INSTANT_HEADER.size:
+                raise ValueError("not an instant-mode .enc file")
+            salt, iv, num_chunks = INSTANT_HEADER.unpack(header)
+            key    = _key_for(salt)
+            opener = None
+            for counter in range(1, num_chunks + 1):
+                raw = fin.read(INSTANT_CHUNK_LEN.size)
+                if len(raw) != INSTANT_CHUNK_LEN.size:
+                    raise ValueError("truncated .enc file")
+                sealed = fin.read(INSTANT_CHUNK_LEN.unpack(raw)[0])
+                if opener is None:
+                    chunk_algo = _detect_algo(key, iv, sealed) if algo == "auto" else algo
+                    opener     = instant_chunk_decryptor(chunk_algo, key, iv)
+                fout.write(opener(counter, sealed))
+            if fin.read(1):
+                raise ValueError("trailing data after the last chunk")
+            bytes_out = fout.tell()
+        _finish(part_path, dst_path, st)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return st.st_size, bytes_out
+
+
+class Manifest:
+    """Append-only JSON lines log of finished (or failed) files, keyed by relative path."""
+
+    def __init__(self, path: str):
+        self.path    = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line from an interrupted run
+                    self.entries[entry["path"]] = entry
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+
+    def is_done(self, rel: str, size: int, mtime_ns: int, dst_path: str) -> bool:
+        entry = self.entries.get(rel)
+        return bool(entry and entry["status"] == "done" and entry["size"] == size
+                    and entry["mtime_ns"] == mtime_ns and os.path.exists(dst_path))
+
+    def record(self, **entry):
+        self.entries[entry["path"]] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def plan(mode: str, src_root: str, dst_root: str):
+    """Yield (rel, src_path, dst_path, stat) for every file to process."""
+    src_root, dst_root = os.path.abspath(src_root), os.path.abspath(dst_root)
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        # Don't descend into the output tree if it lives inside the source
+        dirnames[:] = sorted(d for d in dirnames
+                             if os.path.abspath(os.path.join(dirpath, d)) != dst_root)
+        for name in sorted(filenames):
+            if name == MANIFEST_NAME or name.endswith(".part"):
+                continue
+            if mode == "decrypt" and not name.endswith(".enc"):
+                continue
+            src_path = os.path.join(dirpath, name)
+            rel      = os.path.relpath(src_path, src_root)
+            out_rel  = rel + ".enc" if mode == "encrypt" else rel[:-len(".enc")]
+            yield rel, src_path, os.path.join(dst_root, out_rel), os.stat(src_path)
+
+
+def _progress(stats: dict, total: int, started: float, final: bool = False):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    sys.stderr.write("\r  %d/%d files  %.1f MB  %.1f MB/s  %d failed   " % (
+        stats["done"] + stats["skipped"] + stats["failed"], total,
+        stats["bytes_in"] / MB, stats["bytes_in"] / MB / elapsed, stats["failed"]))
+    if final:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def run(mode: str, src: str, dst: str, password: str, algo: str, workers: int,
+        executor: str, chunk_size: int) -> dict:
+    manifest = Manifest(os.path.join(dst, MANIFEST_NAME))
+    todo, skipped = [], 0
+    for rel, src_path, dst_path, st in plan(mode, src, dst):
+        if manifest.is_done(rel, st.st_size, st.st_mtime_ns, dst_path):
+            skipped += 1
+        else:
+            todo.append((rel, src_path, dst_path, st))
+
+    run_salt = run_key = None
+    if mode == "encrypt" and todo:
+        run_salt = os.urandom(SALT_SIZE)
+        run_key  = derive_password_key(password, run_salt)
+
+    stats   = {"done": 0, "skipped": skipped, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+    total   = len(todo) + skipped
+    work    = encrypt_one if mode == "encrypt" else decrypt_one
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    started = time.monotonic()
+    shown   = 0.0
+
+    with pool_cls(max_workers=workers, initializer=_init_worker,
+                  initargs=(password, run_salt, run_key)) as pool:
+        pending, queue = {}, iter(todo)
+        try:
+            while True:
+                # Keep a bounded number of files in flight so huge trees don't queue millions of futures
+                while len(pending) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    rel, src_path, dst_path, st = item
+                    pending[pool.submit(work, src_path, dst_path, algo, chunk_size)] = item
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rel, src_path, dst_path, st = pending.pop(future)
+                    entry = {"path": rel, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                    try:
+                        bytes_in, bytes_out = future.result()
+                    except (InvalidTag, InvalidToken):
+                        error = "authentication failed (wrong password or corrupted file)"
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    else:
+                        stats["done"]      += 1
+                        stats["bytes_in"]  += bytes_in
+                        stats["bytes_out"] += bytes_out
+                        manifest.record(status="done", output=os.path.relpath(dst_path, dst),
+                                        algo=algo, **entry)
+                        continue
+                    stats["failed"] += 1
+                    manifest.record(status="error", error=error, **entry)
+                    sys.stderr.write(f"\n  {rel}: {error}\n")
+
+                if time.monotonic() - shown >= 1:
+                    shown = time.monotonic()
+                    _progress(stats, total, started)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            sys.stderr.write("\n  interrupted — rerun the same command to resume\n")
+            raise
+        finally:
+            manifest.close()
+
+    _progress(stats, total, started, final=True)
+    elapsed = time.monotonic() - started
+    stats.update({
+        "mode": mode, "algo": algo, "workers": workers, "executor": executor,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_mbps": round(stats["bytes_in"] / MB / max(elapsed, 1e-6), 1),
+        "files_per_s": round(stats["done"] / max(elapsed, 1e-6), 1),
+    })
+    return stats
+
+
+def _read_password(args) -> str:
+    if args.password_env:
+        password = os.environ.get(args.password_env)
+        if not password:
+            sys.exit(f"Environment variable {args.password_env} is not set")
+        return password
+    password = getpass.getpass("Password: ")
+    if args.mode == "encrypt" and getpass.getpass("Confirm password: ") != password:
+        sys.exit("Passwords do not match")
+    return password
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.bulk_crypt", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("encrypt", "decrypt"))
+    parser.add_argument("src", help="source directory")
+    parser.add_argument("dst", help="output directory (holds the resume manifest)")
+    parser.add_argument("--algo", default=None,
+                        help="encrypt: AES-256-GCM (default), ChaCha20, Fernet; "
+                             "decrypt: auto (default, detected per file) or an algorithm")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--executor", choices=("process", "thread"), default="process")
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK // MB,
+                        help="plaintext per chunk when encrypting (default 64)")
+    parser.add_argument("--password-env", help="read the password from this environment variable")
+    parser.add_argument("--report", help="write the run summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    algo = args.algo or ("AES-256-GCM" if args.mode == "encrypt" else "auto")
+    if algo not in CIPHER_ENGINES and not (algo == "auto" and args.mode == "decrypt"):
+        parser.error(f"unsupported algorithm: {algo}")
+    if not os.path.isdir(args.src):
+        parser.error(f"not a directory: {args.src}")
+
+    password = _read_password(args)
+    try:
+        stats = run(args.mode, args.src, args.dst, password, algo, max(1, args.workers),
+                    args.executor, args.chunk_size_mb * MB)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    print(f"{args.mode}: {stats['done']} done, {stats['skipped']} skipped, {stats['failed']} failed; "
+          f"{stats['bytes_in'] / MB:.1f} MB in {stats['elapsed_s']:.1f}s "
+          f"({stats['throughput_mbps']} MB/s, {stats['files_per_s']} files/s)")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(stats, f, indent=2)
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Shared plumbing for the periodic maintenance tools (tools.gc, tools.audit_logs):
+the run loop behind --interval / --report / --dry-run and the stats both keep.
+"""
+import sys
+import json
+import time
+
+from app import create_app
+
+
+class MaintenanceRun:
+    """
+    One run of a maintenance tool. Subclasses set self.stats (including an
+    "errors" count) and self.dry_run, and return their steps in order from
+    steps(); a failing item is counted and reported on stderr, not raised.
+    """
+
+    def steps(self):
+        return ()
+
+    def _error(self, message: str):
+        self.stats["errors"] += 1
+        sys.stderr.write(f"  {message}\n")
+
+    def run(self) -> dict:
+        started = time.monotonic()
+        for step in self.steps():
+            step()
+        self.stats["elapsed_s"] = round(time.monotonic() - started, 3)
+        self.stats["dry_run"]   = self.dry_run
+        return self.stats
+
+
+def add_run_arguments(parser, noun: str):
+    """--dry-run, --interval and --report, as run_tool reads them."""
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--interval", type=int, default=0,
+                        help=f"seconds between {noun}s; 0 = one {noun}, then exit")
+    parser.add_argument("--report", help=f"write the last {noun}'s summary as JSON to this path")
+
+
+def run_tool(args, build, summarize):
+    """
+    Run build() (a MaintenanceRun, built in an app context) once, or every
+    args.interval seconds until interrupted, printing summarize(stats) after
+    each run. Exits 1 if the last run counted errors.
+    """
+    app = create_app()
+    while True:
+        with app.app_context():
+            stats = build().run()
+
+        print(summarize(stats))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(stats, f, indent=2)
+        if not args.interval:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+    sys.exit(1 if stats["errors"] else 0)
@@ -0,0 +1,247 @@
+"""
+Storage garbage collection: reclaims what soft deletes and failed uploads leave behind.
+
+    python -m tools.gc                              # one sweep, default settings
+    python -m tools.gc --dry-run                    # report only, change nothing
+    python -m tools.gc --retention-days 30 --max-deletes-per-s 50 --report gc.json
+    python -m tools.gc --interval 3600              # keep sweeping every hour
+
+Run from backend/. One sweep:
+  1. purges files soft-deleted more than --retention-days ago, in batches
+     (File.purge; a blob is deleted once no row references it)
+  2. clears expired share tokens
+  3. purges expired resumable upload sessions and their chunks
+  4. reconciles storage with the database: objects under the app's key namespaces
+     (utils.storage.KEY_NAMESPACES) that no row references and
+     older than --orphan-grace-hours (e.g. a blob written by an upload whose
+     commit failed) are deleted; blobs with no rows are dropped; rows whose
+     object is missing are reported
+Deletes are rate-limited (--max-deletes-per-s) and batches are separated by
+--batch-pause-ms, so a sweep can run next to live traffic.
+"""
+import time
+import argparse
+from datetime import datetime, timezone, timedelta
+
+from extensions import db
+from models.file import File, Blob, UploadChunk
+from routes.uploads import purge_expired_upload_sessions
+from utils.storage import get_storage
+from tools.common import MaintenanceRun, add_run_arguments, run_tool
+
+MB = 1024 * 1024
+
+
+class Throttle:
+    """Spaces out calls to at most `per_second` (0 = unlimited)."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._next    = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self.interval
+
+
+class Sweeper(MaintenanceRun):
+    def __init__(self, storage, retention_days: int, orphan_grace_hours: float,
+                 batch_size: int, batch_pause: float, max_deletes_per_s: float,
+                 dry_run: bool = False):
+        self.storage      = storage
+        self.retention    = timedelta(days=retention_days)
+        self.orphan_grace = timedelta(hours=orphan_grace_hours)
+        self.batch_size   = batch_size
+        self.batch_pause  = batch_pause
+        self.throttle     = Throttle(max_deletes_per_s)
+        self.dry_run      = dry_run
+        self.stats = {
+            "files_purged": 0, "blobs_deleted": 0, "reclaimed_bytes": 0,
+            "shares_cleared": 0, "upload_sessions_purged": 0,
+            "orphan_objects_deleted": 0, "orphan_bytes": 0, "unreferenced_blobs": 0,
+            "missing_objects": [], "errors": 0,
+        }
+
+    def _pause(self):
+        if self.batch_pause:
+            time.sleep(self.batch_pause)
+
+    def _delete_object(self, key: str, size: int = None) -> int:
+        """Delete one stored object; returns the bytes reclaimed."""
+        if size is None:
+            try:
+                size = self.storage.size(key)
+            except (FileNotFoundError, OSError):
+                size = 0
+        if not self.dry_run:
+            self.throttle.wait()
+            self.storage.delete(key)
+        return size
+
+    # 1. Soft-deleted files past retention
+    def purge_deleted_files(self):
+        cutoff  = datetime.now(timezone.utc) - self.retention
+        last_id = 0
+        while True:
+            batch = (File.query
+                     .filter(File.is_deleted == db.true(), File.deleted_at < cutoff, File.id > last_id)
+                     .order_by(File.id).limit(self.batch_size).all())
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            if self.dry_run:
+                # Approximate: two deleted rows sharing a blob are each counted as one reference
+                for file in batch:
+                    self.stats["files_purged"] += 1
+                    if not file.blob_id or file.blob.ref_count <= 1:
+                        self.stats["blobs_deleted"] += 1
+                        self.stats["reclaimed_bytes"] += self._delete_object(
+                            file.storage_key, file.blob.size if file.blob_id else None)
+                db.session.rollback()
+                continue
+
+            orphaned = []
+            for file in batch:
+                blob_size = file.blob.size if file.blob_id else None
+                key = file.purge()
+                if key:
+                    orphaned.append((key, blob_size))
+            # Rows go first: a crash after the commit leaves orphan objects, which step 4 collects
+            db.session.commit()
+            self.stats["files_purged"] += len(batch)
+
+            for key, size in orphaned:
+                try:
+                    self.stats["reclaimed_bytes"] += self._delete_object(key, size)
+                    self.stats["blobs_deleted"] += 1
+                except Exception as e:
+                    self._error(f"delete {key}: {e}")
+            self._pause()
+
+    # 2. Expired share links
+    def clear_expired_shares(self):
+        now   = datetime.now(timezone.utc)
+        query = File.query.filter(File.share_token.isnot(None), File.share_expires < now)
+        if self.dry_run:
+            self.stats["shares_cleared"] = query.count()
+            db.session.rollback()
+            return
+        while True:
+            ids = [i for (i,) in query.with_entities(File.id).order_by(File.id)
+                   .limit(self.batch_size).all()]
+            if not ids:
+                break
+            self.stats["shares_cleared"] += len(ids)
+            File.query.filter(File.id.in_(ids)).update(
+                {File.share_token: None, File.share_expires: None, File.is_shared: False,
+                 File.updated_at: File.updated_at},
+                synchronize_session=False)
+            db.session.commit()
+            self._pause()
+
+    # 3. Abandoned or downloaded upload sessions
+    def purge_upload_sessions(self):
+        if self.dry_run:
+            return
+        while True:
+            purged = purge_expired_upload_sessions(self.storage, limit=self.batch_size)
+            self.stats["upload_sessions_purged"] += purged
+            if purged < self.batch_size:
+                break
+            self._pause()
+
+    # 4. Storage <-> database
+    def _referenced_names(self) -> set:
+        name = self.storage.object_name
+        refs = {name(k) for (k,) in db.session.query(Blob.storage_key)}
+        refs.update(name(k) for (k,) in db.session.query(File.s3_key).filter(File.blob_id.is_(None)))
+        refs.update(name(k) for (k,) in db.session.query(UploadChunk.storage_key))
+        db.session.rollback()
+        return refs
+
+    def reconcile(self):
+        # Blobs no row points at any more (e.g. rows removed outside File.purge)
+        live_blobs = db.session.query(File.blob_id).filter(File.blob_id.isnot(None)).distinct()
+        for blob in Blob.query.filter(Blob.id.notin_(live_blobs)).limit(self.batch_size * 10):
+            self.stats["unreferenced_blobs"] += 1
+            if not self.dry_run:
+                db.session.delete(blob)   # its object becomes an orphan below
+        if self.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+        # Objects with no row: anything newer than the grace period may be an upload in flight
+        listed_at  = datetime.now(timezone.utc)
+        referenced = self._referenced_names()
+        cutoff     = time.time() - self.orphan_grace.total_seconds()
+        seen       = set()
+        for name, size, modified in self.storage.iter_objects():
+            seen.add(name)
+            if name in referenced or modified > cutoff:
+                continue
+            try:
+                self.stats["orphan_bytes"] += self._delete_object(name, size)
+                self.stats["orphan_objects_deleted"] += 1
+            except Exception as e:
+                self._error(f"delete {name}: {e}")
+
+        # Rows whose object is gone can't be repaired here; report them
+        name = self.storage.object_name
+        rows = (db.session.query(File.id, File.s3_key, Blob.storage_key)
+                .outerjoin(Blob, File.blob_id == Blob.id)
+                .filter(File.is_deleted.is_(False), File.created_at < listed_at)
+                .yield_per(1000))
+        for file_id, s3_key, blob_key in rows:
+            if name(blob_key or s3_key) not in seen:
+                self.stats["missing_objects"].append(file_id)
+        db.session.rollback()
+        self.stats["reclaimed_bytes"] += self.stats["orphan_bytes"]
+
+    def steps(self):
+        return (self.purge_deleted_files, self.clear_expired_shares,
+                self.purge_upload_sessions, self.reconcile)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.gc", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, default=30,
+                        help="purge files soft-deleted more than this many days ago (default 30)")
+    parser.add_argument("--orphan-grace-hours", type=float, default=24,
+                        help="only delete unreferenced objects older than this (default 24)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--batch-pause-ms", type=int, default=100,
+                        help="sleep between DB batches (default 100)")
+    parser.add_argument("--max-deletes-per-s", type=float, default=100,
+                        help="storage deletes per second, 0 = unlimited (default 100)")
+    add_run_arguments(parser, "sweep")
+    args = parser.parse_args(argv)
+
+    def build():
+        return Sweeper(get_storage(), args.retention_days, args.orphan_grace_hours,
+                       max(1, args.batch_size), args.batch_pause_ms / 1000.0,
+                       args.max_deletes_per_s, dry_run=args.dry_run)
+
+    def summarize(stats):
+        summary = (f"gc{' (dry run)' if args.dry_run else ''}: {stats['files_purged']} files purged, "
+                   f"{stats['blobs_deleted']} blobs and {stats['orphan_objects_deleted']} orphan "
+                   f"objects deleted, {stats['reclaimed_bytes'] / MB:.1f} MB reclaimed, "
+                   f"{stats['shares_cleared']} shares cleared, "
+                   f"{stats['upload_sessions_purged']} upload sessions purged, "
+                   f"{len(stats['missing_objects'])} rows missing their object "
+                   f"({stats['elapsed_s']:.1f}s)")
+        if stats["missing_objects"]:
+            summary += f"\n  missing objects for file ids: {stats['missing_objects'][:50]}"
+        return summary
+
+    run_tool(args, build, summarize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Background re-encryption of stored cloud files to another algorithm.
+
+    python -m tools.reencrypt create --target AES-256-GCM --source-algo Fernet [--run]
+    python -m tools.reencrypt run JOB_ID [--workers 4] [--max-mbps 200]
+    python -m tools.reencrypt pause JOB_ID            # from another shell; the run stops cleanly
+    python -m tools.reencrypt status [JOB_ID]         # e.g. remaining Fernet bytes
+
+Filters (create): --source-algo, --user-id, --min-size, --max-size (bytes).
+Job state lives in the reencryption_jobs table: totals are counted when
+the job is created and counters advance as objects finish, so status
+never scans the files table.
+
+Each stored object (a blob with every row sharing it) is decrypted
+segment by segment, encrypted into a new container under a fresh data
+key, then decrypted again and checked against the file's SHA-256. Only
+then are the rows swapped to the new blob — in one transaction, under
+the blob row lock, and only if their encryption_iv is unchanged since
+they were read. The old object is deleted after the commit. Workers are
+bounded by --workers and plaintext throughput by --max-mbps (all
+workers combined). Ctrl-C or `pause` stops after the objects in flight;
+`run` resumes from the job's cursor. Failed files are skipped and
+counted; `run --retry-failed` revisits them.
+"""
+import os
+import io
+import sys
+import time
+import hashlib
+import secrets
+import argparse
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sqlalchemy import func
+
+from app import create_app
+from extensions import db
+from models.file import File, Blob, ReencryptionJob
+from routes.files import stream_stored_file
+from utils.storage import get_storage
+from utils.encryption import (
+    CIPHER_ENGINES, CONTAINER_VERSION, KDF_ENVELOPE, SALT_SIZE, ContainerHeader,
+    BackgroundHasher, encrypt_stream, decrypt_stream, pack_segment_index,
+    generate_data_key, wrap_data_key, pack_encryption_iv
+)
+from utils.compression import CODEC_IDS, CODEC_NONE
+
+MB = 1024 * 1024
+
+# Columns the workers need; copied out so no ORM object crosses threads
+SNAPSHOT_FIELDS = ("id", "user_id", "blob_id", "s3_key", "file_size", "sha256_hash",
+                   "encryption_algo", "encryption_iv", "wrapped_key", "kek_version",
+                   "container_version", "compression")
+
+
+class RateLimiter:
+    """Token bucket shared by all workers; take(n) blocks until n bytes are allowed."""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate   = bytes_per_second
+        self._lock  = threading.Lock()
+        self._next  = time.monotonic()
+
+    def take(self, n: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now        = time.monotonic()
+            start      = max(self._next, now)
+            self._next = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class ChunkReader(io.RawIOBase):
+    """File-like view of an iterator of byte chunks (the input of encrypt_stream)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n], self._buffer = self._buffer[:n], self._buffer[n:]
+        return n
+
+
+def _throttled(chunks, limiter: RateLimiter):
+    for chunk in chunks:
+        limiter.take(len(chunk))
+        yield chunk
+
+
+def job_filter(job: ReencryptionJob):
+    """
+    Files still to visit for this job (rows already on the target algo drop
+    out). Soft-deleted files are skipped: tools.gc purges them anyway.
+    """
+    query = File.query.filter(File.encryption_algo != job.target_algo,
+                              File.is_deleted.is_(False))
+    if job.source_algo:
+        query = query.filter(File.encryption_algo == job.source_algo)
+    if job.filter_user_id:
+        query = query.filter(File.user_id == job.filter_user_id)
+    if job.min_size is not None:
+        query = query.filter(File.file_size >= job.min_size)
+    if job.max_size is not None:
+        query = query.filter(File.file_size <= job.max_size)
+    return query
+
+
+def create_job(target_algo: str, source_algo: str = None, user_id: int = None,
+               min_size: int = None, max_size: int = None) -> ReencryptionJob:
+    job = ReencryptionJob(target_algo=target_algo, source_algo=source_algo,
+                          filter_user_id=user_id, min_size=min_size, max_size=max_size)
+    files, size = job_filter(job).with_entities(
+        func.count(File.id), func.coalesce(func.sum(File.file_size), 0)).one()
+    job.total_files, job.total_bytes = files, int(size)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def reencrypt_object(row, target_algo: str, storage, limiter: RateLimiter):
+    """
+    Worker: write the object of `row` re-encrypted under a new data key and
+    verify it. Returns the new blob's metadata; the DB is not touched here.
+    """
+    new_key     = f"users/{row.user_id}/files/{secrets.token_urlsafe(32)}.enc"
+    data_key    = generate_data_key()
+    wrapped_key, kek_version = wrap_data_key(data_key, row.user_id)
+    salt        = secrets.token_bytes(SALT_SIZE)
+    header      = ContainerHeader(target_algo, salt,
+                                  codec=CODEC_IDS.get(row.compression, CODEC_NONE))
+
+    plaintext       = _throttled(stream_stored_file(row, storage), limiter)
+    segment_lengths = []
+    with BackgroundHasher() as hasher:
+        size = storage.put_stream(
+            new_key, encrypt_stream(ChunkReader(plaintext), data_key, header, hasher=hasher,
+                                    segment_lengths=segment_lengths))
+        source_hash = hasher.hexdigest()
+
+    try:
+        if not secrets.compare_digest(source_hash, row.sha256_hash):
+            raise ValueError("source blob does not match the stored SHA-256")
+
+        # Read the new blob back before anything points at it
+        digest = hashlib.sha256()
+        with storage.open(new_key) as f:
+            for chunk in _throttled(decrypt_stream(f, data_key), limiter):
+                digest.update(chunk)
+        if not secrets.compare_digest(digest.hexdigest(), row.sha256_hash):
+            raise ValueError("verification of the re-encrypted blob failed")
+    except Exception:
+        storage.delete(new_key)
+        raise
+
+    return {
+        "storage_key": new_key,
+        "size": size,
+        "encryption_algo": target_algo,
+        "encryption_iv": pack_encryption_iv(header.nonce, salt, KDF_ENVELOPE),
+        "wrapped_key": wrapped_key,
+        "kek_version": kek_version,
+        "segment_index": pack_segment_index(segment_lengths) if header.codec else None,
+    }
+
+
+def swap_object(row, result: dict):
+    """
+    Point every row of the object at the new blob, atomically. Returns
+    (files, bytes) updated and the storage key to delete; (0, 0, new key)
+    if the object changed while it was being re-encrypted.
+    """
+    fields = {File.encryption_algo: result["encryption_algo"],
+              File.encryption_iv: result["encryption_iv"],
+              File.wrapped_key: result["wrapped_key"],
+              File.kek_version: result["kek_version"],
+              File.container_version: CONTAINER_VERSION,
+              File.segment_index: result["segment_index"],
+              File.updated_at: File.updated_at}   # same content: keep Last-Modified
+
+    if row.blob_id:
+        # The lock orders us against uploads deduplicating onto this blob
+        blob = Blob.query.filter_by(id=row.blob_id).with_for_update().first()
+        rows = File.query.filter(File.blob_id == row.blob_id,
+                                 File.encryption_iv == row.encryption_iv)
+    else:
+        blob = None
+        rows = File.query.filter(File.id == row.id, File.blob_id.is_(None),
+                                 File.encryption_iv == row.encryption_iv)
+
+    files, size = rows.with_entities(func.count(File.id),
+                                     func.coalesce(func.sum(File.file_size), 0)).one()
+    if not files or (row.blob_id and blob is None):
+        db.session.rollback()
+        return 0, 0, result["storage_key"]
+
+    if blob is not None:
+        old_key = blob.storage_key
+        blob.storage_key, blob.size = result["storage_key"], result["size"]
+    else:
+        # Legacy row without a blob: the new object becomes its blob
+        old_key = row.s3_key
+        blob = Blob(user_id=row.user_id, storage_key=result["storage_key"],
+                    sha256_hash=row.sha256_hash, size=result["size"], ref_count=1)
+        db.session.add(blob)
+        db.session.flush()
+        fields[File.blob_id] = blob.id
+
+    rows.update(fields, synchronize_session=False)
+    db.session.commit()
+    return files, int(size), old_key
+
+
+def _snapshot(file: File):
+    snap = SimpleNamespace(**{name: getattr(file, name) for name in SNAPSHOT_FIELDS})
+    snap.storage_key = file.storage_key
+    return snap
+
+
+def _progress(job: ReencryptionJob, started: float, moved: int, final: bool = False):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    sys.stderr.write("\r  job %d: %d/%d files  %.1f/%.1f MB  %.1f MB/s  %d failed   " % (
+        job.id, job.done_files, job.total_files, job.done_bytes / MB, job.total_bytes / MB,
+        moved / MB / elapsed, job.failed_files))
+    if final:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def run_job(job: ReencryptionJob, workers: int, max_mbps: float, batch_size: int,
+            retry_failed: bool = False) -> ReencryptionJob:
+    if job.status == "completed" and not retry_failed:
+        return job
+    if retry_failed:
+        job.cursor, job.failed_files, job.failed_bytes = 0, 0, 0
+    job.status     = "running"
+    job.started_at = job.started_at or datetime.now(timezone.utc)
+    db.session.commit()
+
+    limiter = RateLimiter(max_mbps * MB)
+    storage = get_storage()   # workers have no app context
+    started = time.monotonic()
+    moved   = 0
+    paused  = False
+
+    def still_running() -> bool:
+        return db.session.query(ReencryptionJob.status).filter_by(id=job.id).scalar() == "running"
+
+    def finish(future, row):
+        nonlocal moved
+        try:
+            result = future.result()
+        except Exception as e:
+            job.failed_files += 1
+            job.failed_bytes += row.file_size
+            job.last_error    = f"file:{row.id}: {type(e).__name__}: {e}"
+            sys.stderr.write(f"\n  {job.last_error}\n")
+            db.session.commit()
+            return
+
+        files, size, stale_key = swap_object(row, result)
+        job.done_files += files
+        job.done_bytes += size
+        moved          += row.file_size
+        db.session.commit()
+        storage.delete(stale_key)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while not paused:
+                batch = (job_filter(job).filter(File.id > job.cursor)
+                         .order_by(File.id).limit(batch_size).all())
+                if not batch:
+                    break
+
+                # One task per stored object; rows sharing a blob move together
+                objects, seen = [], set()
+                for file in batch:
+                    key = ("blob", file.blob_id) if file.blob_id else ("file", file.id)
+                    if key not in seen:
+                        seen.add(key)
+                        objects.append(_snapshot(file))
+                db.session.commit()   # end the read transaction before long work
+
+                queue = iter(objects)
+                while True:
+                    while not paused and len(pending) < workers:
+                        row = next(queue, None)
+                        if row is None:
+                            break
+                        pending[pool.submit(reencrypt_object, row, job.target_algo, storage, limiter)] = row
+                    if not pending:
+                        break
+
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future, pending.pop(future))
+
+                    paused = paused or not still_running()
+                    _progress(job, started, moved)
+
+                if not paused:
+                    job.cursor = batch[-1].id
+                    db.session.commit()
+        except KeyboardInterrupt:
+            # Objects in flight still finish and are swapped in, so no new blob is orphaned
+            paused = True
+            sys.stderr.write("\n  interrupted — pausing after the objects in flight\n")
+            db.session.rollback()
+            for future, row in list(pending.items()):
+                finish(future, row)
+
+    db.session.rollback()
+    db.session.refresh(job)
+    if paused:
+        job.status = "paused"
+    elif job.status == "running":
+        job.status      = "completed"
+        job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+    _progress(job, started, moved, final=True)
+    return job
+
+
+def _print_job(job: ReencryptionJob):
+    print(f"job {job.id} [{job.status}] → {job.target_algo}  "
+          f"filter: algo={job.source_algo or 'any'} user={job.filter_user_id or 'any'} "
+          f"size={job.min_size or 0}..{job.max_size or '∞'}")
+    print(f"  done      {job.done_files}/{job.total_files} files, "
+          f"{job.done_bytes / MB:.1f}/{job.total_bytes / MB:.1f} MB")
+    print(f"  remaining {job.remaining_files} files, {job.remaining_bytes / MB:.1f} MB"
+          f"   failed {job.failed_files} files, {job.failed_bytes / MB:.1f} MB")
+    if job.last_error:
+        print(f"  last error: {job.last_error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.reencrypt", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def run_options(p):
+        p.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                       help="objects re-encrypted concurrently (default min(4, cores))")
+        p.add_argument("--max-mbps", type=float, default=0,
+                       help="plaintext MB/s across all workers, 0 = unlimited")
+        p.add_argument("--batch-size", type=int, default=200, help="files fetched per batch")
+
+    create = sub.add_parser("create", help="create a job from a filter")
+    create.add_argument("--target", required=True, choices=list(CIPHER_ENGINES))
+    create.add_argument("--source-algo", choices=list(CIPHER_ENGINES))
+    create.add_argument("--user-id", type=int)
+    create.add_argument("--min-size", type=int)
+    create.add_argument("--max-size", type=int)
+    create.add_argument("--run", action="store_true", help="start the job right away")
+    run_options(create)
+
+    run = sub.add_parser("run", help="start or resume a job")
+    run.add_argument("job_id", type=int)
+    run.add_argument("--retry-failed", action="store_true")
+    run_options(run)
+
+    pause = sub.add_parser("pause", help="ask a running job to stop after its objects in flight")
+    pause.add_argument("job_id", type=int)
+
+    status = sub.add_parser("status", help="show one job, or all jobs")
+    status.add_argument("job_id", type=int, nargs="?")
+
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        if args.command == "create":
+            job = create_job(args.target, args.source_algo, args.user_id,
+                             args.min_size, args.max_size)
+            _print_job(job)
+            if not args.run:
+                return
+        elif args.command == "status":
+            jobs = ([db.session.get(ReencryptionJob, args.job_id)] if args.job_id
+                    else ReencryptionJob.query.order_by(ReencryptionJob.id).all())
+            for job in jobs:
+                if job is None:
+                    sys.exit("No such job")
+                _print_job(job)
+            return
+        else:
+            job = db.session.get(ReencryptionJob, args.job_id)
+            if job is None:
+                sys.exit("No such job")
+            if args.command == "pause":
+                if job.status == "running":
+                    job.status = "paused"
+                    db.session.commit()
+                _print_job(job)
+                return
+
+        job = run_job(job, max(1, args.workers), args.max_mbps, max(1, args.batch_size),
+                      retry_failed=getattr(args, "retry_failed", False))
+        _print_job(job)
+        sys.exit(1 if job.failed_files else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Master key rotation for cloud files and open resumable uploads (envelope encryption).
+
+    python -m tools.rotate_keys                   # rewrap every row not on MASTER_KEY_VERSION
+    python -m tools.rotate_keys --status          # rows per key version, nothing written
+    python -m tools.rotate_keys --workers 8 --batch-size 500 --report run.json
+
+Run from backend/ with the new secret as MASTER_ENCRYPTION_KEY, its number
+as MASTER_KEY_VERSION, and each retired secret as MASTER_ENCRYPTION_KEY_V<n>.
+Only the wrapped data key in each File row changes — blobs in uploads/
+are never read or rewritten. Rows still on a derived key (pbkdf2/hkdf)
+get that key wrapped, after which they no longer depend on version 1.
+Open upload sessions (UploadSession.wrapped_key, cleared on completion)
+are rewrapped the same way, after the files.
+
+Rows are walked by id in batches; each batch is rewrapped on a thread
+pool and committed, and a row is only updated if its wrapped key is
+unchanged since it was read. Rerunning the command resumes: rows already
+on the active version are not selected again.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import or_, func
+
+from app import create_app
+from extensions import db
+from models.file import File, UploadSession
+from utils.encryption import (
+    active_kek_version, derive_file_key, rewrap_data_key, wrap_data_key, unpack_encryption_iv
+)
+
+DEFAULT_BATCH = 500
+
+
+def rewrap_row(row, target: int):
+    """New (wrapped_key, kek_version) for one File row, under KEK version `target`."""
+    if row.wrapped_key:
+        return rewrap_data_key(row.wrapped_key, row.kek_version, row.user_id, target)
+    _, salt, kdf = unpack_encryption_iv(row.encryption_iv)
+    data_key, _ = derive_file_key(row.user_id, salt=salt, kdf=kdf)
+    return wrap_data_key(data_key, row.user_id, target)
+
+
+def _pending(target: int):
+    return or_(File.kek_version.is_(None), File.kek_version != target)
+
+
+def _pending_session(target: int):
+    return (UploadSession.wrapped_key.isnot(None)) & (UploadSession.kek_version != target)
+
+
+def key_version_counts() -> dict:
+    """Rows per KEK version; rows on a derived key are counted as "derived"."""
+    rows = db.session.query(File.kek_version, func.count(File.id)).group_by(File.kek_version).all()
+    return {("derived" if version is None else str(version)): count for version, count in rows}
+
+
+def session_version_counts() -> dict:
+    """Upload sessions still holding a wrapped key, per KEK version."""
+    rows = (db.session.query(UploadSession.kek_version, func.count(UploadSession.id))
+            .filter(UploadSession.wrapped_key.isnot(None))
+            .group_by(UploadSession.kek_version).all())
+    return {str(version): count for version, count in rows}
+
+
+def _progress(stats: dict, total: int, started: float, final: bool = False):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    sys.stderr.write("\r  %d/%d rows  %.0f rows/s  %d conflicts  %d failed   " % (
+        stats["rewrapped"] + stats["conflicts"] + stats["failed"], total,
+        stats["rewrapped"] / elapsed, stats["conflicts"], stats["failed"]))
+    if final:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def run(workers: int, batch_size: int) -> dict:
+    target  = active_kek_version()
+    total   = File.query.filter(_pending(target)).count()
+    stats   = {"rewrapped": 0, "conflicts": 0, "failed": 0}
+    started = time.monotonic()
+    last_id = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = (db.session.query(File.id, File.user_id, File.encryption_iv,
+                                     File.wrapped_key, File.kek_version)
+                    .filter(_pending(target), File.id > last_id)
+                    .order_by(File.id)
+                    .limit(batch_size)
+                    .all())
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            def attempt(row):
+                try:
+                    return row, rewrap_row(row, target), None
+                except Exception as e:
+                    return row, None, f"{type(e).__name__}: {e}"
+
+            for row, result, error in pool.map(attempt, rows):
+                if error:
+                    stats["failed"] += 1
+                    sys.stderr.write(f"\n  file:{row.id}: {error}\n")
+                    continue
+                wrapped_key, version = result
+                # Compare-and-set: skip rows rewritten since they were read (a new
+                # upload sharing the blob, a concurrent run); the next run retries them
+                same_key = (File.wrapped_key.is_(None) if row.wrapped_key is None
+                            else File.wrapped_key == row.wrapped_key)
+                updated = File.query.filter(File.id == row.id, same_key).update(
+                    {File.wrapped_key: wrapped_key, File.kek_version: version,
+                     File.updated_at: File.updated_at},   # not a content change
+                    synchronize_session=False)
+                stats["rewrapped" if updated else "conflicts"] += 1
+
+            db.session.commit()
+            _progress(stats, total, started)
+
+    _progress(stats, total, started, final=True)
+    stats["sessions_rewrapped"] = rewrap_upload_sessions(target, batch_size, stats)
+    elapsed = time.monotonic() - started
+    stats.update({
+        "kek_version": target, "selected": total, "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(stats["rewrapped"] / max(elapsed, 1e-6), 1),
+        "versions": key_version_counts(),
+        "session_versions": session_version_counts(),
+    })
+    return stats
+
+
+def rewrap_upload_sessions(target: int, batch_size: int, stats: dict) -> int:
+    """
+    Rewrap the keys of open upload sessions; returns how many were moved.
+    There are few of them (UPLOAD_SESSION_MAX_OPEN per user) and none hold
+    a derived key, so they are done inline rather than on the pool.
+    """
+    rewrapped, last_id = 0, ""
+    while True:
+        rows = (db.session.query(UploadSession.id, UploadSession.user_id,
+                                 UploadSession.wrapped_key, UploadSession.kek_version)
+                .filter(_pending_session(target), UploadSession.id > last_id)
+                .order_by(UploadSession.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        for row in rows:
+            try:
+                wrapped_key, version = rewrap_data_key(row.wrapped_key, row.kek_version,
+                                                       row.user_id, target)
+            except Exception as e:
+                stats["failed"] += 1
+                sys.stderr.write(f"  upload-session:{row.id}: {type(e).__name__}: {e}\n")
+                continue
+            # Compare-and-set, as for files: a session completing meanwhile has dropped its key
+            updated = UploadSession.query.filter(
+                UploadSession.id == row.id, UploadSession.wrapped_key == row.wrapped_key
+            ).update({UploadSession.wrapped_key: wrapped_key, UploadSession.kek_version: version},
+                     synchronize_session=False)
+            if updated:
+                rewrapped += 1
+            else:
+                stats["conflicts"] += 1
+        db.session.commit()
+    return rewrapped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.rotate_keys", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="rewrap threads (legacy pbkdf2 rows dominate the CPU cost)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH,
+                        help="rows per batch / commit (default 500)")
+    parser.add_argument("--status", action="store_true",
+                        help="print rows per key version and exit")
+    parser.add_argument("--report", help="write the run summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            print(f"active version: {active_kek_version()}")
+            for version, count in sorted(key_version_counts().items()):
+                print(f"  {version:>8}: {count} rows")
+            for version, count in sorted(session_version_counts().items()):
+                print(f"  {version:>8}: {count} open upload sessions")
+            return
+
+        try:
+            stats = run(max(1, args.workers), max(1, args.batch_size))
+        except KeyboardInterrupt:
+            db.session.rollback()
+            sys.stderr.write("\n  interrupted — rerun the same command to resume\n")
+            sys.exit(130)
+
+    print(f"rotate: {stats['rewrapped']} rewrapped to version {stats['kek_version']} "
+          f"(+{stats['sessions_rewrapped']} upload sessions), "
+          f"{stats['conflicts']} conflicts, {stats['failed']} failed "
+          f"in {stats['elapsed_s']:.1f}s ({stats['rows_per_s']} rows/s)")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(stats, f, indent=2)
+    sys.exit(1 if stats["failed"] or stats["conflicts"] else 0)
+
+
+if __name__ == "__main__":
+    main()
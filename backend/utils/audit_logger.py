@@ -1,25 +1,220 @@
+import os
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime, timezone
-from flask import request
+from flask import request, current_app, has_request_context
+
+# Audit events are queued by the request and written by a background thread
+# in multi-row INSERTs, so a request never waits on audit I/O and a failed
+# audit write can't roll back the caller's session. Events are lost only
+# on overflow (counted in stats()) or if the process dies before a flush.
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block", "sync")
+
+
+class AuditWriter:
+    """
+    Bounded queue + writer thread for audit_logs rows. A batch is written
+    when it reaches `batch_size`, when `flush_interval` passes, and at
+    interpreter exit. When the queue is full, `overflow` decides:
+    drop_newest (discard the event), drop_oldest (make room), block (wait
+    up to `block_timeout`, then drop) or sync (write the event inline).
+    """
+
+    def __init__(self, engine, queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, overflow: str = "drop_newest",
+                 block_timeout: float = 0.05):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIT_OVERFLOW must be one of: {', '.join(OVERFLOW_POLICIES)}")
+        self.engine         = engine
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.overflow       = overflow
+        self.block_timeout  = block_timeout
+        self._queue         = queue.Queue(maxsize=queue_size)
+        self._lock          = threading.Lock()
+        self._thread        = None
+        self._pid           = None
+        self._stopping      = threading.Event()
+        self._counters      = {"queued": 0, "written": 0, "dropped": 0, "failed": 0,
+                               "batches": 0, "sync_writes": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "pending": self._queue.qsize(),
+                    "overflow": self.overflow}
+
+    def _ensure_started(self):
+        # Started lazily (and again after a fork) so every worker process has its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid    = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if not self._on_overflow(row):
+                return
+        self._count("queued")
+
+    def _on_overflow(self, row: dict) -> bool:
+        """Apply the overflow policy; True if `row` ended up queued."""
+        if self.overflow == "sync":
+            self._write([row])
+            self._count("sync_writes")
+            return False
+        if self.overflow == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(row)
+                return True
+            except queue.Full:
+                pass
+        elif self.overflow == "block":
+            try:
+                self._queue.put(row, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                pass
+        self._count("dropped")
+        dropped = self._counters["dropped"]
+        if dropped & (dropped - 1) == 0:   # 1, 2, 4, 8 ... — don't flood the log
+            print(f"[AUDIT LOG] queue full, {dropped} events dropped so far")
+        return False
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _take_batch(self) -> list:
+        """Block until the first event, then gather more until full or the interval passes."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                # Still drain what is already queued
+                try:
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: list, attempts: int = 3):
+        from models.file import AuditLog
+
+        for attempt in range(attempts):
+            try:
+                # executemany of one INSERT: SQLAlchemy sends it as multi-row
+                # INSERT ... VALUES statements (insertmanyvalues)
+                with self.engine.begin() as connection:
+                    connection.execute(AuditLog.__table__.insert(), rows)
+                self._count("written", len(rows))
+                self._count("batches")
+                return
+            except Exception as e:
+                if attempt == attempts - 1:
+                    self._count("failed", len(rows))
+                    print(f"[AUDIT LOG ERROR] {len(rows)} events lost: {e}")
+                else:
+                    time.sleep(0.1 * 2 ** attempt)
+
+    def flush(self, timeout: float = 5.0):
+        """Write everything queued so far (called at exit; handy in tests and tools)."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+
+    def close(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush(timeout)
+
+
+def init_audit_writer(app):
+    """Create this worker's audit writer (AUDIT_ASYNC=False keeps inline writes)."""
+    if not app.config.get("AUDIT_ASYNC", True):
+        return
+    from extensions import db
+
+    with app.app_context():
+        engine = db.engine
+    writer = AuditWriter(
+        engine,
+        queue_size=app.config.get("AUDIT_QUEUE_SIZE", 10000),
+        batch_size=app.config.get("AUDIT_BATCH_SIZE", 500),
+        flush_interval=app.config.get("AUDIT_FLUSH_INTERVAL_MS", 1000) / 1000.0,
+        overflow=app.config.get("AUDIT_OVERFLOW", "drop_newest"),
+        block_timeout=app.config.get("AUDIT_BLOCK_TIMEOUT_MS", 50) / 1000.0,
+    )
+    app.extensions["audit_writer"] = writer
+    atexit.register(writer.close)
+
+
+def get_audit_writer():
+    return current_app.extensions.get("audit_writer")
 
 
 def log_action(user_id, action: str, resource: str = None,
                status: str = "success", details: str = None):
     """
-    Write an audit log entry to the database.
-    Call this after every important action.
+    Record an audit log entry.
+    Call this after every important action. The row is queued for the
+    background writer; with AUDIT_ASYNC=False it is written inline.
     """
     from extensions import db
     from models.file import AuditLog
 
     try:
-        # Safely get IP address
-        ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
-        if ip_address and "," in ip_address:
-            ip_address = ip_address.split(",")[0].strip()
+        ip_address, user_agent = None, None
+        if has_request_context():
+            # Safely get IP address
+            ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
+            if ip_address and "," in ip_address:
+                ip_address = ip_address.split(",")[0].strip()
 
-        user_agent = request.headers.get("User-Agent", "unknown")[:500]
+            user_agent = request.headers.get("User-Agent", "unknown")[:500]
 
-        log = AuditLog(
+        row = dict(
             user_id=user_id,
             action=action,
             resource=resource,
@@ -29,10 +224,16 @@ def log_action(user_id, action: str, resource: str = None,
             details=details,
             timestamp=datetime.now(timezone.utc)
         )
-        db.session.add(log)
-        db.session.commit()
+
+        writer = get_audit_writer()
+        if writer is not None:
+            writer.submit(row)
+            return
+
+        # Own connection and transaction: the caller's session is never committed or rolled back
+        with db.engine.begin() as connection:
+            connection.execute(AuditLog.__table__.insert(), [row])
 
     except Exception as e:
         # Never let logging failure crash the app
-        db.session.rollback()
-        print(f"[AUDIT LOG ERROR] {e}")
\ No newline at end of file
+        print(f"[AUDIT LOG ERROR] {e}")
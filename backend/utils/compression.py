@@ -0,0 +1,82 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:   # optional — zlib is always available
+    zstandard = None
+
+# Codec ids live in the low bits of the container header flags
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_MASK = 0x0F
+
+CODEC_NAMES = {CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd"}
+CODEC_IDS   = {name: codec for codec, name in CODEC_NAMES.items()}
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+SAMPLE_SIZE = 64 * 1024   # bytes compressed to decide whether a file is worth it
+MIN_SAVING  = 0.10        # sample must shrink by at least this fraction
+
+# Formats that are already compressed internally; compressing them again wastes CPU
+COMPRESSED_EXTENSIONS = {
+    "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "zst",
+    "jpg", "jpeg", "png", "gif", "webp", "heic",
+    "mp3", "mp4", "mov", "mkv", "avi", "webm", "m4a", "ogg",
+    "pdf", "docx", "xlsx", "pptx", "odt", "ods", "epub",
+}
+
+
+def available_codecs() -> list:
+    return ["zlib"] + (["zstd"] if zstandard is not None else [])
+
+def resolve_codec(name: str) -> int:
+    """
+    Map a configured codec name to its id: "auto" prefers zstd when the
+    zstandard package is installed, "none" disables compression.
+    """
+    name = (name or "none").lower()
+    if name == "none":
+        return CODEC_NONE
+    if name == "auto":
+        return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    if name not in CODEC_IDS:
+        raise ValueError(f"Unknown compression codec: {name}")
+    if name == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    return CODEC_IDS[name]
+
+def compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unknown compression codec id: {codec}")
+
+def decompress(codec: int, data: bytes, max_size: int) -> bytes:
+    """Decompress one block, refusing output larger than `max_size`."""
+    if codec == CODEC_ZLIB:
+        d   = zlib.decompressobj()
+        out = d.decompress(data, max_size)
+        if d.unconsumed_tail or not d.eof:
+            raise ValueError("Compressed block is corrupt or exceeds its segment size")
+        return out
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        try:
+            out = zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Compressed block is corrupt: {e}")
+        if len(out) > max_size:
+            raise ValueError("Compressed block exceeds its segment size")
+        return out
+    raise ValueError(f"Unknown compression codec id: {codec}")
+
+def compresses_well(codec: int, sample: bytes) -> bool:
+    """True if the sampled first block shrinks by at least MIN_SAVING."""
+    if not sample:
+        return False
+    return len(compress(codec, sample)) <= len(sample) * (1 - MIN_SAVING)
@@ -3,11 +3,22 @@ import hashlib
 import secrets
 import base64
 import io
+import struct
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.poly1305 import Poly1305
+from cryptography.hazmat.primitives import hashes, hmac, padding
 from cryptography.hazmat.backends import default_backend
 from cryptography.fernet import Fernet
+from utils.key_cache import KeyCache
+from utils.compression import CODEC_NONE, CODEC_MASK, compress, decompress
 
 # ── Constants ────────────────────────────────────────────
 KEY_SIZE   = 32       # 256 bits
@@ -15,19 +26,55 @@ SALT_SIZE  = 16       # 128 bits
 ITERATIONS = 600000   # NIST recommended minimum
 CHUNK_SIZE = 64 * 1024 # 64KB chunks for memory efficiency
 
-def get_master_key() -> bytes:
-    """Load master encryption key from environment."""
-    key = os.getenv("MASTER_ENCRYPTION_KEY")
+# ── Key derivation schemes ───────────────────────────────
+# "pbkdf2": legacy rows, PBKDF2 over the master key for every file
+# "hkdf":   master key -> per-user key (HKDF, cached) -> per-file key (HKDF + file salt)
+# "envelope": random per-file data key, stored wrapped under a versioned
+#             key-encryption key (File.wrapped_key / File.kek_version)
+KDF_PBKDF2   = "pbkdf2"
+KDF_HKDF     = "hkdf"
+KDF_ENVELOPE = "envelope"
+
+_key_cache = KeyCache(
+    max_entries=int(os.getenv("KEY_CACHE_MAX_ENTRIES", 1024)),
+    ttl=float(os.getenv("KEY_CACHE_TTL_SECONDS", 900))
+)
+
+def active_kek_version() -> int:
+    """Version of MASTER_ENCRYPTION_KEY; new data keys are wrapped under it."""
+    return int(os.getenv("MASTER_KEY_VERSION", 1))
+
+def _master_secret(version: int) -> str:
+    # The active version is MASTER_ENCRYPTION_KEY; retired ones stay readable
+    # as MASTER_ENCRYPTION_KEY_V<n> until every row has been rewrapped
+    name = "MASTER_ENCRYPTION_KEY" if version == active_kek_version() else f"MASTER_ENCRYPTION_KEY_V{version}"
+    key  = os.getenv(name)
     if not key:
-        raise ValueError("MASTER_ENCRYPTION_KEY not set in environment.")
-    return hashlib.sha256(key.encode()).digest()
+        raise ValueError(f"{name} not set in environment.")
+    return key
+
+def get_master_key() -> bytes:
+    """
+    Root of the derived (pbkdf2/hkdf) key schemes. Those rows were all
+    written under master key version 1, so that secret keeps deriving them.
+    """
+    return hashlib.sha256(_master_secret(1).encode()).digest()
 
 def derive_user_key(user_id: int, salt: bytes = None):
-    """Derive a unique encryption key per user using PBKDF2."""
-    master_key = get_master_key()
-    if salt is None:
-        salt = secrets.token_bytes(SALT_SIZE)
+    """Derive a unique encryption key per user using PBKDF2 (legacy scheme)."""
+    if salt is not None:
+        # Decrypting an existing row: the salt is fixed, so the result can be cached
+        key = _key_cache.get_or_derive(
+            (KDF_PBKDF2, user_id, salt),
+            lambda: _pbkdf2_user_key(user_id, salt)
+        )
+        return key, salt
 
+    salt = secrets.token_bytes(SALT_SIZE)
+    return _pbkdf2_user_key(user_id, salt), salt
+
+def _pbkdf2_user_key(user_id: int, salt: bytes) -> bytes:
+    master_key = get_master_key()
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=KEY_SIZE,
@@ -35,77 +82,681 @@ def derive_user_key(user_id: int, salt: bytes = None):
         iterations=ITERATIONS,
         backend=default_backend()
     )
-    derived_key = kdf.derive(master_key)
-    return derived_key, salt
-
-# --- NEW: STREAMING ENCRYPTION FOR LARGE FILES (20GB+) ---
-def encrypt_stream(file_stream, user_id: int, algo="AES-256-GCM"):
-    file_stream.seek(0)
-    
-    user_key, salt = derive_user_key(user_id)
-    nonce = secrets.token_bytes(12)
-    
-    yield salt + nonce
-
-    if algo == "AES-256-GCM":
-        cipher = AESGCM(user_key)
-    elif algo == "ChaCha20":
-        cipher = ChaCha20Poly1305(user_key)
+    return kdf.derive(master_key)
+
+def get_user_key(user_id: int) -> bytes:
+    """Per-user root key, derived once from the master key via HKDF and cached."""
+    def derive():
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=KEY_SIZE,
+            salt=None,
+            info=b"sfl:user-key:" + str(user_id).encode(),
+            backend=default_backend()
+        )
+        return hkdf.derive(get_master_key())
+
+    return _key_cache.get_or_derive((KDF_HKDF, user_id), derive)
+
+def derive_file_key(user_id: int, salt: bytes = None, kdf: str = KDF_HKDF):
+    """Derive the key for a single file from the user key and the file salt."""
+    if kdf == KDF_PBKDF2:
+        return derive_user_key(user_id, salt=salt)
+    if kdf != KDF_HKDF:
+        raise ValueError(f"Unsupported key derivation scheme: {kdf}")
+
+    if salt is None:
+        salt = secrets.token_bytes(SALT_SIZE)
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=KEY_SIZE,
+        salt=salt,
+        info=b"sfl:file-key",
+        backend=default_backend()
+    )
+    return hkdf.derive(get_user_key(user_id)), salt
+
+def get_kek(version: int) -> bytes:
+    """Key-encryption key for a master key version (HKDF, cached)."""
+    def derive():
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=KEY_SIZE,
+            salt=None,
+            info=b"sfl:kek",
+            backend=default_backend()
+        )
+        return hkdf.derive(hashlib.sha256(_master_secret(version).encode()).digest())
+
+    return _key_cache.get_or_derive((KDF_ENVELOPE, version), derive)
+
+def _wrap_aad(user_id: int, version: int) -> bytes:
+    # A wrapped key only opens for the user and KEK version it was stored with
+    return f"sfl:dek:{user_id}:{version}".encode()
+
+def generate_data_key() -> bytes:
+    return secrets.token_bytes(KEY_SIZE)
+
+def wrap_data_key(data_key: bytes, user_id: int, version: int = None):
+    """Wrap a data key under a KEK (default: the active one) -> (wrapped_b64, version)."""
+    version = active_kek_version() if version is None else version
+    nonce   = secrets.token_bytes(12)
+    sealed  = AESGCM(get_kek(version)).encrypt(nonce, data_key, _wrap_aad(user_id, version))
+    return encode_bytes(nonce + sealed), version
+
+def unwrap_data_key(wrapped: str, version: int, user_id: int) -> bytes:
+    raw = decode_bytes(wrapped)
+    return AESGCM(get_kek(version)).decrypt(raw[:12], raw[12:], _wrap_aad(user_id, version))
+
+def rewrap_data_key(wrapped: str, version: int, user_id: int, new_version: int = None):
+    """Move a wrapped data key to another KEK version without touching the blob."""
+    return wrap_data_key(unwrap_data_key(wrapped, version, user_id), user_id, new_version)
+
+def resolve_data_key(user_id: int, salt: bytes, kdf: str,
+                     wrapped_key: str = None, kek_version: int = None) -> bytes:
+    """
+    Content key of a stored file: the unwrapped data key when the row has
+    one (envelope rows, and derived rows once rotation has wrapped them),
+    else the key derived from the master key.
+    """
+    if wrapped_key:
+        return unwrap_data_key(wrapped_key, kek_version, user_id)
+    if kdf == KDF_ENVELOPE:
+        raise ValueError("Envelope-encrypted row has no wrapped data key")
+    return derive_file_key(user_id, salt=salt, kdf=kdf)[0]
+
+def key_cache_stats() -> dict:
+    """Hit/miss counters for the derived key cache."""
+    return _key_cache.stats()
+
+# --- CIPHER ENGINES ---
+class CipherEngine:
+    """
+    One supported algorithm. `cipher(key)` builds a reusable cipher object;
+    seal/open work on a single buffer (a whole file, a container segment or
+    an instant-mode chunk) and encrypt/decrypt are the one-shot variants.
+    """
+    name    = None
+    algo_id = None
+    aead    = True
+
+    def cipher(self, key: bytes):
+        raise NotImplementedError
+
+    def seal(self, cipher, nonce: bytes, data: bytes, aad: bytes = None) -> bytes:
+        raise NotImplementedError
+
+    def open(self, cipher, nonce: bytes, data: bytes, aad: bytes = None) -> bytes:
+        raise NotImplementedError
+
+    def sealed_size(self, plaintext_len: int) -> int:
+        raise NotImplementedError
+
+    def streamer(self, key: bytes, nonce: bytes):
+        """
+        Incremental sealer for one message: the concatenated output of
+        update() calls and finalize() equals seal(cipher(key), nonce, data).
+        """
+        raise NotImplementedError
+
+    def encrypt(self, key: bytes, data: bytes):
+        nonce = secrets.token_bytes(12)
+        return self.seal(self.cipher(key), nonce, data), nonce
+
+    def decrypt(self, key: bytes, nonce: bytes, data: bytes) -> bytes:
+        return self.open(self.cipher(key), nonce, data)
+
+
+class AEADEngine(CipherEngine):
+    """AES-256-GCM / ChaCha20-Poly1305 via the cryptography AEAD classes."""
+
+    def __init__(self, name: str, algo_id: int, cipher_cls, streamer_cls):
+        self.name          = name
+        self.algo_id       = algo_id
+        self._cipher_cls   = cipher_cls
+        self._streamer_cls = streamer_cls
+
+    def streamer(self, key, nonce):
+        return self._streamer_cls(key, nonce)
+
+    def cipher(self, key):
+        return self._cipher_cls(key)
+
+    def seal(self, cipher, nonce, data, aad=None):
+        return cipher.encrypt(nonce, data, aad)
+
+    def open(self, cipher, nonce, data, aad=None):
+        return cipher.decrypt(nonce, data, aad)
+
+    def sealed_size(self, plaintext_len):
+        return plaintext_len + 16   # auth tag
+
+
+class FernetEngine(CipherEngine):
+    """Fernet (AES-128-CBC + HMAC-SHA256, base64url). No nonce input and no AAD."""
+    name    = "Fernet"
+    algo_id = 3
+    aead    = False
+
+    def cipher(self, key):
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def seal(self, cipher, nonce, data, aad=None):
+        return cipher.encrypt(bytes(data))   # Fernet takes only bytes; no copy if it already is
+
+    def open(self, cipher, nonce, data, aad=None):
+        return cipher.decrypt(data)
+
+    def sealed_size(self, plaintext_len):
+        # version + timestamp + iv + PKCS7-padded ciphertext + hmac, base64url encoded
+        raw = 1 + 8 + 16 + (plaintext_len // 16 + 1) * 16 + 32
+        return 4 * ((raw + 2) // 3)
+
+    def streamer(self, key, nonce=None):
+        return FernetStreamSealer(key)
+
+    def encrypt(self, key, data):
+        return self.seal(self.cipher(key), None, data), b"fernet_internal"
+
+
+class Base64StreamEncoder:
+    """Base64-encode a byte stream piecewise, carrying partial 3-byte groups over."""
+
+    def __init__(self, urlsafe: bool = False):
+        self._encode = base64.urlsafe_b64encode if urlsafe else base64.b64encode
+        self._carry  = b""
+
+    def update(self, data: bytes) -> bytes:
+        data = self._carry + data
+        cut  = len(data) - len(data) % 3
+        self._carry = data[cut:]
+        return self._encode(data[:cut])
+
+    def finalize(self) -> bytes:
+        out, self._carry = self._encode(self._carry), b""
+        return out
+
+def base64_encoded_size(n: int) -> int:
+    return 4 * ((n + 2) // 3)
+
+
+class GCMStreamSealer:
+    """AES-256-GCM over a stream: ciphertext then the 16-byte tag, as AESGCM.encrypt."""
+
+    def __init__(self, key: bytes, nonce: bytes):
+        self._enc = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+
+    def update(self, data: bytes) -> bytes:
+        return self._enc.update(data)
+
+    def finalize(self) -> bytes:
+        return self._enc.finalize() + self._enc.tag
+
+
+class ChaCha20Poly1305StreamSealer:
+    """
+    RFC 8439 ChaCha20-Poly1305 (no AAD) built from its primitives so it can
+    run incrementally; output matches ChaCha20Poly1305.encrypt.
+    """
+
+    def __init__(self, key: bytes, nonce: bytes):
+        # The 16-byte ChaCha20 nonce is a little-endian block counter + the 96-bit nonce
+        poly_key  = Cipher(algorithms.ChaCha20(key, b"\x00\x00\x00\x00" + nonce),
+                           mode=None).encryptor().update(bytes(32))
+        self._enc = Cipher(algorithms.ChaCha20(key, b"\x01\x00\x00\x00" + nonce),
+                           mode=None).encryptor()
+        self._mac = Poly1305(poly_key)
+        self._len = 0
+
+    def update(self, data: bytes) -> bytes:
+        ct = self._enc.update(data)
+        self._mac.update(ct)
+        self._len += len(ct)
+        return ct
+
+    def finalize(self) -> bytes:
+        self._mac.update(bytes(-self._len % 16) + struct.pack("<QQ", 0, self._len))
+        return self._mac.finalize()
+
+
+class FernetStreamSealer:
+    """Fernet token over a stream (version, timestamp, iv, AES-CBC, HMAC), base64url encoded."""
+
+    def __init__(self, key: bytes):
+        iv           = os.urandom(16)
+        prefix       = b"\x80" + struct.pack(">Q", int(time.time())) + iv
+        self._pad    = padding.PKCS7(128).padder()
+        self._enc    = Cipher(algorithms.AES(key[16:]), modes.CBC(iv)).encryptor()
+        self._mac    = hmac.HMAC(key[:16], hashes.SHA256())
+        self._armor  = Base64StreamEncoder(urlsafe=True)
+        self._prefix = prefix
+
+    def _emit(self, raw: bytes) -> bytes:
+        self._mac.update(raw)
+        return self._armor.update(raw)
+
+    def update(self, data: bytes) -> bytes:
+        out, self._prefix = self._prefix + self._enc.update(self._pad.update(data)), b""
+        return self._emit(out)
+
+    def finalize(self) -> bytes:
+        tail = self._emit(self._prefix + self._enc.update(self._pad.finalize()) + self._enc.finalize())
+        return tail + self._armor.update(self._mac.finalize()) + self._armor.finalize()
+
+
+CIPHER_ENGINES = {
+    engine.name: engine for engine in (
+        AEADEngine("AES-256-GCM", 1, AESGCM, GCMStreamSealer),
+        AEADEngine("ChaCha20", 2, ChaCha20Poly1305, ChaCha20Poly1305StreamSealer),
+        FernetEngine(),
+    )
+}
+
+def get_engine(algo: str) -> CipherEngine:
+    engine = CIPHER_ENGINES.get(algo)
+    if engine is None:
+        raise ValueError(f"Unsupported algorithm: {algo}")
+    return engine
+
+def benchmark_engines(sample_size: int = 4 * 1024 * 1024, rounds: int = 3) -> dict:
+    """Measure encrypt/decrypt throughput (MB/s) and size overhead of every engine."""
+    data, key, nonce = os.urandom(sample_size), os.urandom(KEY_SIZE), os.urandom(12)
+    results = {}
+    for name, engine in CIPHER_ENGINES.items():
+        cipher = engine.cipher(key)
+        encrypt_times, decrypt_times = [], []
+        for _ in range(rounds):
+            start  = time.perf_counter()
+            sealed = engine.seal(cipher, nonce, data)
+            encrypt_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            engine.open(cipher, nonce, sealed)
+            decrypt_times.append(time.perf_counter() - start)
+
+        mb = sample_size / (1024 * 1024)
+        results[name] = {
+            "aead": engine.aead,
+            "encrypt_mbps": round(mb / max(min(encrypt_times), 1e-9), 1),
+            "decrypt_mbps": round(mb / max(min(decrypt_times), 1e-9), 1),
+            "size_overhead_pct": round((len(sealed) - sample_size) / sample_size * 100, 2),
+        }
+    return results
+
+def select_default_algo(results: dict, fallback: str = "AES-256-GCM") -> str:
+    """Fastest AEAD engine, judged by its slower direction (encrypt or decrypt)."""
+    aead = {name: r for name, r in results.items() if r["aead"]}
+    if not aead:
+        return fallback
+    return max(aead, key=lambda name: min(aead[name]["encrypt_mbps"], aead[name]["decrypt_mbps"]))
+
+def init_cipher_engines(app):
+    """
+    Run the startup micro-benchmark on this worker and pick the server default
+    algorithm, unless DEFAULT_ENCRYPTION_ALGO pins one explicitly.
+    """
+    results = {}
+    if app.config.get("CIPHER_BENCHMARK_ON_STARTUP", True):
+        results = benchmark_engines(app.config.get("CIPHER_BENCHMARK_BYTES", 4 * 1024 * 1024))
+    app.extensions["cipher_benchmark"] = results
+
+    pinned = app.config.get("DEFAULT_ENCRYPTION_ALGO")
+    if pinned:
+        get_engine(pinned)
     else:
-        raise ValueError(f"Streaming not supported for {algo}")
+        app.config["DEFAULT_ENCRYPTION_ALGO"] = select_default_algo(results)
+    return app
+
+
+# --- SEGMENTED CONTAINER FOR CLOUD FILES (uploads/*.enc) ---
+# Header:  [magic "SFLC"][version: 1][algo: 1][flags: 1][chunk_size: 4][salt: 16][nonce: 12]
+# Segment: [sealed_len: 4][sealed segment] — repeated, last one flagged final
+# Segment nonce = base nonce + index + 1, AAD = header + index + final flag,
+# so segments can't be reordered, dropped or truncated without failing auth.
+CONTAINER_MAGIC      = b"SFLC"
+CONTAINER_VERSION    = 1
+CONTAINER_CHUNK_SIZE = int(os.getenv("CONTAINER_CHUNK_SIZE", 1024 * 1024))  # 1MB plaintext per segment
+CONTAINER_HEADER     = struct.Struct(">4sBBBI16s12s")
+SEGMENT_LEN          = struct.Struct(">I")
+SEGMENT_AAD          = struct.Struct(">QB")
+
+# Compressed containers prefix each segment's plaintext with one of these markers
+SEGMENT_RAW        = b"\x00"
+SEGMENT_COMPRESSED = b"\x01"
+
+ALGO_IDS   = {name: engine.algo_id for name, engine in CIPHER_ENGINES.items()}
+ALGO_NAMES = {v: k for k, v in ALGO_IDS.items()}
+
+
+class ContainerHeader:
+    """Fixed-size header at the start of every segmented .enc file."""
+
+    def __init__(self, algo: str, salt: bytes, nonce: bytes = None,
+                 chunk_size: int = CONTAINER_CHUNK_SIZE, flags: int = 0, codec: int = CODEC_NONE):
+        if algo not in ALGO_IDS:
+            raise ValueError(f"Unsupported algorithm: {algo}")
+        self.algo       = algo
+        self.salt       = salt
+        self.nonce      = nonce or secrets.token_bytes(12)
+        self.chunk_size = chunk_size
+        self.flags      = (flags & ~CODEC_MASK) | codec if codec else flags
+
+    @property
+    def codec(self) -> int:
+        """Compression codec applied to segments before sealing (0 = none)."""
+        return self.flags & CODEC_MASK
+
+    def pack(self) -> bytes:
+        return CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, ALGO_IDS[self.algo],
+                                     self.flags, self.chunk_size, self.salt, self.nonce)
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        if len(data) < CONTAINER_HEADER.size:
+            raise ValueError("Truncated container header")
+        magic, version, algo_id, flags, chunk_size, salt, nonce = CONTAINER_HEADER.unpack(
+            data[:CONTAINER_HEADER.size])
+        if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+            raise ValueError("Not a supported container file")
+        if algo_id not in ALGO_NAMES:
+            raise ValueError(f"Unknown algorithm id: {algo_id}")
+        return cls(ALGO_NAMES[algo_id], salt, nonce, chunk_size, flags)
+
+
+def _segment_nonce(base_nonce: bytes, index: int) -> bytes:
+    return ((int.from_bytes(base_nonce, "big") + index + 1) % (1 << 96)).to_bytes(12, "big")
+
+def seal_segment(cipher, header: ContainerHeader, header_bytes: bytes,
+                 index: int, final: bool, chunk: bytes) -> bytes:
+    """Encrypt one container segment bound to its position in the file."""
+    engine   = get_engine(header.algo)
+    position = SEGMENT_AAD.pack(index, int(final))
+    if not engine.aead:
+        # Fernet has no associated data — bind the position inside the token
+        return engine.seal(cipher, None, position + chunk)
+    return engine.seal(cipher, _segment_nonce(header.nonce, index), chunk, header_bytes + position)
+
+def open_segment(cipher, header: ContainerHeader, header_bytes: bytes,
+                 index: int, final: bool, sealed: bytes) -> bytes:
+    """Decrypt one container segment, failing if it was moved or truncated."""
+    engine   = get_engine(header.algo)
+    position = SEGMENT_AAD.pack(index, int(final))
+    if not engine.aead:
+        data = engine.open(cipher, None, sealed)
+        if data[:SEGMENT_AAD.size] != position:
+            raise ValueError("Container segment out of order")
+        return data[SEGMENT_AAD.size:]
+    return engine.open(cipher, _segment_nonce(header.nonce, index), sealed, header_bytes + position)
+
+def _read_exact(stream, size: int) -> bytes:
+    buf = stream.read(size)
+    while buf and len(buf) < size:
+        more = stream.read(size - len(buf))
+        if not more:
+            break
+        buf += more
+    return buf
+
+def _pack_segment(header: ContainerHeader, chunk: bytes) -> bytes:
+    """Compress a segment's plaintext if the container uses a codec and it helps."""
+    if not header.codec:
+        return chunk
+    packed = compress(header.codec, chunk)
+    if len(packed) < len(chunk):
+        return SEGMENT_COMPRESSED + packed
+    return SEGMENT_RAW + chunk
 
-    counter = 1
+def _unpack_segment(header: ContainerHeader, data: bytes) -> bytes:
+    if not header.codec:
+        return data
+    marker, body = data[:1], data[1:]
+    if marker == SEGMENT_COMPRESSED:
+        return decompress(header.codec, body, header.chunk_size)
+    if marker != SEGMENT_RAW:
+        raise ValueError("Unknown container segment marker")
+    return body
+
+def encrypt_stream(file_stream, key: bytes, header: ContainerHeader, hasher=None,
+                   segment_lengths: list = None):
+    """
+    Encrypt a readable stream into the segmented container format.
+    Yields the header and then one length-prefixed segment at a time,
+    so memory use is bounded by the chunk size regardless of file size.
+    If `hasher` is given, each plaintext chunk is fed to it as it is read;
+    if `segment_lengths` is a list, each sealed segment's length is appended.
+    """
+    cipher       = get_engine(header.algo).cipher(key)
+    header_bytes = header.pack()
+    yield header_bytes
+
+    def read_chunk():
+        chunk = _read_exact(file_stream, header.chunk_size)
+        if hasher is not None:
+            hasher.update(chunk)
+        return chunk
+
+    index = 0
+    chunk = read_chunk()
     while True:
-        chunk = file_stream.read(CHUNK_SIZE)
-        if not chunk:
+        next_chunk = read_chunk() if chunk else b""
+        final      = not next_chunk
+        sealed     = seal_segment(cipher, header, header_bytes, index, final,
+                                  _pack_segment(header, chunk))
+        if segment_lengths is not None:
+            segment_lengths.append(len(sealed))
+        yield SEGMENT_LEN.pack(len(sealed)) + sealed
+        if final:
             break
-        # Unique nonce per chunk to avoid reuse
-        chunk_nonce = (int.from_bytes(nonce, 'big') + counter).to_bytes(12, 'big')
-        yield cipher.encrypt(chunk_nonce, chunk, None)
-        counter += 1
+        chunk  = next_chunk
+        index += 1
 
+def decrypt_stream(enc_stream, key: bytes):
+    """Decrypt a segmented container stream, yielding plaintext per segment."""
+    header_bytes = _read_exact(enc_stream, CONTAINER_HEADER.size)
+    header       = ContainerHeader.unpack(header_bytes)
+    cipher       = get_engine(header.algo).cipher(key)
 
-# --- PRESERVED: STANDARD ENCRYPTION (For < 100MB Cloud) ---
-def encrypt_file(file_bytes: bytes, user_id: int, algo="AES-256-GCM"):
-    """Encrypt file bytes using the selected algorithm."""
-    user_key, salt = derive_user_key(user_id)
-    nonce = secrets.token_bytes(12)
-
-    if algo == "AES-256-GCM":
-        cipher = AESGCM(user_key)
-        encrypted_data = cipher.encrypt(nonce, file_bytes, None)
-    elif algo == "ChaCha20":
-        cipher = ChaCha20Poly1305(user_key)
-        encrypted_data = cipher.encrypt(nonce, file_bytes, None)
-    elif algo == "Fernet":
-        f = Fernet(base64.urlsafe_b64encode(user_key))
-        encrypted_data = f.encrypt(file_bytes)
-        nonce = b"fernet_internal" 
+    index   = 0
+    len_raw = _read_exact(enc_stream, SEGMENT_LEN.size)
+    while len_raw:
+        if len(len_raw) != SEGMENT_LEN.size:
+            raise ValueError("Truncated container segment")
+        sealed = _read_exact(enc_stream, SEGMENT_LEN.unpack(len_raw)[0])
+        len_raw = _read_exact(enc_stream, SEGMENT_LEN.size)
+        yield _unpack_segment(header, open_segment(cipher, header, header_bytes,
+                                                   index, not len_raw, sealed))
+        index += 1
+
+
+def sealed_segment_size(algo: str, plaintext_len: int) -> int:
+    """Size of one sealed segment for a given plaintext length (excluding its length prefix)."""
+    engine = get_engine(algo)
+    if not engine.aead:
+        plaintext_len += SEGMENT_AAD.size   # position bound inside the token
+    return engine.sealed_size(plaintext_len)
+
+def pack_segment_index(segment_lengths) -> bytes:
+    """Sealed segment lengths of a compressed container (File.segment_index), 4 bytes each."""
+    return struct.pack(f">{len(segment_lengths)}I", *segment_lengths)
+
+def segment_offset(header: ContainerHeader, index: int, segment_index: bytes = None):
+    """
+    Offset of segment `index` (its length prefix) in the container. None
+    for a compressed container without a segment index, whose segments
+    vary in size and can only be found by walking the length prefixes.
+    """
+    if not header.codec:
+        stride = SEGMENT_LEN.size + sealed_segment_size(header.algo, header.chunk_size)
+        return CONTAINER_HEADER.size + index * stride
+    if segment_index is None:
+        return None
+    sealed = sum(struct.unpack_from(f">{index}I", segment_index))
+    return CONTAINER_HEADER.size + index * SEGMENT_LEN.size + sealed
+
+def container_span(header: ContainerHeader, start: int, stop: int, segment_index: bytes = None):
+    """
+    (offset, end) of the segments covering plaintext bytes [start, stop) in
+    the container; end may run past the object for its last segment. None
+    when the offsets aren't known (compressed, no segment index).
+    """
+    first  = segment_offset(header, start // header.chunk_size, segment_index)
+    if first is None:
+        return None
+    return first, segment_offset(header, (stop - 1) // header.chunk_size + 1, segment_index)
+
+def decrypt_range(enc_stream, key: bytes, plaintext_size: int, start: int, stop: int,
+                  segment_index: bytes = None, header_bytes: bytes = None):
+    """
+    Decrypt only the segments covering plaintext bytes [start, stop) of a
+    seekable container stream, yielding the requested slice per segment.
+    Compressed containers need their `segment_index` to seek straight to
+    the first segment; without one every earlier length prefix is read.
+    Pass `header_bytes` if already fetched, so the header isn't read again.
+    """
+    if header_bytes is None:
+        header_bytes = _read_exact(enc_stream, CONTAINER_HEADER.size)
+    header = ContainerHeader.unpack(header_bytes)
+    cipher       = get_engine(header.algo).cipher(key)
+
+    chunk_size   = header.chunk_size
+    num_segments = max(1, -(-plaintext_size // chunk_size))
+    first, last  = start // chunk_size, (stop - 1) // chunk_size
+
+    offset = segment_offset(header, first, segment_index)
+    if offset is None:
+        # Compressed, written before segment indexes: hop over the length prefixes
+        enc_stream.seek(CONTAINER_HEADER.size)
+        for _ in range(first):
+            sealed_len = SEGMENT_LEN.unpack(_read_exact(enc_stream, SEGMENT_LEN.size))[0]
+            enc_stream.seek(sealed_len, io.SEEK_CUR)
     else:
-        raise ValueError(f"Unsupported algorithm: {algo}")
+        enc_stream.seek(offset)
+
+    for index in range(first, last + 1):
+        sealed_len = SEGMENT_LEN.unpack(_read_exact(enc_stream, SEGMENT_LEN.size))[0]
+        sealed     = _read_exact(enc_stream, sealed_len)
+        plaintext  = _unpack_segment(header, open_segment(cipher, header, header_bytes, index,
+                                                          index == num_segments - 1, sealed))
+
+        seg_start = index * chunk_size
+        yield plaintext[max(start - seg_start, 0):stop - seg_start]
+
+# --- INSTANT-MODE CHUNK FORMAT (password-encrypted .enc inside the zip bundle) ---
+# [salt: 16][iv: 12][num_chunks: 4] then [chunk_len: 4][chunk_data] × num_chunks
+# Chunk nonce = iv + counter, counter starting at 1
+INSTANT_HEADER    = struct.Struct(">16s12sI")
+INSTANT_CHUNK_LEN = struct.Struct(">I")
+
+def derive_password_key(password: str, salt: bytes) -> bytes:
+    """PBKDF2-SHA256 key for password-encrypted instant-mode files."""
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt,
+                     iterations=ITERATIONS, backend=default_backend())
+    return kdf.derive(password.encode())
 
+def instant_chunk_encryptor(algo: str, key: bytes, iv: bytes):
+    """Return encrypt(counter, chunk) for the instant-mode chunk format."""
+    engine = get_engine(algo)
+    cipher = engine.cipher(key)
+    base   = int.from_bytes(iv, "big")
+    return lambda counter, chunk: engine.seal(cipher, (base + counter).to_bytes(12, "big"), chunk)
+
+def instant_chunk_decryptor(algo: str, key: bytes, iv: bytes):
+    """Return decrypt(counter, sealed_chunk), the inverse of instant_chunk_encryptor."""
+    engine = get_engine(algo)
+    cipher = engine.cipher(key)
+    base   = int.from_bytes(iv, "big")
+    return lambda counter, chunk: engine.open(cipher, (base + counter).to_bytes(12, "big"), chunk)
+
+def instant_container_size(algo: str, plaintext_len: int, chunk_size: int) -> int:
+    """Exact size of the instant-mode .enc file for a plaintext of this length."""
+    engine     = get_engine(algo)
+    full, rest = divmod(plaintext_len, chunk_size)
+    size       = 16 + 12 + 4 + full * (4 + engine.sealed_size(chunk_size))
+    return size + (4 + engine.sealed_size(rest) if rest else 0)
+
+def map_chunks_ordered(file_stream, func, chunk_size: int, workers: int, max_inflight_bytes: int):
+    """
+    Read `file_stream` in chunks and yield func(counter, chunk) in input order,
+    processing up to `workers` chunks at once. The cryptography AEAD calls
+    release the GIL, so chunks encrypt on separate cores while the caller
+    keeps reading ahead and writing finished chunks. At most
+    max_inflight_bytes of plaintext is queued at any time.
+    """
+    max_pending = max(1, max_inflight_bytes // chunk_size)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        counter = 1
+        while True:
+            chunk = file_stream.read(chunk_size)
+            if not chunk:
+                break
+            pending.append(pool.submit(func, counter, chunk))
+            counter += 1
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- PRESERVED: STANDARD ENCRYPTION (single-blob rows written before the container format) ---
+def encrypt_file(file_bytes: bytes, user_id: int, algo="AES-256-GCM"):
+    """Encrypt file bytes using the selected algorithm (HKDF key scheme)."""
+    user_key, salt = derive_file_key(user_id)
+    encrypted_data, nonce = get_engine(algo).encrypt(user_key, file_bytes)
     return encrypted_data, nonce, salt
 
-def decrypt_file(encrypted_data: bytes, nonce: bytes, salt: bytes, user_id: int, algo="AES-256-GCM") -> bytes:
-    """Decrypt file bytes using the stored algorithm."""
-    user_key, _ = derive_user_key(user_id, salt=salt)
-
-    if algo == "AES-256-GCM":
-        cipher = AESGCM(user_key)
-        return cipher.decrypt(nonce, encrypted_data, None)
-    elif algo == "ChaCha20":
-        cipher = ChaCha20Poly1305(user_key)
-        return cipher.decrypt(nonce, encrypted_data, None)
-    elif algo == "Fernet":
-        f = Fernet(base64.urlsafe_b64encode(user_key))
-        return f.decrypt(encrypted_data)
-    
-    raise ValueError(f"Unsupported decryption algorithm: {algo}")
+def decrypt_file(encrypted_data: bytes, nonce: bytes, salt: bytes, user_id: int,
+                 algo="AES-256-GCM", kdf=KDF_PBKDF2) -> bytes:
+    """Decrypt file bytes using the stored algorithm and key derivation scheme."""
+    user_key, _ = derive_file_key(user_id, salt=salt, kdf=kdf)
+    return get_engine(algo).decrypt(user_key, nonce, encrypted_data)
 
 def compute_sha256(file_bytes: bytes) -> str:
     """Compute SHA-256 hash for integrity verification."""
     return hashlib.sha256(file_bytes).hexdigest()
 
+class BackgroundHasher:
+    """
+    Incremental SHA-256 computed on its own thread, so hashing chunk N
+    overlaps with encrypting chunk N+1 (hashlib releases the GIL on large
+    buffers). Use as a context manager so the thread is always stopped.
+    """
+
+    def __init__(self, max_queued: int = 4):
+        self._digest = hashlib.sha256()
+        self._queue  = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            self._digest.update(chunk)
+
+    def update(self, chunk: bytes):
+        if chunk:
+            self._queue.put(chunk)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def hexdigest(self) -> str:
+        self.close()
+        return self._digest.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def verify_file_integrity(file_bytes: bytes, stored_hash: str) -> bool:
     """Verify file integrity via SHA-256."""
     return secrets.compare_digest(compute_sha256(file_bytes), stored_hash)
@@ -116,4 +767,14 @@ def encode_bytes(data: bytes) -> str:
 
 def decode_bytes(data: str) -> bytes:
     """Decode base64 string back to bytes."""
-    return base64.b64decode(data.encode("utf-8"))
\ No newline at end of file
+    return base64.b64decode(data.encode("utf-8"))
+
+def pack_encryption_iv(nonce: bytes, salt: bytes, kdf: str = KDF_HKDF) -> str:
+    """Serialize nonce, salt and key scheme for File.encryption_iv."""
+    return encode_bytes(nonce) + ":" + encode_bytes(salt) + ":" + kdf
+
+def unpack_encryption_iv(value: str):
+    """Parse File.encryption_iv -> (nonce, salt, kdf). Rows without a scheme are legacy PBKDF2."""
+    parts = value.split(":")
+    kdf   = parts[2] if len(parts) > 2 else KDF_PBKDF2
+    return decode_bytes(parts[0]), decode_bytes(parts[1]), kdf
\ No newline at end of file
@@ -0,0 +1,282 @@
+from string import Template
+
+# decrypt.py and README.md shipped inside instant-encrypt zip bundles (files
+# over 200MB). The script reads the .enc format written by the upload route:
+# [salt: 16][iv: 12][num_chunks: 4] then [chunk_len: 4][chunk_data] × num_chunks,
+# chunk nonce = iv + index + 1.
+
+_DECRYPTOR = Template('''#!/usr/bin/env python3
+"""
+Self-contained decryptor — run with: python decrypt.py
+Algorithm: $algo
+
+Usage: python decrypt.py [FILE.enc] [-o OUTPUT] [-j WORKERS] [-m MAX_MEMORY_MB]
+The .enc file is memory-mapped and its chunks are decrypted in parallel
+straight from the mapping; at most MAX_MEMORY_MB of chunks are in flight,
+so memory use stays bounded whatever the file size and core count.
+"""
+import argparse
+import base64
+import getpass
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.exceptions import InvalidTag
+except ImportError:
+    print("Installing required library...")
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "cryptography"])
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.exceptions import InvalidTag
+
+ALGO       = "$algo"
+ITERATIONS = 600000
+HEADER     = struct.Struct(">16s12sI")
+CHUNK_LEN  = struct.Struct(">I")
+TAG_SIZE   = 16
+FERNET_OVERHEAD = 57   # version, timestamp, IV and HMAC around the padded ciphertext
+
+
+def derive_key(password, salt):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=ITERATIONS)
+    return kdf.derive(password.encode())
+
+
+def make_decryptor(key, iv):
+    base = int.from_bytes(iv, "big")
+    if ALGO == "Fernet":
+        cipher = Fernet(base64.urlsafe_b64encode(key))
+        return lambda index, data: cipher.decrypt(bytes(data))   # tokens must be bytes
+    cipher = AESGCM(key) if ALGO == "AES-256-GCM" else ChaCha20Poly1305(key)
+    return lambda index, data: cipher.decrypt((base + index + 1).to_bytes(12, "big"), data, None)
+
+
+def plaintext_length(sealed_len):
+    """Plaintext size of a sealed chunk (Fernet: to within its 1-16 bytes of padding)."""
+    if ALGO == "Fernet":
+        return max(0, sealed_len * 3 // 4 - FERNET_OVERHEAD - 1)
+    return max(0, sealed_len - TAG_SIZE)
+
+
+class ChunkReader:
+    """
+    Random access to the .enc file: views into an mmap where possible (no
+    copy; pages are read in as a chunk is decrypted), locked seek+read otherwise.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+        try:
+            self._map  = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        except (OSError, ValueError, OverflowError):
+            self._map = None   # e.g. a 32-bit Python and a file larger than the address space
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def read(self, offset, length):
+        if self._map is not None:
+            return self._view[offset:offset + length]
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def close(self):
+        if self._map is not None:
+            self._view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                pass   # a failed chunk's view is still referenced (by the traceback); freed with it
+        self._file.close()
+
+
+def chunk_index(reader, num_chunks):
+    """Walk the length prefixes once, returning (offset, length) per chunk."""
+    index, pos = [], HEADER.size
+    for _ in range(num_chunks):
+        raw = reader.read(pos, CHUNK_LEN.size)
+        if len(raw) != CHUNK_LEN.size:
+            raise ValueError("Truncated .enc file")
+        length = CHUNK_LEN.unpack(raw)[0]
+        pos += CHUNK_LEN.size
+        if pos + length > reader.size:
+            raise ValueError("Truncated .enc file")
+        index.append((pos, length))
+        pos += length
+    return index
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return "%.1f %s" % (n, unit)
+        n /= 1024.0
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.done  = 0
+        self.start = time.monotonic()
+        self.last  = 0.0
+
+    def update(self, n, final=False):
+        self.done += n
+        now = time.monotonic()
+        if not final and now - self.last < 0.5:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-6)
+        rate    = self.done / elapsed
+        pct     = 100.0 * self.done / self.total if self.total else 100.0
+        eta     = (self.total - self.done) / rate if rate else 0
+        sys.stderr.write("\\r  %5.1f%%  %s / %s  %s/s  ETA %ds   " % (
+            pct, format_size(self.done), format_size(self.total), format_size(rate), eta))
+        if final:
+            sys.stderr.write("\\n")
+        sys.stderr.flush()
+
+
+def decrypt_file(enc_path, password, output_path, workers, max_inflight):
+    reader = ChunkReader(enc_path)
+    try:
+        if reader.size < HEADER.size:
+            raise ValueError("Not an encrypted bundle file")
+        salt, iv, num_chunks = HEADER.unpack(reader.read(0, HEADER.size))
+        index   = chunk_index(reader, num_chunks)
+        decrypt = make_decryptor(derive_key(password, salt), iv)
+
+        def work(i):
+            offset, length = index[i]
+            return decrypt(i, reader.read(offset, length))
+
+        progress  = Progress(sum(plaintext_length(length) for _, length in index))
+        part_path = output_path + ".part"
+        try:
+            # Chunks decrypt on separate cores (the cipher releases the GIL) and are
+            # written in order; at most max_inflight bytes of chunks (at least one)
+            # are queued, whatever the number of workers
+            with open(part_path, "wb") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+                pending  = deque()
+                inflight = [0]
+
+                def write_next():
+                    i, future = pending.popleft()
+                    plaintext = future.result()
+                    inflight[0] -= index[i][1]
+                    out.write(plaintext)
+                    progress.update(len(plaintext))
+
+                for i in range(num_chunks):
+                    while pending and inflight[0] + index[i][1] > max_inflight:
+                        write_next()
+                    pending.append((i, pool.submit(work, i)))
+                    inflight[0] += index[i][1]
+                while pending:
+                    write_next()
+            progress.total = progress.done   # exact now (Fernet's total was an estimate)
+            progress.update(0, final=True)
+            os.replace(part_path, output_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    finally:
+        reader.close()
+
+    elapsed = time.monotonic() - progress.start
+    print("Decrypted successfully -> %s (%s in %.1fs, %s/s)" % (
+        output_path, format_size(progress.total), elapsed,
+        format_size(progress.total / max(elapsed, 1e-6))))
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Decrypt an instant-encrypt bundle")
+    parser.add_argument("enc_path", nargs="?", help=".enc file (default: the one next to this script)")
+    parser.add_argument("-o", "--output", help="output path (default: the original file name)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="decryption threads (default: all cores)")
+    parser.add_argument("-m", "--max-memory", type=int, default=512,
+                        help="MB of chunks decrypting or waiting to be written (default: 512)")
+    args = parser.parse_args()
+
+    enc_path = args.enc_path
+    if not enc_path:
+        enc_files = [f for f in os.listdir(script_dir) if f.endswith(".enc")]
+        if enc_files:
+            enc_path = os.path.join(script_dir, enc_files[0])
+            print("Found: %s" % enc_path)
+        else:
+            enc_path = input("Enter path to .enc file: ").strip()
+
+    if not os.path.exists(enc_path):
+        print("File not found: %s" % enc_path)
+        sys.exit(1)
+
+    output_path = args.output
+    if not output_path:
+        base, ext   = os.path.splitext(os.path.abspath(enc_path))
+        output_path = base if ext == ".enc" else base + ext + ".dec"
+
+    password = getpass.getpass("Enter decryption password: ")
+
+    print("Decrypting with %d thread(s)..." % max(1, args.workers))
+    try:
+        decrypt_file(enc_path, password, output_path, max(1, args.workers),
+                     max(1, args.max_memory) * 1024 * 1024)
+    except ValueError as e:
+        print("\\nError: %s" % e)
+        sys.exit(1)
+    except (InvalidTag, InvalidToken):
+        print("\\nDecryption failed: wrong password or corrupted file.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+''')
+
+_README = Template('''# Encrypted File: $name
+
+## How to Decrypt
+
+1. Extract this zip file
+2. Make sure Python 3.6+ is installed (https://python.org)
+3. Place the .enc file and decrypt.py in the same folder
+4. Run: python decrypt.py
+5. Enter your decryption password when prompted
+6. The decrypted file will appear in the same folder
+
+Options: `python decrypt.py FILE.enc -o OUTPUT -j THREADS -m MAX_MEMORY_MB`
+
+## Algorithm
+$algo
+
+## Notes
+- The decrypt.py script will auto-install the required 'cryptography' library if not present
+- Large files are decrypted in parallel, chunk by chunk, without loading them into memory
+- Keep your password safe — there is no way to recover the file without it
+- This file was encrypted with zero-knowledge encryption — the server never stored your file
+''')
+
+
+def render_decryptor(algo: str) -> str:
+    return _DECRYPTOR.substitute(algo=algo)
+
+def render_readme(original_name: str, algo: str) -> str:
+    return _README.substitute(name=original_name, algo=algo)
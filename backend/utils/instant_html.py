@@ -0,0 +1,337 @@
+import base64
+import html
+import json
+from string import Template
+
+from utils.encryption import Base64StreamEncoder, base64_encoded_size, get_engine
+
+# Self-decrypting page for instant-mode files up to 200MB. The ciphertext is
+# embedded as one base64 string (ENC_B64) between a per-file head and a
+# static tail, so the page can be streamed while the file is encrypted.
+_HEAD = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>Decrypt: $name_html</title>
+<style>
+* { box-sizing: border-box; margin: 0; padding: 0; }
+body {
+    font-family: system-ui, sans-serif;
+    background: #0f0f0f;
+    color: #e0e0e0;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    min-height: 100vh;
+}
+.card {
+    background: #1a1a1a;
+    border: 1px solid #2a2a2a;
+    border-radius: 12px;
+    padding: 2rem;
+    width: 100%;
+    max-width: 420px;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.4);
+}
+h2 { font-size: 1.2rem; margin-bottom: 0.4rem; color: #fff; }
+p.sub { font-size: 0.85rem; color: #888; margin-bottom: 1.5rem; }
+input {
+    width: 100%;
+    padding: 0.75rem 1rem;
+    border-radius: 8px;
+    border: 1px solid #333;
+    background: #111;
+    color: #fff;
+    font-size: 1rem;
+    margin-bottom: 1rem;
+    outline: none;
+}
+input:focus { border-color: #555; }
+.algo-badge {
+    display: inline-block;
+    padding: 0.25rem 0.75rem;
+    border-radius: 999px;
+    font-size: 0.75rem;
+    font-weight: 600;
+    margin-bottom: 1.5rem;
+    background: #2a2a2a;
+    color: #aaa;
+    border: 1px solid #333;
+}
+button {
+    width: 100%;
+    padding: 0.75rem;
+    border-radius: 8px;
+    border: none;
+    background: #fff;
+    color: #000;
+    font-size: 1rem;
+    font-weight: 600;
+    cursor: pointer;
+    transition: opacity 0.2s;
+}
+button:hover { opacity: 0.85; }
+button:disabled { opacity: 0.4; cursor: not-allowed; }
+.status {
+    margin-top: 1rem;
+    font-size: 0.85rem;
+    text-align: center;
+    min-height: 1.2rem;
+    color: #888;
+}
+.error { color: #ff6b6b; }
+.success { color: #6bffb8; }
+.filename {
+    font-size: 0.8rem;
+    color: #555;
+    margin-bottom: 1rem;
+    word-break: break-all;
+}
+</style>
+</head>
+<body>
+<div class="card">
+<h2>🔐 Encrypted File</h2>
+<p class="sub">Self-decrypting. No internet required.</p>
+<div class="filename">📄 $name_html</div>
+<div class="algo-badge">🔒 $algo_html</div>
+<input type="password" id="pwd" placeholder="Enter decryption password" />
+<button id="btn" onclick="decrypt()">Decrypt & Download</button>
+<div class="status" id="status"></div>
+</div>
+
+<script>
+const ALGO      = $algo_js;
+const SALT_B64  = "$salt_b64";
+const IV_B64    = "$iv_b64";
+const FILENAME  = $name_js;
+const ITERS     = 600000;
+const ENC_B64   = "''')
+
+_TAIL = ('''";
+
+function b64ToBytes(b64) {
+const bin = atob(b64);
+const arr = new Uint8Array(bin.length);
+for (let i = 0; i < bin.length; i++) arr[i] = bin.charCodeAt(i);
+return arr;
+}
+
+function bytesToB64url(bytes) {
+let bin = "";
+for (const b of bytes) bin += String.fromCharCode(b);
+return btoa(bin).replace(/\\+/g, "-").replace(/\\//g, "_").replace(/=/g, "");
+}
+
+async function deriveKey(password, salt) {
+const pwdKey = await crypto.subtle.importKey(
+    "raw", new TextEncoder().encode(password), "PBKDF2", false, ["deriveBits"]
+);
+const bits = await crypto.subtle.deriveBits(
+    { name: "PBKDF2", salt, iterations: ITERS, hash: "SHA-256" },
+    pwdKey, 256
+);
+return new Uint8Array(bits);
+}
+
+async function decryptAES(keyBytes, iv, enc) {
+const key = await crypto.subtle.importKey("raw", keyBytes, { name: "AES-GCM" }, false, ["decrypt"]);
+const dec = await crypto.subtle.decrypt({ name: "AES-GCM", iv }, key, enc);
+return new Uint8Array(dec);
+}
+
+function rotl(a, b) { return (a << b) | (a >>> (32 - b)); }
+function quarterRound(x, a, b, c, d) {
+x[a] ^= rotl(x[b] + x[d] | 0, 7);  x[c] ^= rotl(x[d] + x[a] | 0, 9);
+x[b] ^= rotl(x[a] + x[c] | 0, 13); x[d] ^= rotl(x[c] + x[b] | 0, 18);
+}
+function chacha20Block(key, counter, nonce) {
+const c = new Uint32Array([
+    0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
+    ...Array.from({length:8}, (_,i) => (key[i*4]|(key[i*4+1]<<8)|(key[i*4+2]<<16)|(key[i*4+3]<<24))>>>0),
+    counter >>> 0,
+    ...[0,4,8].map(i => (nonce[i]|(nonce[i+1]<<8)|(nonce[i+2]<<16)|(nonce[i+3]<<24))>>>0)
+]);
+const x = new Uint32Array(c);
+for (let i = 0; i < 10; i++) {
+    quarterRound(x,0,4,8,12);  quarterRound(x,1,5,9,13);
+    quarterRound(x,2,6,10,14); quarterRound(x,3,7,11,15);
+    quarterRound(x,0,5,10,15); quarterRound(x,1,6,11,12);
+    quarterRound(x,2,7,8,13);  quarterRound(x,3,4,9,14);
+}
+const out = new Uint8Array(64);
+for (let i = 0; i < 16; i++) {
+    const v = (x[i] + c[i]) >>> 0;
+    out[i*4]   =  v        & 0xff;
+    out[i*4+1] = (v >>  8) & 0xff;
+    out[i*4+2] = (v >> 16) & 0xff;
+    out[i*4+3] = (v >> 24) & 0xff;
+}
+return out;
+}
+
+function poly1305(key, msg) {
+const r = new Uint8Array(key.slice(0,16));
+const s = new Uint8Array(key.slice(16,32));
+r[3]&=15;r[7]&=15;r[11]&=15;r[15]&=15;
+r[4]&=252;r[8]&=252;r[12]&=252;
+let h0=0,h1=0,h2=0,h3=0,h4=0;
+const rr0=(r[0]|(r[1]<<8)|(r[2]<<16)|(r[3]<<24))>>>0;
+const rr1=(r[4]|(r[5]<<8)|(r[6]<<16)|(r[7]<<24))>>>0;
+const rr2=(r[8]|(r[9]<<8)|(r[10]<<16)|(r[11]<<24))>>>0;
+const rr3=(r[12]|(r[13]<<8)|(r[14]<<16)|(r[15]<<24))>>>0;
+for(let i=0;i<msg.length;i+=16){
+    const chunk=msg.slice(i,i+16);
+    const n=new Uint8Array(17);n.set(chunk);n[chunk.length]=1;
+    h0+=( n[0]|(n[1]<<8)|(n[2]<<16)|(n[3]<<24))>>>0;
+    h1+=((n[4]|(n[5]<<8)|(n[6]<<16)|(n[7]<<24))>>>0);
+    h2+=((n[8]|(n[9]<<8)|(n[10]<<16)|(n[11]<<24))>>>0);
+    h3+=((n[12]|(n[13]<<8)|(n[14]<<16)|(n[15]<<24))>>>0);
+    h4+=n[16];
+    const d0=Math.imul(h0,rr0)+Math.imul(h1*5,rr3)+Math.imul(h2*5,rr2)+Math.imul(h3*5,rr1)+Math.imul(h4*5,rr0);
+    h0=d0>>>0; h4+=(d0/0x100000000)|0;
+}
+let f=(h4>>>2)*5; h4&=3; h0=(h0+f)>>>0;
+const ss0=(s[0]|(s[1]<<8)|(s[2]<<16)|(s[3]<<24))>>>0;
+const ss1=(s[4]|(s[5]<<8)|(s[6]<<16)|(s[7]<<24))>>>0;
+const ss2=(s[8]|(s[9]<<8)|(s[10]<<16)|(s[11]<<24))>>>0;
+const ss3=(s[12]|(s[13]<<8)|(s[14]<<16)|(s[15]<<24))>>>0;
+h0=(h0+ss0)>>>0; h1=(h1+ss1)>>>0; h2=(h2+ss2)>>>0; h3=(h3+ss3)>>>0;
+const tag=new Uint8Array(16);
+tag[0]=h0;tag[1]=h0>>8;tag[2]=h0>>16;tag[3]=h0>>24;
+tag[4]=h1;tag[5]=h1>>8;tag[6]=h1>>16;tag[7]=h1>>24;
+tag[8]=h2;tag[9]=h2>>8;tag[10]=h2>>16;tag[11]=h2>>24;
+tag[12]=h3;tag[13]=h3>>8;tag[14]=h3>>16;tag[15]=h3>>24;
+return tag;
+}
+
+async function decryptChaCha(keyBytes, iv, enc) {
+const ciphertext = enc.slice(0, enc.length - 16);
+const tag        = enc.slice(enc.length - 16);
+const polyBlock  = chacha20Block(keyBytes, 0, iv);
+const polyKey    = polyBlock.slice(0, 32);
+const expectedTag = poly1305(polyKey, ciphertext);
+let tagOk = true;
+for (let i = 0; i < 16; i++) if (tag[i] !== expectedTag[i]) { tagOk = false; break; }
+if (!tagOk) throw new Error("Tag mismatch — wrong password or corrupted.");
+const out = new Uint8Array(ciphertext.length);
+for (let i = 0; i < ciphertext.length; i += 64) {
+    const block = chacha20Block(keyBytes, 1 + (i / 64 | 0), iv);
+    const chunk = ciphertext.slice(i, i + 64);
+    for (let j = 0; j < chunk.length; j++) out[i + j] = chunk[j] ^ block[j];
+}
+return out;
+}
+
+async function decryptFernet(keyBytes, encB64url) {
+function b64urlToBytes(s) {
+    s = s.replace(/-/g,"+").replace(/_/g,"/");
+    while(s.length%4) s+="=";
+    return b64ToBytes(s);
+}
+const signingKey = keyBytes.slice(0, 16);
+const encKey     = keyBytes.slice(16, 32);
+const token      = b64urlToBytes(encB64url);
+const iv         = token.slice(9, 25);
+const cipher     = token.slice(25, token.length - 32);
+const hmac       = token.slice(token.length - 32);
+const msgToSign  = token.slice(0, token.length - 32);
+const hmacKey    = await crypto.subtle.importKey("raw", signingKey, {name:"HMAC",hash:"SHA-256"}, false, ["verify"]);
+const valid      = await crypto.subtle.verify("HMAC", hmacKey, hmac, msgToSign);
+if (!valid) throw new Error("HMAC mismatch — wrong password or corrupted.");
+const aesKey     = await crypto.subtle.importKey("raw", encKey, {name:"AES-CBC"}, false, ["decrypt"]);
+const dec        = await crypto.subtle.decrypt({name:"AES-CBC", iv}, aesKey, cipher);
+return new Uint8Array(dec);
+}
+
+async function decrypt() {
+const btn    = document.getElementById("btn");
+const status = document.getElementById("status");
+const pwd    = document.getElementById("pwd").value;
+if (!pwd) { status.innerHTML = '<span class="error">Enter a password.</span>'; return; }
+btn.disabled = true;
+status.textContent = "Deriving key...";
+try {
+    const enc      = b64ToBytes(ENC_B64);
+    const salt     = b64ToBytes(SALT_B64);
+    const iv       = b64ToBytes(IV_B64);
+    status.textContent = "Decrypting...";
+    const keyBytes = await deriveKey(pwd, salt);
+    let decrypted;
+    if (ALGO === "AES-256-GCM") {
+    decrypted = await decryptAES(keyBytes, iv, enc);
+    } else if (ALGO === "ChaCha20") {
+    decrypted = await decryptChaCha(keyBytes, iv, enc);
+    } else if (ALGO === "Fernet") {
+    decrypted = await decryptFernet(keyBytes, ENC_B64);
+    }
+    const blob = new Blob([decrypted]);
+    const a    = document.createElement("a");
+    a.href     = URL.createObjectURL(blob);
+    a.download = FILENAME;
+    a.click();
+    URL.revokeObjectURL(a.href);
+    status.innerHTML = '<span class="success">✓ Decrypted & downloaded!</span>';
+} catch(e) {
+    console.error(e);
+    status.innerHTML = '<span class="error">✗ Wrong password or corrupted file.</span>';
+} finally {
+    btn.disabled = false;
+}
+}
+
+document.getElementById("pwd").addEventListener("keydown", e => {
+if (e.key === "Enter") decrypt();
+});
+</script>
+</body>
+</html>''').encode()
+
+PAYLOAD_CHUNK = 1024 * 1024   # plaintext read and encrypted per step
+
+
+def _js_string(value: str) -> str:
+    # JSON string literal that can't close the surrounding <script>
+    return json.dumps(value).replace("<", "\\u003c")
+
+def _render_head(original_name: str, algo: str, salt: bytes, iv: bytes) -> bytes:
+    return _HEAD.substitute(
+        name_html=html.escape(original_name),
+        name_js=_js_string(original_name),
+        algo_html=html.escape(algo),
+        algo_js=_js_string(algo),
+        salt_b64=base64.b64encode(salt).decode(),
+        iv_b64=base64.b64encode(iv).decode(),
+    ).encode()
+
+def _payload_size(algo: str, plaintext_len: int) -> int:
+    # Fernet tokens are already base64url text and get wrapped once more
+    return base64_encoded_size(get_engine(algo).sealed_size(plaintext_len))
+
+def instant_html_size(original_name: str, algo: str, salt: bytes, iv: bytes,
+                      plaintext_len: int) -> int:
+    """Exact byte length of the page stream_instant_html produces."""
+    return (len(_render_head(original_name, algo, salt, iv))
+            + _payload_size(algo, plaintext_len) + len(_TAIL))
+
+def stream_instant_html(file_stream, original_name: str, algo: str, key: bytes,
+                        salt: bytes, iv: bytes):
+    """
+    Yield the self-decrypting page while reading, encrypting and base64
+    encoding `file_stream` one chunk at a time. The payload is identical
+    to base64(engine.encrypt(file)), so memory stays at a few chunks
+    regardless of file size.
+    """
+    sealer  = get_engine(algo).streamer(key, iv)
+    encoder = Base64StreamEncoder()
+
+    yield _render_head(original_name, algo, salt, iv)
+    while True:
+        chunk = file_stream.read(PAYLOAD_CHUNK)
+        if not chunk:
+            break
+        out = encoder.update(sealer.update(chunk))
+        if out:
+            yield out
+    yield encoder.update(sealer.finalize()) + encoder.finalize()
+    yield _TAIL
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class KeyCache:
+    """
+    Bounded in-process cache for derived key material.
+    Entries expire after `ttl` seconds and the least recently used entry
+    is evicted once `max_entries` is reached. Evicted keys are zeroized.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._entries    = OrderedDict()   # cache_key -> (bytearray, expires_at)
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+
+    def get(self, cache_key):
+        """Return a copy of the cached key, or None on miss/expiry."""
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            key, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._evict(cache_key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return bytes(key)
+
+    def put(self, cache_key, key: bytes):
+        """Store key material, evicting the LRU entry if the cache is full."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if cache_key in self._entries:
+                self._evict(cache_key)
+            while len(self._entries) >= self.max_entries:
+                self._evict(next(iter(self._entries)))
+            self._entries[cache_key] = (bytearray(key), time.monotonic() + self.ttl)
+
+    def get_or_derive(self, cache_key, derive):
+        """Return the cached key or compute it with `derive()` and cache it."""
+        key = self.get(cache_key)
+        if key is None:
+            key = derive()
+            self.put(cache_key, key)
+        return key
+
+    def clear(self):
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._evict(cache_key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self, cache_key):
+        # Caller holds the lock
+        key, _ = self._entries.pop(cache_key)
+        for i in range(len(key)):
+            key[i] = 0
+        self.evictions += 1
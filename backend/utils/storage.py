@@ -0,0 +1,330 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:   # only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+# Ciphertext objects (File.storage_key) live behind one of these backends.
+# Keys look like "users/<id>/files/<token>.enc"; writes are all-or-nothing
+# (a reader never sees a half-written object). open() is for reading an
+# object through; open_range() for a Range request's covering segments.
+
+MB = 1024 * 1024
+
+# Every key this app writes starts with one of these (File/Blob objects and
+# resumable upload chunks); a listing never looks outside them, so a shared
+# bucket's other objects are never candidates for the GC sweep
+KEY_NAMESPACES = ("users/", "upload-sessions/")
+
+
+class StorageBackend:
+    def put_stream(self, key: str, chunks) -> int:
+        """Store an iterable of byte chunks as one object; returns its size."""
+        raise NotImplementedError
+
+    def get_range(self, key: str, start: int, stop: int) -> bytes:
+        """Bytes [start, stop) of an object (shorter at the end of the object)."""
+        raise NotImplementedError
+
+    def open(self, key: str):
+        """Readable, seekable binary stream over an object."""
+        raise NotImplementedError
+
+    def open_range(self, key: str, start: int, stop: int):
+        """
+        Seekable stream for reading bytes [start, stop) of an object; backends
+        that fetch ahead size their requests to that span instead.
+        """
+        return self.open(key)
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def iter_objects(self):
+        """Yield (name, size, modified_timestamp) for every object under KEY_NAMESPACES."""
+        raise NotImplementedError
+
+    def object_name(self, key: str) -> str:
+        """Name iter_objects reports for `key` (and that delete() accepts)."""
+        return key
+
+
+class LocalStorage(StorageBackend):
+    """Objects as flat files in one directory (uploads/), named by the key's last part."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        unique_key = key.split("/")[-1].replace(".enc", "")
+        return os.path.join(self.root, f"{unique_key}.enc")
+
+    def put_stream(self, key, chunks):
+        path      = self.path(key)
+        part_path = path + ".part"
+        try:
+            with open(part_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                size = f.tell()
+            os.replace(part_path, path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return size
+
+    def get_range(self, key, start, stop):
+        with open(self.path(key), "rb") as f:
+            f.seek(start)
+            return f.read(stop - start)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def iter_objects(self):
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                # .part files are writes in progress (or left by a crash; put_stream cleans its own)
+                if entry.is_file() and entry.name.endswith(".enc"):
+                    st = entry.stat()
+                    yield entry.name, st.st_size, st.st_mtime
+
+    def object_name(self, key):
+        return os.path.basename(self.path(key))
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable reader over an S3 object. Each miss fetches `read_ahead` bytes
+    with one ranged GET, so sequential reads of a container cost one request
+    per window and a seek to a distant segment costs one request. With
+    `stop`, reads end there and no fetch goes past it (and there is no HEAD
+    for the object's size).
+    """
+
+    def __init__(self, storage: "S3Storage", key: str, read_ahead: int, stop: int = None):
+        self._storage    = storage
+        self._key        = key
+        self._read_ahead = read_ahead
+        self._size       = storage.size(key) if stop is None else stop
+        self._pos        = 0
+        self._buf_start  = 0
+        self._buf        = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def readinto(self, b):
+        if self._pos >= self._size:
+            return 0
+        offset = self._pos - self._buf_start
+        if not 0 <= offset < len(self._buf):
+            # Fetch at least the request, and a read-ahead window beyond it
+            stop            = min(self._pos + max(len(b), self._read_ahead), self._size)
+            self._buf       = self._storage.get_range(self._key, self._pos, stop)
+            self._buf_start = self._pos
+            offset          = 0
+        n = min(len(b), len(self._buf) - offset)
+        b[:n] = self._buf[offset:offset + n]
+        self._pos += n
+        return n
+
+
+class S3Storage(StorageBackend):
+    """
+    Objects in an S3 bucket (or an S3-compatible endpoint: MinIO, moto_server).
+    One boto3 client — thread-safe, with a connection pool sized for the
+    multipart concurrency — is shared by every request on this worker.
+    Objects larger than one part go up as a multipart upload whose parts
+    are sent in parallel while the next parts are still being produced.
+    """
+
+    def __init__(self, bucket: str, region: str = None, endpoint_url: str = None,
+                 access_key: str = None, secret_key: str = None, prefix: str = "",
+                 part_size: int = 16 * MB, concurrency: int = 8,
+                 max_pool_connections: int = 32, read_ahead: int = 8 * MB):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package")
+        if part_size < 5 * MB:
+            raise ValueError("S3 multipart parts must be at least 5MB")
+        self.bucket      = bucket
+        self.prefix      = prefix
+        self.part_size   = part_size
+        self.concurrency = concurrency
+        self.read_ahead  = read_ahead
+        self._client_args = dict(
+            region_name=region, endpoint_url=endpoint_url,
+            aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+            config=BotoConfig(max_pool_connections=max(max_pool_connections, concurrency),
+                              retries={"max_attempts": 5, "mode": "adaptive"}))
+        self._client      = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created lazily so forked app workers don't share a connection pool
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.session.Session().client("s3", **self._client_args)
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def put_stream(self, key, chunks):
+        buffer, size = bytearray(), 0
+        chunks = iter(chunks)
+
+        # Fill the first part; anything smaller is a single PUT
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= self.part_size:
+                break
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=bytes(buffer))
+            return len(buffer)
+
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self._key(key))["UploadId"]
+        try:
+            parts, futures = [], []
+
+            def send(number: int, body: bytes):
+                response = self.client.upload_part(Bucket=self.bucket, Key=self._key(key),
+                                                   UploadId=upload_id, PartNumber=number, Body=body)
+                return {"PartNumber": number, "ETag": response["ETag"]}
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                def submit(body: bytes):
+                    # At most `concurrency` parts in flight plus one being filled
+                    if len(futures) - len(parts) >= self.concurrency:
+                        parts.append(futures[len(parts)].result())
+                    futures.append(pool.submit(send, len(futures) + 1, body))
+
+                for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= self.part_size:
+                        body, buffer = bytes(buffer[:self.part_size]), buffer[self.part_size:]
+                        size += len(body)
+                        submit(body)
+                if buffer or not futures:
+                    size += len(buffer)
+                    submit(bytes(buffer))
+                parts.extend(f.result() for f in futures[len(parts):])
+
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                MultipartUpload={"Parts": parts})
+        except BaseException:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key),
+                                               UploadId=upload_id)
+            raise
+        return size
+
+    def get_range(self, key, start, stop):
+        if stop <= start:
+            return b""
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key),
+                                          Range=f"bytes={start}-{stop - 1}")
+        return response["Body"].read()
+
+    def open(self, key):
+        return io.BufferedReader(S3RangeReader(self, key, self.read_ahead), buffer_size=MB)
+
+    def open_range(self, key, start, stop):
+        # Unbuffered: every GET is at most the rest of the span
+        return S3RangeReader(self, key, self.read_ahead, stop=stop)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    def iter_objects(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for namespace in KEY_NAMESPACES:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(namespace)):
+                for obj in page.get("Contents", []):
+                    yield obj["Key"][len(self.prefix):], obj["Size"], obj["LastModified"].timestamp()
+
+
+def build_storage(config) -> StorageBackend:
+    backend = (config.get("STORAGE_BACKEND") or "local").lower()
+    if backend == "local":
+        return LocalStorage(config["UPLOAD_FOLDER"])
+    if backend == "s3":
+        return S3Storage(
+            bucket=config["AWS_BUCKET_NAME"],
+            region=config.get("AWS_REGION"),
+            endpoint_url=config.get("S3_ENDPOINT_URL"),
+            access_key=config.get("AWS_ACCESS_KEY_ID"),
+            secret_key=config.get("AWS_SECRET_ACCESS_KEY"),
+            prefix=config.get("S3_KEY_PREFIX", ""),
+            part_size=config.get("S3_MULTIPART_PART_SIZE", 16 * MB),
+            concurrency=config.get("S3_MULTIPART_CONCURRENCY", 8),
+            max_pool_connections=config.get("S3_MAX_POOL_CONNECTIONS", 32),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+def init_storage(app):
+    """Create this worker's storage backend (one shared client / pool)."""
+    app.extensions["storage"] = build_storage(app.config)
+
+def get_storage() -> StorageBackend:
+    return current_app.extensions["storage"]
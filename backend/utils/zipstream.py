@@ -0,0 +1,137 @@
+import struct
+import time
+import zlib
+
+# Streaming ZIP writer: entries are ZIP_STORED and written in one pass,
+# with CRC and sizes in a data descriptor after each entry's data, so
+# nothing needs to be buffered or seeked. ZIP64 records are used for
+# entries, offsets and central directories past the 4GB / 65535 limits.
+
+LOCAL_HEADER       = struct.Struct("<IHHHHHIIIHH")
+DATA_DESCRIPTOR    = struct.Struct("<IIII")
+DATA_DESCRIPTOR_64 = struct.Struct("<IIQQ")
+CENTRAL_HEADER     = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL     = struct.Struct("<IHHHHIIH")
+ZIP64_END          = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR      = struct.Struct("<IIQI")
+
+ZIP64_LIMIT  = 0xFFFFFFFF
+ZIP64_COUNT  = 0xFFFF
+FLAG_DESCRIPTOR = 0x08
+FLAG_UTF8       = 0x800
+VERSION_STORED  = 20
+VERSION_ZIP64   = 45
+MADE_BY_UNIX    = 3 << 8   # so extractors honour the permission bits below
+
+
+def _dos_datetime(timestamp: float):
+    t = time.localtime(timestamp)
+    dos_date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_time, dos_date
+
+
+class _Entry:
+    def __init__(self, name: bytes, flags: int, offset: int, zip64: bool, dos_time, dos_date):
+        self.name     = name
+        self.flags    = flags
+        self.offset   = offset
+        self.zip64    = zip64
+        self.dos_time = dos_time
+        self.dos_date = dos_date
+        self.crc      = 0
+        self.size     = 0
+
+
+class ZipStreamWriter:
+    """
+    Build a ZIP archive as a sequence of byte chunks:
+
+        zs = ZipStreamWriter()
+        yield from zs.write_bytes("README.md", readme)
+        yield from zs.write_stream("big.enc", chunks, zip64=True)
+        yield zs.close()
+
+    Pass zip64=True for any entry that may reach 4GB; its size is unknown
+    when the local header is written.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._offset  = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+    def write_stream(self, name: str, chunks, zip64: bool = False):
+        """Yield one stored entry whose data comes from an iterable of byte chunks."""
+        encoded = name.encode("utf-8")
+        flags   = FLAG_DESCRIPTOR | (FLAG_UTF8 if not name.isascii() else 0)
+        entry   = _Entry(encoded, flags, self._offset, zip64, *_dos_datetime(time.time()))
+        self._entries.append(entry)
+
+        # Sizes are deferred to the data descriptor; ZIP64 entries say so with 0xFFFFFFFF
+        extra   = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        size_fs = ZIP64_LIMIT if zip64 else 0
+        yield self._emit(LOCAL_HEADER.pack(
+            0x04034B50, VERSION_ZIP64 if zip64 else VERSION_STORED, flags, 0,
+            entry.dos_time, entry.dos_date, 0, size_fs, size_fs, len(encoded), len(extra)
+        ) + encoded + extra)
+
+        crc, size = 0, 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            crc   = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            yield self._emit(chunk)
+
+        if size >= ZIP64_LIMIT and not zip64:
+            raise ValueError(f"{name} exceeds 4GB; write it with zip64=True")
+        entry.crc, entry.size = crc, size
+
+        if zip64:
+            yield self._emit(DATA_DESCRIPTOR_64.pack(0x08074B50, crc, size, size))
+        else:
+            yield self._emit(DATA_DESCRIPTOR.pack(0x08074B50, crc, size, size))
+
+    def write_bytes(self, name: str, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.write_stream(name, [data])
+
+    def close(self) -> bytes:
+        """Central directory and end records; the last chunk of the archive."""
+        cd_start = self._offset
+        central  = []
+        for e in self._entries:
+            # ZIP64 extra carries, in order, whichever fields overflow 32 bits
+            wide = [v for v in (e.size, e.size, e.offset) if v >= ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(wide)}Q", 0x0001, 8 * len(wide), *wide) if wide else b""
+            needs64 = bool(wide) or e.zip64
+            version = VERSION_ZIP64 if needs64 else VERSION_STORED
+            central.append(CENTRAL_HEADER.pack(
+                0x02014B50, MADE_BY_UNIX | version, version, e.flags, 0,
+                e.dos_time, e.dos_date, e.crc,
+                min(e.size, ZIP64_LIMIT), min(e.size, ZIP64_LIMIT),
+                len(e.name), len(extra), 0, 0, 0, 0o100644 << 16,
+                min(e.offset, ZIP64_LIMIT)
+            ) + e.name + extra)
+
+        central  = b"".join(central)
+        cd_size  = len(central)
+        count    = len(self._entries)
+        records  = [central]
+
+        if count >= ZIP64_COUNT or cd_start >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            zip64_end_offset = cd_start + cd_size
+            records.append(ZIP64_END.pack(
+                0x06064B50, ZIP64_END.size - 12, MADE_BY_UNIX | VERSION_ZIP64, VERSION_ZIP64,
+                0, 0, count, count, cd_size, cd_start))
+            records.append(ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_end_offset, 1))
+
+        records.append(END_OF_CENTRAL.pack(
+            0x06054B50, 0, 0, min(count, ZIP64_COUNT), min(count, ZIP64_COUNT),
+            min(cd_size, ZIP64_LIMIT), min(cd_start, ZIP64_LIMIT), 0))
+        return self._emit(b"".join(records))
@@ -66,6 +66,20 @@ const styles = `
     font-size: 16px; font-weight: 700; color: #e0e0e0;
   }
 
+  .filelist-toolbar { display: flex; align-items: center; gap: 8px; margin-left: auto; margin-right: 12px; }
+  .filelist-filter {
+    background: rgba(0, 0, 0, 0.3);
+    border: 1px solid rgba(255, 255, 255, 0.08);
+    border-radius: 6px; padding: 6px 10px;
+    color: #888; font-family: 'IBM Plex Mono', monospace; font-size: 10px;
+    outline: none; transition: border-color 0.3s ease;
+  }
+  .filelist-filter:focus { border-color: #f59e0b; color: #ddd; }
+  .filelist-filter option { background: #0e0e0e; }
+  input.filelist-filter { width: 90px; }
+
+  .load-more-row { display: flex; justify-content: center; padding: 16px; }
+
   .filelist-count {
     font-size: 10px; color: #f59e0b;
     background: rgba(245, 158, 11, 0.1);
@@ -193,7 +207,20 @@ const styles = `
   .spinner-sm { width: 12px; height: 12px; border: 2px solid rgba(255,255,255,0.1); border-top-color: currentColor; border-radius: 50%; animation: spin 0.6s linear infinite; }
 `;
 
-export default function FileList({ files = [], loading, onRefresh }) {
+const SORT_OPTIONS = [
+  { label: "Newest", sort: "date", order: "desc" },
+  { label: "Oldest", sort: "date", order: "asc" },
+  { label: "Name A–Z", sort: "name", order: "asc" },
+  { label: "Name Z–A", sort: "name", order: "desc" },
+  { label: "Largest", sort: "size", order: "desc" },
+  { label: "Smallest", sort: "size", order: "asc" },
+];
+
+export default function FileList({
+  files = [], loading, onRefresh, total,
+  query = {}, onQueryChange, hasMore, loadingMore, onLoadMore,
+}) {
+  const [extension, setExtension] = useState(query.extension || "");
   const [shareModal, setShareModal] = useState(null);
   const [shareHours, setShareHours] = useState(24);
   const [shareLink, setShareLink] = useState("");
@@ -230,13 +257,62 @@ export default function FileList({ files = [], loading, onRefresh }) {
     } finally { setDeletingId(null); }
   };
 
+  // Sorting and filtering run server-side; changing them reloads from the first page
+  const updateQuery = (changes) => {
+    const next = { ...query, ...changes };
+    Object.keys(next).forEach((k) => { if (next[k] === "" || next[k] == null) delete next[k]; });
+    onQueryChange?.(next);
+  };
+
+  const applyExtension = () => {
+    if (extension.trim() !== (query.extension || "")) updateQuery({ extension: extension.trim() });
+  };
+
+  const sortValue = `${query.sort || "date"}:${query.order || "desc"}`;
+
   return (
     <>
       <style>{styles}</style>
       <div className="filelist-card">
         <div className="filelist-header">
           <h3 className="filelist-title">Encrypted Files</h3>
-          <span className="filelist-count">{files.length} FILES</span>
+          {onQueryChange && (
+            <div className="filelist-toolbar">
+              <input
+                className="filelist-filter"
+                placeholder="pdf, png…"
+                value={extension}
+                onChange={(e) => setExtension(e.target.value)}
+                onBlur={applyExtension}
+                onKeyDown={(e) => e.key === "Enter" && applyExtension()}
+              />
+              <select
+                className="filelist-filter"
+                value={query.algo || ""}
+                onChange={(e) => updateQuery({ algo: e.target.value })}
+              >
+                <option value="">All algorithms</option>
+                <option value="AES-256-GCM">AES-256-GCM</option>
+                <option value="ChaCha20">ChaCha20</option>
+                <option value="Fernet">Fernet</option>
+              </select>
+              <select
+                className="filelist-filter"
+                value={sortValue}
+                onChange={(e) => {
+                  const [sort, order] = e.target.value.split(":");
+                  updateQuery({ sort, order });
+                }}
+              >
+                {SORT_OPTIONS.map((o) => (
+                  <option key={`${o.sort}:${o.order}`} value={`${o.sort}:${o.order}`}>{o.label}</option>
+                ))}
+              </select>
+            </div>
+          )}
+          <span className="filelist-count">
+            {hasMore ? `${files.length} / ${total ?? "…"}` : files.length} FILES
+          </span>
         </div>
 
         <div className="table-wrap">
@@ -293,6 +369,13 @@ export default function FileList({ files = [], loading, onRefresh }) {
             </tbody>
           </table>
         </div>
+        {hasMore && !loading && (
+          <div className="load-more-row">
+            <button className="icon-btn" onClick={onLoadMore} disabled={loadingMore}>
+              {loadingMore ? <span className="spinner-sm" /> : "Load more"}
+            </button>
+          </div>
+        )}
       </div>
       {/* Share Modal Logic would continue here... */}
     </>
@@ -1,9 +1,13 @@
-import React, { useState, useCallback } from "react";
+import React, { useState, useCallback, useEffect } from "react";
 import { useDropzone } from "react-dropzone";
 import toast from "react-hot-toast";
 import { filesAPI, setAccessToken } from "../utils/api";
 
 const MAX_FILE_SIZE = 50 * 1024 * 1024 * 1024 ; // 100 MB
+const DEDUP_HASH_MAX = 64 * 1024 * 1024; // WebCrypto hashes in one shot, so only small files are pre-hashed
+const RESUMABLE_MIN = 200 * 1024 * 1024; // instant uploads above this go through a resumable session
+const UPLOAD_CONNECTIONS = 4; // chunks sent in parallel
+const CHUNK_RETRIES = 6; // per chunk, with exponential backoff
 const ALLOWED_TYPES = [
   "image/jpeg",
   "image/png",
@@ -394,6 +398,66 @@ const styles = `
   @keyframes spin { to { transform: rotate(360deg); } }
 `;
 
+async function sha256Hex(file) {
+  const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+// Instant encrypt for large files: chunks go up in parallel, each retried on its own,
+// so a network blip costs one chunk instead of the whole upload
+async function uploadResumable(file, password, algo, onProgress) {
+  const { data } = await filesAPI.createUploadSession({
+    filename: file.name, file_size: file.size, password, algo,
+  });
+  const session = data.data;
+  const sent = new Map(); // offset -> bytes sent
+  const report = () => {
+    const total = [...sent.values()].reduce((a, b) => a + b, 0);
+    onProgress(Math.min(99, Math.round((total / file.size) * 100)));
+  };
+
+  const sendChunks = async (indexes) => {
+    const queue = [...indexes];
+    const worker = async () => {
+      while (queue.length) {
+        const offset = queue.shift() * session.chunk_size;
+        const blob = file.slice(offset, offset + session.chunk_size);
+        for (let attempt = 0; ; attempt++) {
+          try {
+            await filesAPI.putUploadChunk(session.session_id, offset, blob, (n) => {
+              sent.set(offset, n);
+              report();
+            });
+            sent.set(offset, blob.size);
+            report();
+            break;
+          } catch (err) {
+            const status = err.response?.status;
+            if (attempt >= CHUNK_RETRIES || (status && status < 500 && status !== 429)) throw err;
+            sent.set(offset, 0);
+            await new Promise((r) => setTimeout(r, 1000 * 2 ** attempt));
+          }
+        }
+      }
+    };
+    await Promise.all(Array.from({ length: UPLOAD_CONNECTIONS }, worker));
+  };
+
+  await sendChunks(Array.from({ length: session.num_chunks }, (_, i) => i));
+
+  // Resume anything the server didn't commit (e.g. a response lost after a retry)
+  for (let pass = 0; pass < 3; pass++) {
+    const status = (await filesAPI.uploadSessionStatus(session.session_id)).data.data;
+    if (status.received_chunks === status.num_chunks) break;
+    await sendChunks(status.missing_ranges.flatMap(([start, stop]) =>
+      Array.from({ length: stop - start }, (_, i) => start + i)));
+  }
+
+  const res = await filesAPI.completeUploadSession(session.session_id);
+  onProgress(100);
+  return filesAPI.absoluteUrl(res.data.data.download_url);
+}
+
 function getFileEmoji(type) {
   if (type.startsWith("image/")) return "🖼";
   if (type === "application/pdf") return "📄";
@@ -416,11 +480,31 @@ export default function FileUpload({ onUploadSuccess }) {
   /* Custom Themed Encryption Dropdown */
   const [dropdownOpen, setDropdownOpen] = useState(false);
 
+  const [algoStats, setAlgoStats] = useState({}); // measured MB/s per algorithm
+
   const algoOptions = [
     { value: "AES-256-GCM", label: "AES-256-GCM", badge: "Standard" },
     { value: "ChaCha20", label: "ChaCha20-Poly1305", badge: "Fast" },
     { value: "Fernet", label: "Fernet", badge: "Offline" },
-  ];
+  ].map((opt) => {
+    const stats = algoStats[opt.value];
+    if (!stats?.encrypt_mbps) return opt;
+    const overhead = stats.size_overhead_pct >= 1 ? ` · +${Math.round(stats.size_overhead_pct)}%` : "";
+    return { ...opt, badge: `${Math.round(stats.encrypt_mbps)} MB/s${overhead}` };
+  });
+
+  // Server-measured throughput and the default algorithm picked at startup
+  useEffect(() => {
+    filesAPI
+      .algorithms()
+      .then(({ data }) => {
+        const stats = {};
+        data.data.algorithms.forEach((a) => { stats[a.name] = a; });
+        setAlgoStats(stats);
+        setAlgo(data.data.default);
+      })
+      .catch(() => {});
+  }, []);
 
   const onDrop = useCallback((accepted, rejected) => {
     if (rejected.length > 0) {
@@ -454,16 +538,47 @@ export default function FileUpload({ onUploadSuccess }) {
     setUploading(true);
     setProgress(0);
 
-    // Extend session before large/instant uploads
-    try {
-      const res = await filesAPI.extendSession();
-      const newToken = res.data.access_token;
-      setAccessToken(newToken);
-    } catch (e) {
-      console.warn("Session extension failed, proceeding anyway");
+    const resumable = mode === "instant" && file.size > RESUMABLE_MIN;
+
+    // Extend session before single-request uploads (resumable chunks are short requests)
+    if (!resumable) {
+      try {
+        const res = await filesAPI.extendSession();
+        const newToken = res.data.access_token;
+        setAccessToken(newToken);
+      } catch (e) {
+        console.warn("Session extension failed, proceeding anyway");
+      }
+    }
+
+    // Skip the transfer entirely if this content is already in the user's vault
+    if (mode === "cloud" && file.size <= DEDUP_HASH_MAX && window.crypto?.subtle) {
+      try {
+        const res = await filesAPI.checkUpload(await sha256Hex(file), file.name);
+        if (res.status === 201) {
+          toast.success("Already stored — linked to your existing copy");
+          setFile(null);
+          setUploading(false);
+          return;
+        }
+      } catch (e) {
+        console.warn("Duplicate check failed, uploading normally");
+      }
     }
 
     try {
+      if (resumable) {
+        const url = await uploadResumable(file, instantPassword, algo, setProgress);
+        const a = document.createElement("a");
+        a.href = url;
+        a.click();
+        toast.success("Large file encrypted — extract zip and run decrypt.py");
+        setFile(null);
+        setInstantPassword("");
+        setProgress(0);
+        return;
+      }
+
       const formData = new FormData();
       formData.append("file", file);
       formData.append("algo", algo);
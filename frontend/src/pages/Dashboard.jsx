@@ -2,7 +2,7 @@ import React, { useState, useEffect, useCallback } from "react";
 import { useNavigate } from "react-router-dom";
 import toast from "react-hot-toast";
 import { useAuth } from "../App";
-import { authAPI, filesAPI } from "../utils/api";
+import { authAPI, filesAPI, auditAPI } from "../utils/api";
 import FileUpload from "../components/FileUpload";
 import FileList from "../components/FileList";
 
@@ -220,7 +220,7 @@ const styles = `
 
   .tab-transition-wrapper { animation: tabFadeSlide 0.4s cubic-bezier(0.16, 1, 0.3, 1) forwards; }
 
-  .stats-row { display: grid; grid-template-columns: repeat(3, 1fr); gap: 12px; margin-bottom: 20px; }
+  .stats-row { display: grid; grid-template-columns: repeat(4, 1fr); gap: 12px; margin-bottom: 20px; }
   .stat-card {
     background: rgb(10, 10, 10); backdrop-filter: blur(50px);
     border: 1px solid rgba(255, 255, 255, 0.05); border-radius: 12px; padding: 20px;
@@ -342,27 +342,56 @@ export default function Dashboard() {
   const navigate = useNavigate();
   const [files, setFiles] = useState([]);
   const [filesLoading, setFilesLoading] = useState(true);
+  const [fileQuery, setFileQuery] = useState({ sort: "date", order: "desc" });
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [vaultTotals, setVaultTotals] = useState({ files: 0, bytes: 0 });
+  const [activity, setActivity] = useState(null);
   const [activeTab, setActiveTab] = useState("files");
   const [mfaModal, setMfaModal] = useState(null); 
   const [mfaToken, setMfaToken] = useState("");
   const [mfaLoading, setMfaLoading] = useState(false);
 
+  // First page (plus vault-wide totals for the stat cards); later pages via loadMoreFiles
   const fetchFiles = useCallback(async () => {
     setFilesLoading(true);
     try {
-      const { data } = await filesAPI.list();
+      const { data } = await filesAPI.list({ ...fileQuery, totals: 1 });
       setFiles(data.data || []);
+      setNextCursor(data.pagination?.next_cursor || null);
+      if (data.totals) setVaultTotals(data.totals);
     } catch (err) {
       if (err.response?.status !== 401) {
-        toast.error("Failed to load files");
+        toast.error(err.response?.data?.error || "Failed to load files");
       }
     } finally {
       setFilesLoading(false);
     }
-  }, []);
+  }, [fileQuery]);
+
+  const loadMoreFiles = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const { data } = await filesAPI.list({ ...fileQuery, cursor: nextCursor });
+      setFiles((prev) => [...prev, ...(data.data || [])]);
+      setNextCursor(data.pagination?.next_cursor || null);
+    } catch (err) {
+      toast.error("Failed to load more files");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => { fetchFiles(); }, [fetchFiles]);
 
+  // Last 30 days of account activity, from the audit rollups (the card just stays empty on error)
+  useEffect(() => {
+    auditAPI.summary(30)
+      .then(({ data }) => setActivity(data.totals))
+      .catch(() => {});
+  }, []);
+
   const handleLogout = async () => {
     try {
       await logout();
@@ -411,7 +440,7 @@ export default function Dashboard() {
     }
   };
 
-  const totalSize = files.reduce((acc, f) => acc + (f.file_size || 0), 0);
+  const totalSize = vaultTotals.bytes;
 
   function formatBytes(bytes) {
     if (!bytes || bytes === 0) return "0 B";
@@ -539,7 +568,7 @@ export default function Dashboard() {
               <>
                 <div className="stats-row">
                   <div className="stat-card">
-                    <div className="stat-value">{files.length}</div>
+                    <div className="stat-value">{vaultTotals.files}</div>
                     <div className="stat-label">Encrypted Files</div>
                   </div>
 
@@ -565,6 +594,13 @@ export default function Dashboard() {
                     </div>
                   </div>
 
+                  <div className="stat-card">
+                    <div className="stat-value">{activity ? activity.events : "—"}</div>
+                    <div className="stat-label">
+                      Events · 30 Days{activity?.failures ? ` · ${activity.failures} Failed` : ""}
+                    </div>
+                  </div>
+
                   <div className="stat-card">
                     <div className="stat-value" style={{ color: user?.mfa_enabled ? "#22c55e" : "#ef4444" }}>
                       {user?.mfa_enabled ? "Secure" : "At Risk"}
@@ -572,7 +608,17 @@ export default function Dashboard() {
                     <div className="stat-label">Identity Status</div>
                   </div>
                 </div>
-                <FileList files={files} loading={filesLoading} onRefresh={fetchFiles} />
+                <FileList
+                  files={files}
+                  loading={filesLoading}
+                  onRefresh={fetchFiles}
+                  total={vaultTotals.files}
+                  query={fileQuery}
+                  onQueryChange={setFileQuery}
+                  hasMore={!!nextCursor}
+                  loadingMore={loadingMore}
+                  onLoadMore={loadMoreFiles}
+                />
               </>
             )}
 
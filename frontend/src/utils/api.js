@@ -138,7 +138,10 @@ export const authAPI = {
 
 // ─── Files API Helpers ───────────────────────────────────────────────────────
 export const filesAPI = {
-  list: () => api.get("/api/files/"),
+  // params: sort, order, limit, cursor, extension, mime_type, algo,
+  // min_size, max_size, created_after, created_before, totals
+  list: (params = {}) => api.get("/api/files/", { params }),
+  algorithms: () => api.get("/api/files/algorithms"),
   download: (id) =>
     api.get(`/api/files/download/${id}`, { responseType: "blob" }),
 
@@ -149,6 +152,23 @@ export const filesAPI = {
 
   extendSession: () => api.post("/api/files/upload/extend-session"),
 
+  // Stores the file without sending bytes if the user already has this content
+  checkUpload: (sha256Hash, filename) =>
+    api.post("/api/files/upload/check", { sha256_hash: sha256Hash, filename }),
+
+  // Resumable instant-encrypt uploads: chunks are PUT at their offsets, in parallel
+  createUploadSession: (body) => api.post("/api/files/upload/sessions", body),
+  uploadSessionStatus: (id) => api.get(`/api/files/upload/sessions/${id}`),
+  putUploadChunk: (id, offset, blob, onProgress) =>
+    api.put(`/api/files/upload/sessions/${id}/chunks`, blob, {
+      params: { offset },
+      headers: { "Content-Type": "application/octet-stream" },
+      onUploadProgress: (e) => onProgress && onProgress(e.loaded),
+    }),
+  completeUploadSession: (id) => api.post(`/api/files/upload/sessions/${id}/complete`),
+  // The bundle link carries its own token, so the browser can download it natively
+  absoluteUrl: (path) => api.defaults.baseURL + path,
+
   upload: (formData, onProgress) => {
     const isInstant = formData.get("instant_encrypt") === "true";
     return api.post("/api/files/upload", formData, {
@@ -171,4 +191,9 @@ export const filesAPI = {
   getFile: (id) => api.get(`/api/files/${id}`),
 };
 
+export const auditAPI = {
+  // Per-day and per-action activity, from the daily rollups
+  summary: (days = 30) => api.get("/api/audit/summary", { params: { days } }),
+};
+
 export default api;
\ No newline at end of file